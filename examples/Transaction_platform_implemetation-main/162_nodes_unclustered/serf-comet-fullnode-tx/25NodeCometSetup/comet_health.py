@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+import time
+
+import requests
+
+COMETBFT_RPC_URL = "http://127.0.0.1:26657"
+# Seconds between background refreshes of /health, /status and /net_info
+COMET_HEALTH_INTERVAL_SECONDS = float(os.environ.get("COMET_HEALTH_INTERVAL_SECONDS", "2"))
+
+logger = logging.getLogger(__name__)
+
+
+class CometNotReadyError(Exception):
+    pass
+
+
+class CometHealthMonitor:
+    """
+    Keeps CometBFT health and sync state in memory.
+    A background thread refreshes /health, /status and /net_info every `interval`
+    seconds; readiness checks are answered from the last snapshot without any RPC.
+    A snapshot older than `max_age` seconds counts as not ready.
+    """
+
+    def __init__(self, rpc_url=COMETBFT_RPC_URL, interval=COMET_HEALTH_INTERVAL_SECONDS, max_age=None):
+        self.rpc_url = rpc_url
+        self.interval = interval
+        self.max_age = max_age if max_age is not None else max(3 * interval, 5.0)
+        self.state = {"healthy": False, "catching_up": None, "latest_block_height": None,
+                      "n_peers": None, "error": "No status received yet", "updated_at": 0.0}
+        self.lock = threading.Lock()
+        self.refreshed = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="CometHealthMonitor", daemon=True)
+                self.thread.start()
+        return self
+
+    def wait_for_status(self, timeout=10.0) -> bool:
+        """Blocks until the first refresh finished (used at process start only)."""
+        self.start()
+        return self.refreshed.wait(timeout)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.state)
+
+    def readiness_error(self):
+        with self.lock:
+            state = dict(self.state)
+        if time.monotonic() - state["updated_at"] > self.max_age:
+            return f"CometBFT status is stale: {state['error'] or 'no refresh'}"
+        if state["error"]:
+            return state["error"]
+        if not state["healthy"]:
+            return "CometBFT node reported unhealthy"
+        if state["catching_up"] is True:
+            return "CometBFT node is still syncing blocks. Try after sometime"
+        return None
+
+    def is_ready(self) -> bool:
+        return self.readiness_error() is None
+
+    def require_ready(self):
+        error = self.readiness_error()
+        if error:
+            raise CometNotReadyError(error)
+
+    def refresh(self):
+        state = {"healthy": False, "catching_up": None, "latest_block_height": None, "n_peers": None, "error": None}
+        try:
+            response = requests.get(f"{self.rpc_url}/health", timeout=5)
+            response.raise_for_status()
+            data = response.json()
+            state["healthy"] = "result" in data and not data.get("error")
+            if not state["healthy"]:
+                state["error"] = f"CometBFT health check failed: {data.get('error', data)}"
+
+            response = requests.get(f"{self.rpc_url}/status", timeout=5)
+            response.raise_for_status()
+            sync_info = response.json().get("result", {}).get("sync_info", {})
+            state["catching_up"] = sync_info.get("catching_up")
+            height = sync_info.get("latest_block_height")
+            state["latest_block_height"] = int(height) if height not in (None, "") else None
+            if state["catching_up"] is None and not state["error"]:
+                state["error"] = "Unable to determine catching_up status"
+
+            response = requests.get(f"{self.rpc_url}/net_info", timeout=5)
+            if response.ok:
+                peers = response.json().get("result", {}).get("n_peers")
+                state["n_peers"] = int(peers) if peers not in (None, "") else None
+        except requests.exceptions.RequestException as e:
+            state["error"] = f"Request failed: {e}"
+        except (ValueError, AttributeError) as e:
+            state["error"] = f"Unexpected CometBFT response: {e}"
+
+        with self.lock:
+            previous = self.state
+            self.state = dict(state, updated_at=time.monotonic())
+        if state["error"] != previous["error"] or state["catching_up"] != previous["catching_up"]:
+            if state["error"]:
+                logger.error(f"❌  CometBFT not ready: {state['error']}")
+            elif state["catching_up"]:
+                logger.error("⚠️  CometBFT node is still syncing blocks.")
+            else:
+                logger.info("✅  CometBFT node is fully synchronized and ready for transactions.")
+        self.refreshed.set()
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            self.refresh()
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
@@ -5,9 +5,16 @@ import base64
 import datetime
 import urllib.parse
 import logging
+import os
 import sys
 import redis
 
+# Shared helpers sit next to tx_api.py in the repo and next to main.py once deployed
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comet_health import CometHealthMonitor
+from commit_tracker import CommitTracker, is_committed_ok
+import seller_ranking
+
 # --- Configuration ---
 # URL for your colleague's Hilbert service (running in container 5)
 HILBERT_URL = "http://127.0.0.1:4041/hilbert-output"
@@ -19,9 +26,25 @@ BUYER_NODE_JSON = "/opt/serfapp/node.json"
 
 rd = redis.Redis(host='localhost', port=6379, decode_responses=True)
 channel = "liqo:initiate"
-
-# How often to poll for new data
+health = CometHealthMonitor(COMETBFT_RPC_URL)
+tracker = CommitTracker(COMETBFT_RPC_URL)
+
+# Long-poll window on HILBERT_URL (?since=<version>&wait=<s>); the buyer reacts as soon as a new result is published
+LONG_POLL_SECONDS = 30
+# Max seconds to wait for a broadcast transaction to be committed
+COMMIT_TIMEOUT_SECONDS = 60
+# Fallback poll interval for discovery servers without long-poll support
 POLL_INTERVAL_SECONDS = 120
+# Pause after a failed request to the discovery server
+RETRY_SECONDS = 5
+
+# Seller ranking: weighted cost = sum(w * price_per_*) - sum(w * score_per_*), lowest wins.
+# The default reproduces the original "lowest price_per_ram" choice.
+RANKING_WEIGHTS = {"price_per_ram": 1.0}
+# Hard constraints: min_cpu/min_ram/min_storage/min_gpu, max_price_per_*, min_score_per_* (<= 0 disables)
+RANKING_CONSTRAINTS = {}
+# Number of ranked candidates to log per decision
+RANKING_TOP_K = 5
 
 logging.basicConfig(
     level=logging.INFO,
@@ -35,48 +58,31 @@ logger = logging.getLogger(__name__)
 
 def find_best_seller(api_data):
     """
-    Parses the Hilbert API data and finds the seller with the lowest price_per_ram.
+    Ranks the Hilbert API results with RANKING_WEIGHTS / RANKING_CONSTRAINTS and returns the best seller.
     """
     try:
-        results = api_data.get("results", [])
-        best_seller = None
-        lowest_price = float('inf')
-        seller_ip = None
-        cpu = 0
-        ram = 0.0
-        storage = 0
-        gpu = 0
-
-        logger.info("--- Scanning for Sellers ---")
-        for node in results:
-            node_name = node.get("name")
-            price = node.get("price_per_ram")
-
-            if node_name and price is not None:
-                logger.info(f"  - Considering node '{node_name}' (Price: {price})")
-                if price < lowest_price:
-                    lowest_price = price
-                    best_seller = node_name
-                    seller_ip = node.get("ip", None)
-                    cpu = node.get("cpu", 0)
-                    ram = node.get("ram", 0.0)
-                    storage = node.get("storage", 0)
-                    gpu = node.get("gpu", 0)
-
-        if best_seller:
-            logger.info(f"--- Found best seller: '{best_seller}' at price {lowest_price} ---")
+        table = seller_ranking.CandidateTable(api_data.get("results", []))
+        best = seller_ranking.top_k(table, RANKING_WEIGHTS, RANKING_CONSTRAINTS, k=RANKING_TOP_K)
+
+        logger.info(f"--- Ranked {len(table)} sellers ---")
+        for rank, i in enumerate(best, 1):
+            logger.info(f"  {rank}. '{table.names[i]}' (price_per_ram: {table.columns['price_per_ram'][i]})")
+
+        if len(best):
+            node = table.rows[best[0]]
+            price = float(table.columns["price_per_ram"][best[0]])
+            logger.info(f"--- Found best seller: '{node['name']}' at price {price} ---")
             # Convert float price (e.g., 1.79) to integer tokens (e.g., 179)
-            amount_in_tokens = int(lowest_price * 100)
-            return best_seller, amount_in_tokens, seller_ip, cpu, ram, storage, gpu
+            amount_in_tokens = int(price * 100) if price == price else 0
+            return (node["name"], amount_in_tokens, node.get("ip", None), node.get("cpu", 0),
+                    node.get("ram", 0.0), node.get("storage", 0), node.get("gpu", 0))
         else:
             logger.info("--- No valid sellers found. ---")
             return None, 0, None, 0, 0.0, 0, 0
 
-
-
     except Exception as e:
         logger.error(f"Error parsing Hilbert data: {e}")
-        return None, 0
+        return None, 0, None, 0, 0.0, 0, 0
 
 
 def create_transaction(buyer, seller_name, amount):
@@ -134,42 +140,13 @@ def get_node_name(json_path):
 
 
 def check_comet_status():
-    logger.info(f"Checking Cometbft Health {COMETBFT_RPC_URL}/health.....")
-    try:
-        response = requests.get(f"{COMETBFT_RPC_URL}/health", timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        if "result" in data and isinstance(data["result"], dict) and not data["result"]:
-            logger.info("CometBFT node is healthy")
-        elif "error" in data:
-            logger.error(f"CometBFT error: {data['error']}")
-        else:
-            logger.error(f"Unexpected response format: {data}")
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request failed: {e}")
-
-    logger.info(f"Checking Cometbft current status {COMETBFT_RPC_URL}/status....")
-    try:
-        response = requests.get(f"{COMETBFT_RPC_URL}/status", timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        sync_info = data.get("result", {}).get("sync_info", {})
-        catching_up = sync_info.get("catching_up")
-
-        if catching_up is True:
-            logger.error("⚠️  CometBFT node is still syncing blocks. Try after sometime. Terminating execution...")
-            sys.exit(1)
-        elif catching_up is False:
-            logger.info("✅  CometBFT node is fully synchronized and ready for transactions.")
-        else:
-            logger.error("❌  Unable to determine catching_up status. Invalid or missing field.")
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌  Request failed: {e}")
+    """Waits for the first health snapshot and terminates if CometBFT is not ready."""
+    health.wait_for_status(timeout=15)
+    error = health.readiness_error()
+    if error:
+        logger.error(f"❌  {error}. Terminating execution...")
         sys.exit(1)
+    logger.info("✅  CometBFT node is fully synchronized and ready for transactions.")
     return None
 
 
@@ -218,6 +195,7 @@ def get_nodeip_and_bftaddr(buyer: str):
 def broadcast_transaction(tx_json):
     """
     Encodes and broadcasts the transaction to the CometBFT node via JSON-RPC.
+    Returns (tx_hash, None) once CheckTx accepted it, else (None, reason).
     """
     try:
         # Step 1: Convert the JSON transaction to bytes, then Base64 encode it
@@ -235,28 +213,28 @@ def broadcast_transaction(tx_json):
         response.raise_for_status()  # Raise an exception for bad HTTP status (4xx or 5xx)
 
         response_json = response.json()
-        broadcast_tx_hash = response_json.get("result", {}).get("hash")
 
         if "result" in response_json:
             result = response_json["result"]
             if result.get("code") == 0:
                 logger.info("\nTransaction broadcast successful!")
                 logger.info(f"CometBFT Response: {result}")
-            else:
-                logger.info("\nTransaction was REJECTED by CheckTx.")
-                logger.info(f"CometBFT Response: {result}")
-        else:
-            logger.info(f"\nTransaction broadcast FAILED. Unexpected response:")
-            logger.info(response_json)
-
-        return broadcast_tx_hash
+                return result.get("hash"), None
+            logger.info("\nTransaction was REJECTED by CheckTx.")
+            logger.info(f"CometBFT Response: {result}")
+            return None, f"Rejected by CheckTx (code {result.get('code')}): {result.get('log') or 'no log'}"
+        logger.info(f"\nTransaction broadcast FAILED. Unexpected response:")
+        logger.info(response_json)
+        return None, f"Unexpected broadcast response: {response_json.get('error') or response_json}"
 
     except requests.exceptions.ConnectionError as e:
         logger.error(f"\nTransaction broadcast FAILED. Could not connect to CometBFT RPC.")
         logger.error(f"Error: {e}")
+        return None, f"Error occurred during transaction broadcast: {e}"
     except Exception as e:
         logger.error(f"\nTransaction broadcast FAILED. An error occurred:")
         logger.error(f"Error: {e}")
+        return None, f"Error occurred during transaction broadcast: {e}"
 
 
 def validate_transaction(tx_hash: str):
@@ -281,6 +259,29 @@ def validate_transaction(tx_hash: str):
     return None
 
 
+def wait_for_hilbert_result(version, etag=None):
+    """
+    Long-polls HILBERT_URL until a result newer than `version` is published.
+    Returns (new_version, new_etag, api_data); api_data is None if nothing changed in the window.
+    new_version is None when the server does not version its results (no long-poll support).
+    A version lower than `version`, or the same version under a different ETag, means the
+    discovery server restarted: that payload is accepted and its version taken over.
+    """
+    params = {"since": version, "wait": LONG_POLL_SECONDS}
+    response = requests.get(HILBERT_URL, params=params, timeout=LONG_POLL_SECONDS + 5)
+    response.raise_for_status()
+    header = response.headers.get("X-Result-Version")
+    new_etag = response.headers.get("ETag")
+    if header is None:
+        return None, new_etag, response.json()
+    new_version = int(header)
+    if new_version == version and (etag is None or new_etag is None or new_etag == etag):
+        return version, etag, None
+    if new_version <= version:
+        logger.info(f"Hilbert results reset (version {version} -> {new_version}); taking the new result.")
+    return new_version, new_etag, response.json()
+
+
 def main_loop():
     buyer = get_node_name(BUYER_NODE_JSON)
     # Important: Dial Peers to connect Peers
@@ -288,54 +289,71 @@ def main_loop():
     dial_peers(peers=bft_addr, persistent=True)
     # Check Comet health and current status
     check_comet_status()
+    tracker.start()
     logger.info("--- Hilbert Core Client ---")
-    logger.info(f"Polling {HILBERT_URL} every {POLL_INTERVAL_SECONDS} seconds.")
+    logger.info(f"Long-polling {HILBERT_URL} for new results (window {LONG_POLL_SECONDS} seconds).")
     logger.info(f"Buyer node is: {buyer}")
     logger.info("---------------------------")
-    tx_hash = ""
-    seller = None
-    seller_ip = None
-    cpu = 0
-    ram = 0.0
-    storage = 0
-    gpu = 0
-    amount = 0
+    version, etag = 0, None
 
     while True:
+        new_version, new_etag = version, etag
         try:
-            logger.info(f"\n[{datetime.datetime.now().isoformat()}] Polling Hilbert for data...")
-            # Fetch data from Hilbert
-            response = requests.get(HILBERT_URL, timeout=5)
-            response.raise_for_status()
-            api_data = response.json()
-
-            # Find the best seller
-            seller, amount, seller_ip, cpu, ram, storage, gpu = find_best_seller(api_data)
-
-            if seller and amount > 0:
-                # Create and broadcast the transaction
-                tx_payload = create_transaction(buyer, seller, amount)
-                tx_hash = broadcast_transaction(tx_payload)
-
+            logger.info(f"\n[{datetime.datetime.now().isoformat()}] Waiting for Hilbert results newer than version {version}...")
+            new_version, new_etag, api_data = wait_for_hilbert_result(version, etag)
+            if api_data is not None:
+                buy_from_best_seller(buyer, buyer_ip, api_data)
+        except requests.exceptions.Timeout:
+            logger.info("Hilbert long-poll timed out; retrying...")
+            continue
         except requests.exceptions.ConnectionError as e:
             logger.error(f"Error connecting to Hilbert URL {HILBERT_URL}: {e}")
+            time.sleep(RETRY_SECONDS)
         except requests.exceptions.HTTPError as e:
             logger.error(f"HTTP Error from Hilbert URL: {e}")
+            time.sleep(RETRY_SECONDS)
         except json.JSONDecodeError:
             logger.error("Error: Could not decode JSON response from Hilbert.")
+            time.sleep(RETRY_SECONDS)
         except Exception as e:
             logger.error(f"An unexpected error occurred in main loop: {e}")
+            time.sleep(RETRY_SECONDS)
 
-        logger.info("Validating transaction status....")
-        time.sleep(20)
-        if tx_hash:
-            validate_transaction(tx_hash)
-            publish_redis(buyer, buyer_ip, seller, seller_ip, cpu, ram, storage, gpu, amount)
+        if new_version is None:
+            # Discovery server without versioned results: fall back to fixed polling
+            logger.info(f"\nWaiting {POLL_INTERVAL_SECONDS} seconds before next poll...")
+            time.sleep(POLL_INTERVAL_SECONDS)
         else:
-            logger.error("Received Invalid hash after transaction broadcast...")
-            continue
-        logger.info(f"\nWaiting {POLL_INTERVAL_SECONDS} seconds before next poll...")
-        time.sleep(POLL_INTERVAL_SECONDS)
+            version, etag = new_version, new_etag
+
+
+def buy_from_best_seller(buyer, buyer_ip, api_data):
+    # Find the best seller
+    seller, amount, seller_ip, cpu, ram, storage, gpu = find_best_seller(api_data)
+    if not seller or amount <= 0:
+        return
+    if not health.is_ready():
+        logger.error(f"Skipping transaction, CometBFT not ready: {health.readiness_error()}")
+        return
+
+    # Create and broadcast the transaction
+    tx_payload = create_transaction(buyer, seller, amount)
+    tx_hash, error = broadcast_transaction(tx_payload)
+    if not tx_hash:
+        logger.error(f"Transaction not broadcast: {error or 'no hash returned'}")
+        return
+
+    logger.info("Waiting for transaction commit....")
+    try:
+        tx_result = tracker.track(tx_hash, timeout=COMMIT_TIMEOUT_SECONDS).result(timeout=COMMIT_TIMEOUT_SECONDS + 5)
+    except Exception as e:
+        logger.error(f"Transaction {tx_hash} not confirmed: {e}")
+        return
+    logger.info(f"Transaction Results for {tx_hash}: {tx_result}")
+    if is_committed_ok(tx_result):
+        publish_redis(buyer, buyer_ip, seller, seller_ip, cpu, ram, storage, gpu, amount)
+    else:
+        logger.error(f"Transaction {tx_hash} failed in block {tx_result.get('height')}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,92 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+
+COMETBFT_RPC_URL = "http://127.0.0.1:26657"
+
+logger = logging.getLogger(__name__)
+
+
+class CommitTimeoutError(Exception):
+    pass
+
+
+class CommitTracker:
+    """
+    Resolves broadcast transaction hashes to their commit outcome.
+    One background thread polls /tx for every pending hash, so callers get a
+    Future instead of sleeping for a fixed time and checking once.
+    The Future result is the /tx "result" object; it raises CommitTimeoutError
+    if the tx is not found within `commit_timeout` seconds.
+    """
+
+    def __init__(self, rpc_url=COMETBFT_RPC_URL, poll_interval=0.5, commit_timeout=60.0):
+        self.rpc_url = rpc_url
+        self.poll_interval = poll_interval
+        self.commit_timeout = commit_timeout
+        self.pending = {}  # tx_hash -> (future, deadline)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="CommitTracker", daemon=True)
+                self.thread.start()
+        return self
+
+    def track(self, tx_hash: str, timeout=None) -> Future:
+        tx_hash = tx_hash.upper().removeprefix("0X")
+        deadline = time.monotonic() + (timeout or self.commit_timeout)
+        with self.lock:
+            entry = self.pending.get(tx_hash)
+            if entry is None:
+                entry = (Future(), deadline)
+                self.pending[tx_hash] = entry
+        self.start()
+        self.wakeup.set()
+        return entry[0]
+
+    def _lookup(self, tx_hash: str):
+        params = {"hash": f"0x{tx_hash}", "prove": "false"}
+        response = requests.get(f"{self.rpc_url}/tx", params=params, timeout=3)
+        return response.json().get("result")
+
+    def _run(self):
+        while True:
+            with self.lock:
+                pending = list(self.pending.items())
+            if not pending:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            for tx_hash, (future, deadline) in pending:
+                result = None
+                try:
+                    result = self._lookup(tx_hash)
+                except Exception as e:
+                    logger.debug(f"[CommitTracker] lookup for {tx_hash} failed: {e}")
+                if result:
+                    logger.info(f"[CommitTracker] {tx_hash} committed at height {result.get('height')}")
+                    self._resolve(tx_hash, future, result=result)
+                elif time.monotonic() > deadline:
+                    logger.error(f"[CommitTracker] {tx_hash} not committed within {self.commit_timeout}s")
+                    self._resolve(tx_hash, future, error=CommitTimeoutError(f"Transaction {tx_hash} not committed in time"))
+            time.sleep(self.poll_interval)
+
+    def _resolve(self, tx_hash, future, result=None, error=None):
+        with self.lock:
+            self.pending.pop(tx_hash, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+def is_committed_ok(tx_result) -> bool:
+    """True if the /tx result was committed with DeliverTx/FinalizeBlock code 0."""
+    return bool(tx_result) and int((tx_result.get("tx_result") or {}).get("code", 0) or 0) == 0
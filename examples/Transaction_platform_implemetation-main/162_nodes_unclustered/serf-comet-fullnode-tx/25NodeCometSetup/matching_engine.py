@@ -0,0 +1,231 @@
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from state_store import MemoryStore
+
+RESOURCES = ("cpu", "ram", "storage", "gpu")
+PRICE_KEY = "price_per_ram"
+# Offers per block of the capacity index (per-resource max capacity per block, in price order)
+BLOCK = 64
+
+logger = logging.getLogger(__name__)
+
+
+def _num(v, dv=0.0):
+    try:
+        return float(v) if v not in (None, "") else dv
+    except (TypeError, ValueError):
+        return dv
+
+
+def bid_from_buyer_request(buyer, doc):
+    """Converts a buyer-agent /buyer document (resources.<r>.demand_per_unit / budget) into a bid."""
+    res = doc.get("resources") or {}
+    demand = {r: (res.get(k) or {}).get("demand_per_unit")
+              for r, k in (("cpu", "vcpu"), ("ram", "ram"), ("storage", "storage"), ("gpu", "vgpu"))}
+    return {"buyer": buyer, **demand, "max_price": (res.get("ram") or {}).get("budget")}
+
+
+def bid_error(bid):
+    """Why a bid cannot be cleared (demand or max_price not a finite number >= 0), or None if it can."""
+    for key in (*RESOURCES, "max_price"):
+        v = bid.get(key)
+        if v in (None, ""):
+            continue
+        try:
+            v = float(v)
+        except (TypeError, ValueError):
+            return f"{key} must be a number, got {bid.get(key)!r}"
+        if not math.isfinite(v) or v < 0:
+            return f"{key} must be a finite number >= 0, got {bid.get(key)!r}"
+    return None
+
+
+class OrderBook:
+    """
+    Seller offers sorted by price (PRICE_KEY), with one capacity column per resource.
+    Capacities are consumed as bids are matched, so one seller can serve several
+    buyers but never more than it offers.
+
+    Capacity index:
+    - per block of BLOCK offers in price order, the largest remaining capacity of
+      each resource; a bid only checks the offers of blocks whose maxima cover its
+      demand on every resource.
+    - per demand vector, a cursor below which no offer fits it. Capacities only
+      shrink within a round, so the cheapest fitting offer never moves left, and
+      bids repeating a demand no cheap offer meets on CPU, storage or GPU start
+      past those offers instead of rescanning them.
+    The maxima of one block may come from different offers, so a block can still
+    be checked without a fit; a new demand vector therefore scans its candidate
+    blocks once per round at worst.
+    """
+
+    def __init__(self, offers, price_key=PRICE_KEY):
+        rows = [o for o in offers if o.get("name")]
+        price = np.fromiter((_num(o.get(price_key), np.nan) for o in rows), dtype=np.float64, count=len(rows))
+        keep = np.flatnonzero(~np.isnan(price))
+        order = keep[np.argsort(price[keep], kind="stable")]
+        self.offers = [rows[i] for i in order]
+        self.price = price[order]
+        self.capacity = np.empty((len(order), len(RESOURCES)), dtype=np.float64)
+        for c, r in enumerate(RESOURCES):
+            self.capacity[:, c] = np.fromiter((_num(o.get(r)) for o in self.offers), dtype=np.float64,
+                                              count=len(order))
+        starts = np.arange(0, len(order), BLOCK)
+        self.block_max = (np.maximum.reduceat(self.capacity, starts, axis=0) if len(order)
+                          else np.empty((0, len(RESOURCES))))
+        self.cursor = {}
+
+    def __len__(self):
+        return len(self.offers)
+
+    def best_offer(self, demand, max_price):
+        """Index of the cheapest offer priced <= max_price (0 = no cap) with enough capacity, or -1."""
+        hi = len(self.price) if max_price <= 0 else int(np.searchsorted(self.price, max_price, side="right"))
+        key = tuple(demand.tolist())
+        start = self.cursor.get(key, 0)
+        if start >= hi:
+            return -1
+        # most bids fit right at the cursor: check the next BLOCK rows as a plain slice first
+        near = min(hi, start + BLOCK)
+        fits = np.flatnonzero((self.capacity[start:near] >= demand).all(axis=1))
+        if fits.size:
+            self.cursor[key] = start + int(fits[0])
+            return start + int(fits[0])
+        start = near
+        first = start // BLOCK
+        cand = first + np.flatnonzero((self.block_max[first:-(-hi // BLOCK)] >= demand).all(axis=1))
+        # candidate blocks are checked in groups doubling in size, cheapest first
+        lo, group = 0, 1
+        while lo < len(cand):
+            rows = (cand[lo:lo + group, None] * BLOCK + np.arange(BLOCK)).ravel()
+            rows = rows[(rows >= start) & (rows < hi)]
+            fits = np.flatnonzero((self.capacity[rows] >= demand).all(axis=1))
+            if fits.size:
+                j = int(rows[fits[0]])
+                self.cursor[key] = j
+                return j
+            lo, group = lo + group, group * 2
+        self.cursor[key] = hi
+        return -1
+
+    def take(self, i, demand):
+        self.capacity[i] -= demand
+        b = i // BLOCK
+        self.block_max[b] = self.capacity[b * BLOCK:(b + 1) * BLOCK].max(axis=0)
+
+
+def clear(bids, offers, price_key=PRICE_KEY):
+    """
+    One clearing round. Bids are served highest max_price first (0 = uncapped goes first),
+    then in arrival order; each takes the cheapest offer that fits its demand and price cap.
+    Returns a list of (bid, offer or None, amount_in_tokens).
+    """
+    book = OrderBook(offers, price_key)
+    caps = np.array([_num(b.get("max_price")) or np.inf for b in bids], dtype=np.float64)
+    order = np.lexsort((np.arange(len(bids)), -caps))
+    out = [None] * len(bids)
+    for i in order:
+        bid = bids[i]
+        demand = np.array([_num(bid.get(r)) for r in RESOURCES], dtype=np.float64)
+        j = book.best_offer(demand, _num(bid.get("max_price")))
+        if j < 0:
+            out[i] = (bid, None, 0)
+            continue
+        book.take(j, demand)
+        out[i] = (bid, book.offers[j], int(book.price[j] * 100))
+    return out
+
+
+class BatchAuction:
+    """
+    Collects bids and clears them together every `interval` seconds against the
+    offers returned by `offers_source()`. `on_match(bid_id, bid, offer, amount)` is
+    called for every matched bid of a round; bid records can be read with `get()`.
+    Queue and records live in `store` (state_store); with a shared store, only the
+    worker holding the "auction" lease clears a round.
+    """
+
+    def __init__(self, offers_source, on_match, interval=2.0, record_ttl=600, store=None):
+        self.offers_source = offers_source
+        self.on_match = on_match
+        self.interval = interval
+        self.record_ttl = record_ttl
+        self.store = store if store is not None else MemoryStore()
+        self.holder = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="BatchAuction", daemon=True)
+                self.thread.start()
+        return self
+
+    def submit(self, bid):
+        bid_id = uuid.uuid4().hex
+        now = time.time()
+        self.store.put("bid", bid_id, {"bid_id": bid_id, "status": "queued", "bid": bid, "seller": None,
+                                       "amount": None, "tx_id": None, "created": now, "updated": now},
+                       self.record_ttl)
+        self.store.push("auction", [{"bid_id": bid_id, "bid": bid}])
+        self.start()
+        return bid_id
+
+    def get(self, bid_id):
+        return self.store.get("bid", bid_id)
+
+    def update(self, bid_id, **fields):
+        self.store.update("bid", bid_id, self.record_ttl, **fields)
+
+    def run_round(self):
+        batch = self.store.drain("auction")
+        if not batch:
+            return []
+        try:
+            offers = self.offers_source()
+        except Exception as e:
+            logger.error(f"[Auction] could not load offers, re-queueing {len(batch)} bids: {e}")
+            self.store.push("auction", batch, front=True)
+            return []
+
+        started = time.perf_counter()
+        try:
+            results = clear([item["bid"] for item in batch], offers)
+        except Exception as e:
+            # Do not re-queue: the same batch would fail again every round
+            logger.error(f"[Auction] clearing failed, marking {len(batch)} bids failed: {e}")
+            for item in batch:
+                self.update(item["bid_id"], status="failed", error=f"Clearing failed: {e}")
+            return []
+        logger.info(f"[Auction] cleared {len(batch)} bids against {len(offers)} offers "
+                    f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+        for item, (bid, offer, amount) in zip(batch, results):
+            bid_id = item["bid_id"]
+            if offer is None:
+                self.update(bid_id, status="unmatched")
+                continue
+            self.update(bid_id, status="matched", seller=offer.get("name"), amount=amount)
+            try:
+                tx_id = self.on_match(bid_id, bid, offer, amount)
+                self.update(bid_id, tx_id=tx_id)
+            except Exception as e:
+                logger.error(f"[Auction] failed to submit match for bid {bid_id}: {e}")
+                self.update(bid_id, status="failed")
+        return results
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                if self.store.lease("auction", self.holder, 3 * self.interval):
+                    self.run_round()
+            except Exception as e:
+                logger.error(f"[Auction] clearing round failed: {e}")
@@ -0,0 +1,202 @@
+import json
+import threading
+import time
+
+import redis
+
+REDIS_HOST = "localhost"
+REDIS_PORT = 6379
+# How often RedisStore.wait re-reads a record while long-polling
+REDIS_WAIT_POLL_SECONDS = 0.1
+
+
+class MemoryStore:
+    """
+    Status records, work queues and short-lived keys for a single serving process.
+    Records are JSON-like dicts grouped by namespace and expire `ttl` seconds after
+    their last write; one Condition wakes long-pollers on every update.
+    """
+
+    def __init__(self):
+        self.records = {}  # (ns, id) -> (record, expires_at)
+        self.queues = {}
+        self.values = {}  # key -> (value, expires_at)
+        self.cond = threading.Condition()
+
+    def _live(self, table, key):
+        entry = table.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            del table[key]
+            return None
+        return entry
+
+    def _prune(self):
+        now = time.monotonic()
+        for table in (self.records, self.values):
+            for key in [k for k, (_, expires_at) in table.items() if expires_at <= now]:
+                del table[key]
+
+    def put(self, ns, rid, record, ttl):
+        with self.cond:
+            self._prune()
+            self.records[(ns, rid)] = (dict(record), time.monotonic() + ttl)
+            self.cond.notify_all()
+
+    def update(self, ns, rid, ttl, **fields):
+        with self.cond:
+            entry = self._live(self.records, (ns, rid))
+            if entry is None:
+                return False
+            entry[0].update(fields, updated=time.time())
+            self.records[(ns, rid)] = (entry[0], time.monotonic() + ttl)
+            self.cond.notify_all()
+            return True
+
+    def get(self, ns, rid):
+        with self.cond:
+            entry = self._live(self.records, (ns, rid))
+            return dict(entry[0]) if entry else None
+
+    def wait(self, ns, rid, done, timeout):
+        """The record once done(record) is true or `timeout` passed; None if it does not exist."""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                entry = self._live(self.records, (ns, rid))
+                remaining = deadline - time.monotonic()
+                if entry is None or done(entry[0]) or remaining <= 0:
+                    return dict(entry[0]) if entry else None
+                self.cond.wait(timeout=remaining)
+
+    def push(self, queue, items, front=False):
+        with self.cond:
+            q = self.queues.setdefault(queue, [])
+            if front:
+                q[:0] = items
+            else:
+                q.extend(items)
+
+    def drain(self, queue):
+        with self.cond:
+            return self.queues.pop(queue, [])
+
+    def claim(self, key, ttl):
+        """True for exactly one caller until the key expires or is released."""
+        with self.cond:
+            if self._live(self.values, key) is not None:
+                return False
+            self.values[key] = (None, time.monotonic() + ttl)
+            return True
+
+    def set_value(self, key, value, ttl):
+        with self.cond:
+            self.values[key] = (value, time.monotonic() + ttl)
+            self.cond.notify_all()
+
+    def get_value(self, key):
+        """(exists, value); a claimed key without a value yet is (True, None)."""
+        with self.cond:
+            entry = self._live(self.values, key)
+            return (entry is not None, entry[0] if entry else None)
+
+    def release(self, key):
+        with self.cond:
+            self.values.pop(key, None)
+
+    def lease(self, name, holder, ttl):
+        """Leader lease for periodic jobs; a single process always holds it."""
+        return True
+
+
+class RedisStore:
+    """
+    Same interface as MemoryStore, kept in Redis so every worker process of a
+    pre-fork server sees the same records, queues and idempotency keys.
+    Expiry uses Redis TTLs; wait() polls every REDIS_WAIT_POLL_SECONDS.
+    """
+
+    def __init__(self, client=None, prefix="tx_api"):
+        self.redis = client or redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+        self.prefix = prefix
+
+    def _key(self, *parts):
+        return ":".join((self.prefix,) + tuple(str(p) for p in parts))
+
+    def put(self, ns, rid, record, ttl):
+        self.redis.set(self._key(ns, rid), json.dumps(record), ex=int(ttl))
+
+    def update(self, ns, rid, ttl, **fields):
+        key = self._key(ns, rid)
+        updated = []
+
+        def apply(pipe):
+            raw = pipe.get(key)
+            if raw is None:
+                return
+            record = json.loads(raw)
+            record.update(fields, updated=time.time())
+            pipe.multi()
+            pipe.set(key, json.dumps(record), ex=int(ttl))
+            updated.append(True)
+
+        self.redis.transaction(apply, key)
+        return bool(updated)
+
+    def get(self, ns, rid):
+        raw = self.redis.get(self._key(ns, rid))
+        return json.loads(raw) if raw is not None else None
+
+    def wait(self, ns, rid, done, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            record = self.get(ns, rid)
+            remaining = deadline - time.monotonic()
+            if record is None or done(record) or remaining <= 0:
+                return record
+            time.sleep(min(REDIS_WAIT_POLL_SECONDS, remaining))
+
+    def push(self, queue, items, front=False):
+        if not items:
+            return
+        encoded = [json.dumps(item) for item in items]
+        if front:
+            self.redis.lpush(self._key("queue", queue), *reversed(encoded))
+        else:
+            self.redis.rpush(self._key("queue", queue), *encoded)
+
+    def drain(self, queue):
+        key = self._key("queue", queue)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        items, _ = pipe.execute()
+        return [json.loads(item) for item in items]
+
+    def claim(self, key, ttl):
+        return bool(self.redis.set(self._key("value", key), "", nx=True, ex=int(ttl)))
+
+    def set_value(self, key, value, ttl):
+        self.redis.set(self._key("value", key), json.dumps(value), ex=int(ttl))
+
+    def get_value(self, key):
+        raw = self.redis.get(self._key("value", key))
+        if raw is None:
+            return False, None
+        return True, (json.loads(raw) if raw else None)
+
+    def release(self, key):
+        self.redis.delete(self._key("value", key))
+
+    def lease(self, name, holder, ttl):
+        key = self._key("lease", name)
+        if self.redis.set(key, holder, nx=True, px=int(ttl * 1000)):
+            return True
+        if self.redis.get(key) == holder:
+            self.redis.pexpire(key, int(ttl * 1000))
+            return True
+        return False
+
+
+def make_store(workers, prefix="tx_api"):
+    """MemoryStore for a single process, RedisStore when several worker processes share the state."""
+    return RedisStore(prefix=prefix) if workers > 1 else MemoryStore()
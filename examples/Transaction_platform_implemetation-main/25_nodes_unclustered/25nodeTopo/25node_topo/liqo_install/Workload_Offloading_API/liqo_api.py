@@ -10,6 +10,7 @@ import requests
 import re
 import redis
 import time
+from serving import serve
 
 app = Flask(__name__)
 
@@ -316,8 +317,9 @@ def redis_listener():
 # Entry Point
 # ----------------------------
 if __name__ == "__main__":
-    # Run Redis listener in background thread
+    # Run Redis listener in background thread, once per node: with several
+    # workers it stays in the parent process so each transfer triggers one /connect
     t = threading.Thread(target=redis_listener, daemon=True)
     t.start()
 
-    app.run(host="0.0.0.0", port=5000, debug=False)
+    serve(app, "0.0.0.0", 5000)
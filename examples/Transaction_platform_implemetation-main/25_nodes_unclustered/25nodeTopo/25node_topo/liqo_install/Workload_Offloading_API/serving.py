@@ -0,0 +1,63 @@
+import logging
+import os
+
+# Worker processes (pre-fork, needs gunicorn) and threads per process
+API_WORKERS = int(os.environ.get("API_WORKERS", "1"))
+API_THREADS = int(os.environ.get("API_THREADS", "8"))
+# auto: gunicorn for several workers, else waitress, else the Flask server; or force one of them
+API_SERVER = os.environ.get("API_SERVER", "auto")
+# Must exceed the longest long-poll (?wait=) the APIs accept
+API_WORKER_TIMEOUT_SECONDS = 120
+
+logger = logging.getLogger(__name__)
+
+
+def _gunicorn(app, host, port, workers, threads, on_worker_start):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", API_WORKER_TIMEOUT_SECONDS)
+            if on_worker_start:
+                self.cfg.set("post_fork", lambda server, worker: on_worker_start())
+
+        def load(self):
+            return app
+
+    logger.info(f"Serving on {host}:{port} with gunicorn ({workers} workers x {threads} threads)")
+    Server().run()
+
+
+def serve(app, host, port, workers=API_WORKERS, threads=API_THREADS, server=API_SERVER, on_worker_start=None):
+    """
+    Runs a Flask app on a production WSGI server.
+
+    on_worker_start() is called once in every serving process before it takes
+    requests (after the fork for gunicorn), which is where background threads
+    belong. Work that must happen once per host should run before serve().
+    """
+    if server == "auto":
+        server = "gunicorn" if workers > 1 else "waitress"
+    if server == "gunicorn":
+        try:
+            return _gunicorn(app, host, port, workers, threads, on_worker_start)
+        except ImportError:
+            logger.error("gunicorn is not installed (pip3 install gunicorn); serving with one process")
+            server = "waitress"
+
+    if on_worker_start:
+        on_worker_start()
+    if server == "waitress":
+        try:
+            import waitress
+        except ImportError:
+            logger.error("waitress is not installed (pip3 install waitress); using the Flask server")
+        else:
+            logger.info(f"Serving on {host}:{port} with waitress ({threads} threads)")
+            return waitress.serve(app, host=host, port=port, threads=threads)
+    logger.info(f"Serving on {host}:{port} with the Flask server")
+    app.run(host=host, port=port, threaded=True, debug=False)
@@ -40,13 +40,14 @@ for NODE in "${NODES[@]}"; do
         sudo docker exec -it "$NODE" bash -c "
             apt-get update -y &&
             apt-get install -y python3 python3-pip &&
-            pip3 install flask pyyaml requests redis
+            pip3 install flask pyyaml requests redis waitress gunicorn
         "
     fi
 
     if [[ "$ACTION" == "install" || "$ACTION" == "reset" ]]; then
         echo "Copying liqo_api.py..."
         sudo docker cp "$API_FILE" "$NODE":/root/liqo_api.py
+        sudo docker cp "serving.py" "$NODE":/root/serving.py
     fi
 
     echo "Stopping any running liqo_api.py processes..."
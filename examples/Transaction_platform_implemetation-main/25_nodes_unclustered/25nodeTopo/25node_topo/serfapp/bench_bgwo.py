@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for bgwo1.binary_gwo.
+
+fitness_function: the dense rtt_array version (masked argmin per row) against
+the previous per-pair loops over the rtts dict-of-dicts. Both run the whole
+binary_gwo search with the same seeds on the same RTTs (coordinate distances of
+synthetic_geometry nodes, in ms), and must give the same alpha position, score,
+CH assignment and distances. Reported: time per fitness evaluation, and the
+whole search scaled to 500 iterations (clustering_setup.txt).
+
+update_wolves: the array update of all wolves against the previous per-element
+loop (six random.random() draws and a scalar sigmoid per wolf and node), per
+iteration on an --agents x n population. The two draw different random numbers,
+so their outputs are compared by the share of ones over many updates.
+
+fitness_workers: the whole binary_gwo search with --workers processes
+(FitnessPool) against one, same seed; the result must be the same. Below
+bgwo1.PARALLEL_MIN_FEATURES nodes binary_gwo stays sequential ("pool" no).
+Needs as many free cores as workers to show a gain.
+
+    python3 bench_bgwo.py --n 25 50 162 --iters 20 --agents 40 --threshold 10 --workers 2 4
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import time
+
+import numpy as np
+
+import bgwo1
+from synthetic_geometry import synthetic_nodes
+
+
+def legacy_fitness_function(solution, latency_threshold):
+    """The previous fitness_function (per-pair loops, ch.count per CH)."""
+    node_name, rtts_matrix, num_features = bgwo1.node_name, bgwo1.rtts_matrix, bgwo1.num_features
+    dist = [10000] * num_features
+    ch = [-1] * num_features
+    ave = 0.0
+    for i in range(len(solution)):
+        if solution[i] == 0:
+            min_node = 10000
+            min_dist = 10000
+            for j in range(len(solution)):
+                if solution[j] == 1:
+                    y = rtts_matrix[node_name[i]][node_name[j]]
+                    if y < latency_threshold and y < min_dist:
+                        min_node = j
+                        min_dist = y
+            ch[i] = min_node
+            dist[i] = min_dist
+    N = len(solution)
+    for i in range(N):
+        if solution[i] == 1:
+            if ch.count(i) == 0:
+                mind = 10000
+                mini = 10000
+                for j in range(N):
+                    if i != j and solution[j] == 1:
+                        y = rtts_matrix[node_name[i]][node_name[j]]
+                        if y < latency_threshold and y < mind:
+                            mini = j
+                            mind = y
+                if mind != 10000:
+                    ch[i] = mini
+                    solution[i] = 0
+                    dist[i] = mind
+    s2 = 0
+    c1 = 0
+    for i in range(len(solution)):
+        if ch[i] != -1:
+            s2 = s2 + dist[i]
+            c1 = c1 + 1
+    if c1 != 0:
+        ave = s2 / c1
+    counter = 0
+    for i in range(len(solution)):
+        if solution[i] == 0 and ch[i] == -1:
+            counter = counter + 1
+    fit = (sum(solution) / len(solution)) + (counter / len(solution)) + (ave / latency_threshold)
+    return fit, ch, dist
+
+
+def legacy_update_wolves(wolves, alpha_pos, beta_pos, delta_pos, a):
+    """The previous per-element position update."""
+    num_agents, num_features = wolves.shape
+    for i in range(num_agents):
+        for j in range(num_features):
+            X = 0.0
+            for leader in (alpha_pos, beta_pos, delta_pos):
+                r1, r2 = random.random(), random.random()
+                A = 2 * a * r1 - a
+                C = 2 * r2
+                X += leader[j] - A * abs(C * leader[j] - wolves[i][j])
+            wolves[i][j] = 1 if bgwo1.sigmoid(X / 3) > random.random() else 0
+    return wolves
+
+
+def load_rtts(n, seed):
+    """Full RTT dict-of-dicts (ms, 3 decimals) from synthetic coordinates."""
+    nodes = synthetic_nodes(n, seed=seed)
+    names = [nd["name"] for nd in nodes]
+    vecs = np.array([nd["coordinate"]["Vec"] for nd in nodes])
+    ms = np.round(np.linalg.norm(vecs[:, None, :] - vecs[None, :, :], axis=2) * 1000, 3)
+    bgwo1.node_name = names
+    bgwo1.num_features = n
+    bgwo1.rtts_matrix = {a: {b: float(ms[i, j]) for j, b in enumerate(names) if j != i} for i, a in enumerate(names)}
+    bgwo1.rtt_array = bgwo1.build_rtt_array(names, bgwo1.rtts_matrix)
+
+
+def run(fitness, args, n, seed):
+    """(binary_gwo result, seconds inside fitness, seconds in total)."""
+    spent = [0.0]
+
+    def timed_fitness(solution, latency_threshold):
+        t = time.perf_counter()
+        try:
+            return fitness(solution, latency_threshold)
+        finally:
+            spent[0] += time.perf_counter() - t
+
+    bgwo1.fitness_function = timed_fitness
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = bgwo1.binary_gwo(args.agents, n, args.iters, args.threshold, seed=seed)
+    return out, spent[0], time.perf_counter() - t0
+
+
+def bench_update(n, args, repeats=20):
+    """(legacy ms, array ms) per update of all wolves, and the share of ones each produces."""
+    rng = np.random.default_rng(0)
+    alpha, beta, delta = rng.integers(2, size=(3, n)).astype(float)
+    start = rng.integers(2, size=(args.agents, n))
+    random.seed(0)
+    timings, ones = [], []
+    for update in (lambda w, a: legacy_update_wolves(w, alpha, beta, delta, a),
+                   lambda w, a: bgwo1.update_wolves(w, alpha, beta, delta, a, rng)):
+        update(start.copy(), 2.0)  # warm-up (allocates the array update's buffers)
+        wolves = start.copy()
+        total = 0.0
+        t0 = time.perf_counter()
+        for k in range(repeats):
+            total += update(wolves, 2 - 2 * k / repeats).mean()
+        timings.append((time.perf_counter() - t0) / repeats * 1e3)
+        ones.append(total / repeats)
+    return timings, ones
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, nargs="+", default=[25, 50, 162])
+    ap.add_argument("--iters", type=int, default=20, help="binary_gwo iterations (clustering_setup.txt uses 500)")
+    ap.add_argument("--agents", type=int, default=40)
+    ap.add_argument("--threshold", type=float, default=10.0, help="latency threshold (ms), as member.py max_latency")
+    ap.add_argument("--seeds", type=int, default=3)
+    ap.add_argument("--workers", type=int, nargs="+", default=[2, 4], help="fitness_workers to compare with 1")
+    args = ap.parse_args()
+
+    vectorized = bgwo1.fitness_function
+    print(f"{'n':>5} {'legacy ms/eval':>15} {'dense ms/eval':>14} {'speedup':>8} "
+          f"{'legacy 500 it s':>16} {'dense 500 it s':>15}  same")
+    for n in args.n:
+        fit_old = fit_new = total_old = total_new = 0.0
+        same = True
+        for seed in range(args.seeds):
+            load_rtts(n, seed)
+            old, f_old, t_old = run(legacy_fitness_function, args, n, seed)
+            new, f_new, t_new = run(vectorized, args, n, seed)
+            fit_old, fit_new, total_old, total_new = fit_old + f_old, fit_new + f_new, total_old + t_old, total_new + t_new
+            same &= (np.array_equal(old[0], new[0]) and old[1] == new[1]
+                     and list(old[2]) == list(new[2]) and list(old[3]) == list(new[3]))
+        evals = args.seeds * args.iters * args.agents
+        scale = 500 / args.iters / args.seeds
+        print(f"{n:>5} {fit_old / evals * 1e3:>15.3f} {fit_new / evals * 1e3:>14.3f} {fit_old / fit_new:>7.1f}x "
+              f"{total_old * scale:>16.1f} {total_new * scale:>15.1f}  {same}")
+    bgwo1.fitness_function = vectorized
+
+    print(f"\n{'n':>5} {'legacy ms/update':>17} {'array ms/update':>16} {'speedup':>8} {'ones legacy/array':>18}")
+    for n in args.n:
+        (old, new), (ones_old, ones_new) = bench_update(n, args)
+        print(f"{n:>5} {old:>17.3f} {new:>16.3f} {old / new:>7.0f}x {ones_old:>10.3f} / {ones_new:.3f}")
+
+    print(f"\n{os.cpu_count()} CPUs")
+    print(f"{'n':>5} {'workers':>8} {'pool':>5} {'ms/iteration':>13} {'speedup':>8}  same")
+    for n in args.n:
+        load_rtts(n, 0)
+        base = None
+        for workers in [1] + args.workers:
+            pooled = workers > 1 and n >= bgwo1.PARALLEL_MIN_FEATURES and args.agents >= 2 * workers
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                out = bgwo1.binary_gwo(args.agents, n, args.iters, args.threshold, seed=0, workers=workers)
+            ms = (time.perf_counter() - t0) / args.iters * 1e3
+            base = base or (out, ms)
+            same = (np.array_equal(base[0][0], out[0]) and base[0][1] == out[1]
+                    and list(base[0][2]) == list(out[2]) and list(base[0][3]) == list(out[3]))
+            print(f"{n:>5} {workers:>8} {'yes' if pooled else 'no':>5} {ms:>13.2f} {base[1] / ms:>7.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
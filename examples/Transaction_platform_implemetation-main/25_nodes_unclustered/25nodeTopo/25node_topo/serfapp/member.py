@@ -12,6 +12,7 @@ import requests
 import subprocess
 import re
 import sys 
+import threading
 
 from dataclasses import dataclass
 @dataclass
@@ -488,11 +489,181 @@ def get_serf_node_name():
 #---------------------------------------------------------------------------------------------------------------
 
 
+#---------------------------------------------------------------------------------------------------------------
+
+def run_clustering(hostIP):
+    # Runs on its own thread (message 100): BGWO takes seconds to minutes and the
+    # UDP loop keeps answering messages meanwhile
+    global node_status
+    global node_IPs
+    try:
+        node_counter=0
+
+        nodes_name= []
+        # calling BGWO
+        final_ch,final_members,node_IPs,nodes_name, dist=bgwo1.clustering_BGWO(max_latency)
+        print("final_ch", final_ch)
+                    
+        anjem_port=4947
+        print("\nClustering output", flush=True)
+        for i in range(len(final_members)):
+            print("=" * 80) 
+            print(f"{i+1}th CLuster     ")
+                        
+            CH_PORT=str(anjem_port+i)
+            struct[node_counter].ch_port=CH_PORT
+            print('port=',CH_PORT)
+                        
+                        
+            print("\nClusterhead ")
+            print("Index           Hostname                    IP address")
+
+            print("-" * 60) 
+            print(f"{final_ch[i]:<10}    ",end='')
+            print(f"{nodes_name[final_ch[i]]:<30}",end='')
+            #str_anjem=str_anjem+'"'+nodes_name[final_ch[i]]+'", IP:'
+            CH_NAME=nodes_name[final_ch[i]]
+            struct[node_counter].ch_name=nodes_name[final_ch[i]]
+                        
+                        
+            print(f"{node_IPs[final_ch[i]]:<20}")
+            #
+            CH_IP=node_IPs[final_ch[i]]
+            struct[node_counter].ch_IP=node_IPs[final_ch[i]]
+            struct[node_counter].role=2
+                        
+            struct[node_counter].node_IP=CH_IP
+            struct[node_counter].node_name=CH_NAME
+                        
+            print("\nCluster Members info")
+            print("Index           Hostname                    IP address            distance")
+
+            print("-" * 60) 
+            for j in range(len(final_members[i])):
+                node_counter=node_counter+1
+                            
+                struct[node_counter].ch_IP=CH_IP
+                struct[node_counter].ch_name=CH_NAME
+                struct[node_counter].role=1
+                struct[node_counter].ch_port=CH_PORT
+
+                print(f"{final_members[i][j]:<10}    ",end='')
+                print(f"{nodes_name[final_members[i][j]]:<30}",end='')
+                struct[node_counter].node_name=nodes_name[final_members[i][j]]
+                            
+                print(f"{node_IPs[final_members[i][j]]:<20}",end="")
+                print(f"{dist[final_members[i][j]]:<20}")
+                struct[node_counter].node_IP=node_IPs[final_members[i][j]]
+                struct[node_counter].node_distance=dist[final_members[i][j]]
+            node_counter=node_counter+1     
+        print('counter=',node_counter)
+        for i in range(node_counter):
+                print(struct[i].ch_IP, "  ", struct[i].ch_name,"  port=", struct[i].ch_port,"  ",  struct[i].role,"  ",struct[i].node_IP, "  ",struct[i].node_name)
+
+        if len(final_members)==0:
+            zz=0
+        else:
+            zz=i+1    
+
+        print('\n\nclusters with no member ')  
+        for k in range(zz,len(final_ch)):
+            print("=" * 80) 
+            print(f"{zz+1}th CLuster     ")
+            #str_anjem=str_anjem+str(zz+1)+":{"+chr(13) + chr(10)+"port:"+str(anjem_port+zz)+","+chr(13)+chr(10)+"head:{name:"
+
+            print("\nClusterhead ")
+            print("Index           Hostname                    IP address")
+            print("-" * 60) 
+            print(f"{final_ch[k]:<10}    ",end='')
+            print(f"{nodes_name[final_ch[k]]:<30}",end='')
+            #str_anjem=str_anjem+'"'+nodes_name[final_ch[k]]+'", IP:'
+            print(f"{node_IPs[final_ch[k]]:<20}")
+            #str_anjem=str_anjem+node_IPs[final_ch[i]]+"},"
+            zz=zz+1 
+        #str_anjem=str_anjem+"}"
+        # Example: head:{...},\n}  → head:{...}\n}
+        #str_anjem = re.sub(r',\s*\n\s*\}', '\n}', str_anjem)
+        # Optionally add wrapping braces to make it look like a single dictionary
+        #str_anjem = "{\n" + str_anjem + "\n}"
+        #print(str_anjem)
+        print("\n") 
+        print("#" * 60) 
+        print("Clustering Results is over\n") 
+        # Collect CH info (names, IPs, base ports) in order of final_ch
+        ch_names = []
+        ch_ips   = []
+        ch_base_ports = []
+
+        for i in range(len(final_members)):
+            ch_idx = final_ch[i]
+            ch_names.append(nodes_name[ch_idx])
+            ch_ips.append(node_IPs[ch_idx])
+            ch_base_ports.append(str(anjem_port + i))  # This is the CH_PORT you print above
+
+        # If there are CHs without members, also append them:
+        if len(final_members) < len(final_ch):
+            for k in range(len(final_members), len(final_ch)):
+                ch_idx = final_ch[k]
+                ch_names.append(nodes_name[ch_idx])
+                ch_ips.append(node_IPs[ch_idx])
+                ch_base_ports.append(str(anjem_port + k))
+
+        iam_CH=0
+        for i in range(len(final_ch)):
+            if node_IPs[final_ch[i]]==hostIP:
+                iam_CH=1
+                my_idx = final_ch.pop(i)
+                final_ch.insert(0, my_idx)
+                            
+        if iam_CH==1:
+            node_status= 2  # node is a CH, it must wait to receive join request
+            print("\nNode is a CH")
+            print("\nLet's wait for receiving join request ")
+            # compute my WAN port from my base port (the CH_PORT assigned to me)
+            # find my index in ch_ips
+            #my_idx = next((i for i,(ip) in enumerate(ch_ips) if ip == hostIP), None)
+            '''if my_idx is not None:
+                # 2) WAN Serf for CH-to-CH overlay (NEW)
+                wan_port = WAN_PORT_OFFSET
+                wan_rpc  = WAN_RPC_OFFSET
+                print("Starting CH-to-CH (WAN) serf...")
+                run_cmd(
+                    f"nohup ./serf agent "
+                    f"-bind={hostIP}:{wan_port} "
+                    f"-advertise={hostIP}:{wan_port} "
+                    f"-rpc-addr=127.0.0.1:{wan_rpc} "
+                    f"-node={wan_hostname}-wan "
+                    f"> serf_wan_{wan_port}.log 2>&1 &"
+                )
+                print(f"WAN serf started on {hostIP}:{wan_port} (rpc {wan_rpc})")'''
+        else:
+            node_status= 1
+            XML_output(final_ch,final_members,node_IPs) 
+            print("\n creating XML file")
+                    
+        print("Sending clustering results to the network") 
+        #print(str_anjem)
+        print("======================================")
+        print("")     
+        for i in range(len(node_IPs)):  
+            if struct[i].node_IP!=hostIP:
+                str_anjem="ch_ip="+struct[i].ch_IP+",ch_name="+ struct[i].ch_name+",ch_port="+struct[i].ch_port+",role="+str(struct[i].role)+",node_ip="+struct[i].node_IP+",node_name="+struct[i].node_name + ",wan_chIp="+node_IPs[final_ch[0]]
+                send_clustering_result("200",struct[i].node_IP, str_anjem)    
+            else:    
+                mein="ch_ip="+struct[i].ch_IP+",ch_name="+ struct[i].ch_name+",ch_port="+struct[i].ch_port+",role="+str(struct[i].role)+",node_ip="+struct[i].node_IP+",node_name="+struct[i].node_name + ",wan_chIp="+node_IPs[final_ch[0]]
+                handling_200(mein)
+                    
+
+    except Exception as e:
+        print("❌ Error in handling message with code 100 : ",e)
+
 #---------------------------------------------------------------------------------------------------------------
 
 def start_server(hostIP="", port=5000, hname=""):
 #    try:
         global node_status
+        global node_IPs
+        clustering_thread = None
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         server_socket.bind((hostIP, port))
         print(f"\nServer started on {hostIP}:{port}. \nWaiting for messages...")
@@ -525,168 +696,13 @@ def start_server(hostIP="", port=5000, hname=""):
             message1 = message[3:]
         #---------------------------------------------------   
             if msg_code==100:     # Cluster_init message
-                try:
-                    node_counter=0
-
-                    nodes_name= []
-                    response = "Ack     100 call clustering" 
-                    server_socket.sendto(response.encode(), client_address)  # Send reply to detected client
-                    # calling BGWO
-                    final_ch,final_members,node_IPs,nodes_name, dist=bgwo1.clustering_BGWO(max_latency)
-                    print("final_ch", final_ch)
-                    
-                    anjem_port=4947
-                    print("\nClustering output", flush=True)
-                    for i in range(len(final_members)):
-                        print("=" * 80) 
-                        print(f"{i+1}th CLuster     ")
-                        
-                        CH_PORT=str(anjem_port+i)
-                        struct[node_counter].ch_port=CH_PORT
-                        print('port=',CH_PORT)
-                        
-                        
-                        print("\nClusterhead ")
-                        print("Index           Hostname                    IP address")
-
-                        print("-" * 60) 
-                        print(f"{final_ch[i]:<10}    ",end='')
-                        print(f"{nodes_name[final_ch[i]]:<30}",end='')
-                        #str_anjem=str_anjem+'"'+nodes_name[final_ch[i]]+'", IP:'
-                        CH_NAME=nodes_name[final_ch[i]]
-                        struct[node_counter].ch_name=nodes_name[final_ch[i]]
-                        
-                        
-                        print(f"{node_IPs[final_ch[i]]:<20}")
-                        #
-                        CH_IP=node_IPs[final_ch[i]]
-                        struct[node_counter].ch_IP=node_IPs[final_ch[i]]
-                        struct[node_counter].role=2
-                        
-                        struct[node_counter].node_IP=CH_IP
-                        struct[node_counter].node_name=CH_NAME
-                        
-                        print("\nCluster Members info")
-                        print("Index           Hostname                    IP address            distance")
-
-                        print("-" * 60) 
-                        for j in range(len(final_members[i])):
-                            node_counter=node_counter+1
-                            
-                            struct[node_counter].ch_IP=CH_IP
-                            struct[node_counter].ch_name=CH_NAME
-                            struct[node_counter].role=1
-                            struct[node_counter].ch_port=CH_PORT
-
-                            print(f"{final_members[i][j]:<10}    ",end='')
-                            print(f"{nodes_name[final_members[i][j]]:<30}",end='')
-                            struct[node_counter].node_name=nodes_name[final_members[i][j]]
-                            
-                            print(f"{node_IPs[final_members[i][j]]:<20}",end="")
-                            print(f"{dist[final_members[i][j]]:<20}")
-                            struct[node_counter].node_IP=node_IPs[final_members[i][j]]
-                            struct[node_counter].node_distance=dist[final_members[i][j]]
-                        node_counter=node_counter+1     
-                    print('counter=',node_counter)
-                    for i in range(node_counter):
-                            print(struct[i].ch_IP, "  ", struct[i].ch_name,"  port=", struct[i].ch_port,"  ",  struct[i].role,"  ",struct[i].node_IP, "  ",struct[i].node_name)
-
-                    if len(final_members)==0:
-                        zz=0
-                    else:
-                        zz=i+1    
-
-                    print('\n\nclusters with no member ')  
-                    for k in range(zz,len(final_ch)):
-                        print("=" * 80) 
-                        print(f"{zz+1}th CLuster     ")
-                        #str_anjem=str_anjem+str(zz+1)+":{"+chr(13) + chr(10)+"port:"+str(anjem_port+zz)+","+chr(13)+chr(10)+"head:{name:"
-
-                        print("\nClusterhead ")
-                        print("Index           Hostname                    IP address")
-                        print("-" * 60) 
-                        print(f"{final_ch[k]:<10}    ",end='')
-                        print(f"{nodes_name[final_ch[k]]:<30}",end='')
-                        #str_anjem=str_anjem+'"'+nodes_name[final_ch[k]]+'", IP:'
-                        print(f"{node_IPs[final_ch[k]]:<20}")
-                        #str_anjem=str_anjem+node_IPs[final_ch[i]]+"},"
-                        zz=zz+1 
-                    #str_anjem=str_anjem+"}"
-                    # Example: head:{...},\n}  → head:{...}\n}
-                    #str_anjem = re.sub(r',\s*\n\s*\}', '\n}', str_anjem)
-                    # Optionally add wrapping braces to make it look like a single dictionary
-                    #str_anjem = "{\n" + str_anjem + "\n}"
-                    #print(str_anjem)
-                    print("\n") 
-                    print("#" * 60) 
-                    print("Clustering Results is over\n") 
-                    # Collect CH info (names, IPs, base ports) in order of final_ch
-                    ch_names = []
-                    ch_ips   = []
-                    ch_base_ports = []
-
-                    for i in range(len(final_members)):
-                        ch_idx = final_ch[i]
-                        ch_names.append(nodes_name[ch_idx])
-                        ch_ips.append(node_IPs[ch_idx])
-                        ch_base_ports.append(str(anjem_port + i))  # This is the CH_PORT you print above
-
-                    # If there are CHs without members, also append them:
-                    if len(final_members) < len(final_ch):
-                        for k in range(len(final_members), len(final_ch)):
-                            ch_idx = final_ch[k]
-                            ch_names.append(nodes_name[ch_idx])
-                            ch_ips.append(node_IPs[ch_idx])
-                            ch_base_ports.append(str(anjem_port + k))
-
-                    iam_CH=0
-                    for i in range(len(final_ch)):
-                        if node_IPs[final_ch[i]]==hostIP:
-                            iam_CH=1
-                            my_idx = final_ch.pop(i)
-                            final_ch.insert(0, my_idx)
-                            
-                    if iam_CH==1:
-                        node_status= 2  # node is a CH, it must wait to receive join request
-                        print("\nNode is a CH")
-                        print("\nLet's wait for receiving join request ")
-                        # compute my WAN port from my base port (the CH_PORT assigned to me)
-                        # find my index in ch_ips
-                        #my_idx = next((i for i,(ip) in enumerate(ch_ips) if ip == hostIP), None)
-                        '''if my_idx is not None:
-                            # 2) WAN Serf for CH-to-CH overlay (NEW)
-                            wan_port = WAN_PORT_OFFSET
-                            wan_rpc  = WAN_RPC_OFFSET
-                            print("Starting CH-to-CH (WAN) serf...")
-                            run_cmd(
-                                f"nohup ./serf agent "
-                                f"-bind={hostIP}:{wan_port} "
-                                f"-advertise={hostIP}:{wan_port} "
-                                f"-rpc-addr=127.0.0.1:{wan_rpc} "
-                                f"-node={wan_hostname}-wan "
-                                f"> serf_wan_{wan_port}.log 2>&1 &"
-                            )
-                            print(f"WAN serf started on {hostIP}:{wan_port} (rpc {wan_rpc})")'''
-                    else:
-                        node_status= 1
-                        XML_output(final_ch,final_members,node_IPs) 
-                        print("\n creating XML file")
-                    
-                    print("Sending clustering results to the network") 
-                    #print(str_anjem)
-                    print("======================================")
-                    print("")     
-                    for i in range(len(node_IPs)):  
-                        if struct[i].node_IP!=hostIP:
-                            str_anjem="ch_ip="+struct[i].ch_IP+",ch_name="+ struct[i].ch_name+",ch_port="+struct[i].ch_port+",role="+str(struct[i].role)+",node_ip="+struct[i].node_IP+",node_name="+struct[i].node_name + ",wan_chIp="+node_IPs[final_ch[0]]
-                            send_clustering_result("200",struct[i].node_IP, str_anjem)    
-                        else:    
-                            mein="ch_ip="+struct[i].ch_IP+",ch_name="+ struct[i].ch_name+",ch_port="+struct[i].ch_port+",role="+str(struct[i].role)+",node_ip="+struct[i].node_IP+",node_name="+struct[i].node_name + ",wan_chIp="+node_IPs[final_ch[0]]
-                            handling_200(mein)
-                    
-
-                except Exception as e:
-                    print("❌ Error in handling message with code 100 : ",e)
+                response = "Ack     100 call clustering" 
+                server_socket.sendto(response.encode(), client_address)  # Send reply to detected client
+                if clustering_thread is not None and clustering_thread.is_alive():
+                    print("Clustering is already running, message 100 ignored")
+                else:
+                    clustering_thread = threading.Thread(target=run_clustering, args=(hostIP,), daemon=True)
+                    clustering_thread.start()
            
             #---------------------------------------------------   
             elif msg_code==200:  #  Bootstrap Send clustering results and node joins to proper cluster
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+members_cache.py
+
+Local Serf membership cache shared by every consumer on one serf node.
+
+- Takes one `./serf members -format=json` snapshot at startup.
+- Follows `./serf monitor` and re-snapshots on member join/leave/failed/update/reap
+  events (bursts are debounced into one snapshot), plus a slow periodic resync.
+- Serves the snapshot as pre-serialized JSON (same shape as `serf members -format=json`)
+  with a version counter and a strong ETag; `If-None-Match` answers 304.
+- MembersCacheClient keeps the last decoded table and only re-downloads on change.
+"""
+
+import argparse, hashlib, json, re, subprocess, threading, time
+import urllib.error, urllib.request
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_SERF_RPC = "127.0.0.1:7373"
+DEFAULT_SERF_BIN = "./serf"
+DEFAULT_HTTP_PORT = 4043
+MEMBER_EVENT_RE = re.compile(r"EventMember(Join|Leave|Failed|Update|Reap)")
+
+# ------------------------------- Snapshot ---------------------------------
+class MembersSnapshot:
+    """Current member table plus its serialized form; swapped atomically on change."""
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.version = 0
+        self.data: Dict[str, Any] = {"members": []}
+        self.body = b'{"members":[]}'
+        self.etag = '"0"'
+        self.updated_at = 0.0
+
+    def publish(self, data: Dict[str, Any]) -> bool:
+        body = json.dumps(data, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        digest = hashlib.sha1(body).hexdigest()[:20]
+        with self.lock:
+            self.updated_at = time.time()
+            if self.etag == f'"{digest}"':
+                return False
+            self.version += 1
+            self.data, self.body, self.etag = data, body, f'"{digest}"'
+            self.lock.notify_all()
+            return True
+
+    def get(self) -> Tuple[int, str, bytes]:
+        with self.lock:
+            return self.version, self.etag, self.body
+
+def serf_members(serf_bin: str, rpc_addr: str, timeout: float = 5.0) -> Optional[Dict[str, Any]]:
+    try:
+        res = subprocess.run([serf_bin, "members", f"-rpc-addr={rpc_addr}", "-format=json"],
+                             capture_output=True, text=True, timeout=timeout)
+    except Exception as e:
+        print(f"[members-cache] serf members raised: {e}")
+        return None
+    if res.returncode != 0:
+        print(f"[members-cache] serf members failed: {(res.stderr or '').strip() or res.returncode}")
+        return None
+    try:
+        data = json.loads(res.stdout or "{}")
+    except Exception as e:
+        print(f"[members-cache] json decode error: {e}")
+        return None
+    members = data.get("members") or data.get("Members") or []
+    # Stable order so identical tables produce identical bytes/ETags
+    members = sorted((m for m in members if isinstance(m, dict)),
+                     key=lambda m: str(m.get("name") or m.get("Name") or ""))
+    return {"members": members}
+
+# ------------------------------- Refreshers --------------------------------
+def start_refresher(snap: MembersSnapshot, serf_bin: str, rpc_addr: str,
+                    resync_secs: float, debounce_s: float) -> threading.Event:
+    """One thread owns `serf members`; others only set `dirty` to request a snapshot."""
+    dirty = threading.Event()
+
+    def loop():
+        while True:
+            dirty.wait(timeout=resync_secs)
+            if dirty.is_set():
+                time.sleep(debounce_s)  # coalesce event bursts into one snapshot
+                dirty.clear()
+            data = serf_members(serf_bin, rpc_addr)
+            if data is not None and snap.publish(data):
+                print(f"[members-cache] v{snap.version}: {len(data['members'])} members")
+
+    threading.Thread(target=loop, name="members-refresh", daemon=True).start()
+    return dirty
+
+def start_event_follower(dirty: threading.Event, serf_bin: str, rpc_addr: str):
+    """Tails `serf monitor` and marks the table dirty on every member event."""
+    def loop():
+        backoff = 0.5
+        while True:
+            try:
+                proc = subprocess.Popen([serf_bin, "monitor", f"-rpc-addr={rpc_addr}", "-log-level=info"],
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+                dirty.set()  # may have missed events while disconnected
+                backoff = 0.5
+                for line in proc.stdout:
+                    if MEMBER_EVENT_RE.search(line):
+                        dirty.set()
+                proc.wait()
+                print(f"[members-cache] serf monitor exited ({proc.returncode}); reconnecting")
+            except Exception as e:
+                print(f"[members-cache] serf monitor raised: {e}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 10.0)
+
+    threading.Thread(target=loop, name="members-monitor", daemon=True).start()
+
+# ------------------------------ HTTP server ------------------------------
+def start_http_server(snap: MembersSnapshot, host: str, port: int, path: str):
+    import http.server, socketserver
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] == path:
+                version, etag, body = snap.get()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("X-Members-Version", str(version))
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("X-Members-Version", str(version))
+                self.end_headers()
+                self.wfile.write(body)
+            elif self.path == "/healthz":
+                self.send_response(200); self.end_headers(); self.wfile.write(b"ok")
+            else:
+                self.send_response(404); self.end_headers()
+        def log_message(self, fmt, *args): return
+
+    class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    t = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.5}, daemon=True)
+    t.start()
+    print(f"[http] members cache at http://{host}:{port}{path}")
+    return httpd
+
+# --------------------------------- Client ---------------------------------
+class MembersCacheClient:
+    """
+    Conditional reader for the cache. Returns (version, data) where `data` is the decoded
+    `{"members": [...]}` table; unchanged tables are served from memory (304 or min_interval_s).
+    """
+
+    def __init__(self, url: str, timeout: float = 2.0, min_interval_s: float = 0.0):
+        self.url = url
+        self.timeout = timeout
+        self.min_interval_s = min_interval_s
+        self.version: Optional[int] = None
+        self.etag: Optional[str] = None
+        self.data: Optional[Dict[str, Any]] = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self) -> Tuple[int, Dict[str, Any]]:
+        with self.lock:
+            now = time.monotonic()
+            if self.data is not None and now - self.checked_at < self.min_interval_s:
+                return self.version, self.data
+            req = urllib.request.Request(self.url)
+            if self.etag:
+                req.add_header("If-None-Match", self.etag)
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                    data = json.load(resp)
+                    self.etag = resp.headers.get("ETag")
+                    self.version = int(resp.headers.get("X-Members-Version") or 0)
+                    self.data = data
+            except urllib.error.HTTPError as e:
+                if e.code != 304 or self.data is None:
+                    raise
+            self.checked_at = now
+            return self.version, self.data
+
+# ---------------------------------- Main ----------------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Event-driven local cache of `serf members` served over HTTP.")
+    ap.add_argument("--rpc-addr", default=DEFAULT_SERF_RPC, help="Serf RPC address")
+    ap.add_argument("--serf", default=DEFAULT_SERF_BIN, help="path to the serf binary")
+    ap.add_argument("--http-host", default="127.0.0.1")
+    ap.add_argument("--http-port", type=int, default=DEFAULT_HTTP_PORT)
+    ap.add_argument("--http-path", default="/members")
+    ap.add_argument("--resync-secs", type=float, default=30.0, help="full resync interval even without events")
+    ap.add_argument("--debounce-ms", type=float, default=200.0, help="coalesce member events within this window")
+    args = ap.parse_args()
+
+    snap = MembersSnapshot()
+    data = serf_members(args.serf, args.rpc_addr)
+    if data is not None:
+        snap.publish(data)
+        print(f"[members-cache] v{snap.version}: {len(data['members'])} members")
+
+    dirty = start_refresher(snap, args.serf, args.rpc_addr,
+                            max(1.0, args.resync_secs), max(0.0, args.debounce_ms / 1000.0))
+    start_event_follower(dirty, args.serf, args.rpc_addr)
+    start_http_server(snap, args.http_host, args.http_port, args.http_path)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\n[main] stopped by user")
+
+if __name__ == "__main__":
+    main()
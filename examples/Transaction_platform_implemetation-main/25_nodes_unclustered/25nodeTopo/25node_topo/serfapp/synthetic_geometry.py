@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Synthetic inputs for benchmarking service_discovery_v7.py without a live lab:
+
+    synthetic_nodes     /cluster-status geometry (clustered Vivaldi coordinates, optional rtts)
+    synthetic_members   `serf members -format=json` documents with resource/price/score tags
+    FakeSerf            stands in for ./serf: answers `members` for the query node's LAN
+                        and `query ch.ask-remote-res` like a cluster head, in Serf's JSON
+
+FakeSerf.run has the subprocess.run signature, so installing it with
+`sd.subprocess = FakeSerf(...).module()` drives the real member/CH code paths
+(payload building, CH cache, JSON parsing) with no processes spawned.
+"""
+import json
+import subprocess
+import time
+import types
+
+import numpy as np
+
+NAME_FORMAT = "clab-century-serf{}"
+CPU_CHOICES = [1, 2, 4, 8, 16, 32]
+RESOURCE_TAGS = ["cpu", "ram", "storage", "gpu",
+                 "price_per_cpu", "price_per_ram", "price_per_storage", "price_per_gpu",
+                 "score_per_cpu", "score_per_ram", "score_per_storage", "score_per_gpu"]
+
+
+def synthetic_nodes(n, dims=8, clusters=25, seed=7, rtt_neighbors=0, heights=False):
+    """
+    Vivaldi-like geometry: nodes scattered around a few cluster centres.
+    rtt_neighbors > 0 adds an "rtts" map (ms, coordinate distance +-10%) to that many
+    other nodes, mostly from the node's own cluster, as the lab's /cluster-status does.
+    heights=True adds Serf-like Height (0.1-2 ms) and Adjustment values.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0, 0.05, size=(clusters, dims))
+    member = rng.integers(0, clusters, size=n)
+    vecs = centres[member] + rng.normal(0, 0.005, size=(n, dims))
+    nodes = [{"name": NAME_FORMAT.format(i), "coordinate": {"Vec": vecs[i].tolist(), "Height": 1e-5}}
+             for i in range(n)]
+    if heights:
+        for node, h, a in zip(nodes, rng.uniform(1e-4, 2e-3, n), rng.normal(0, 2e-4, n)):
+            node["coordinate"].update(Height=float(h), Adjustment=float(a))
+    if rtt_neighbors > 0 and n > 1:
+        k = min(rtt_neighbors, n - 1)
+        by_cluster = [np.flatnonzero(member == c) for c in range(clusters)]
+        for i, node in enumerate(nodes):
+            own = by_cluster[member[i]]
+            near = rng.choice(own, size=min(len(own), k), replace=False)
+            far = rng.integers(0, n, size=max(0, k - len(near)))
+            peers = np.unique(np.concatenate([near, far]))
+            peers = peers[peers != i]
+            ms = np.linalg.norm(vecs[peers] - vecs[i], axis=1) * 1000 * rng.uniform(0.9, 1.1, len(peers))
+            node["rtts"] = {NAME_FORMAT.format(j): round(float(r), 3) for j, r in zip(peers.tolist(), ms)}
+    for node, c in zip(nodes, member.tolist()):
+        node["cluster"] = c
+    return nodes
+
+
+def synthetic_members(names, seed=7, nan_rate=0.0):
+    """
+    Serf member records with heterogeneous resources and prices (as tag strings).
+    nan_rate is the share of tag values reported as "NaN" (or left out, every other one).
+    """
+    rng = np.random.default_rng(seed)
+    n = len(names)
+    cpu = rng.choice(CPU_CHOICES, size=n, p=[0.1, 0.25, 0.3, 0.2, 0.1, 0.05])
+    values = {
+        "cpu": cpu,
+        "ram": np.round(cpu * rng.choice([1.0, 2.0, 4.0], size=n), 1),
+        "storage": rng.choice([20, 50, 100, 250, 500], size=n),
+        "gpu": np.where(rng.random(n) < 0.1, rng.integers(1, 5, size=n), 0),
+        "price_per_cpu": np.round(rng.lognormal(0.0, 0.5, n), 3),
+        "price_per_ram": np.round(rng.lognormal(-1.0, 0.5, n), 3),
+        "price_per_storage": np.round(rng.lognormal(-3.0, 0.5, n), 4),
+        "price_per_gpu": np.round(rng.lognormal(1.5, 0.5, n), 3),
+        "score_per_cpu": np.round(rng.uniform(0, 1, n), 4),
+        "score_per_ram": np.round(rng.uniform(0, 1, n), 4),
+        "score_per_storage": np.round(rng.uniform(0, 1, n), 4),
+        "score_per_gpu": np.round(rng.uniform(0, 1, n), 4),
+    }
+    broken = rng.random((n, len(RESOURCE_TAGS))) < nan_rate
+    members = []
+    for i, name in enumerate(names):
+        ip = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+        tags = {"ip": ip}
+        for t, tag in enumerate(RESOURCE_TAGS):
+            if not broken[i, t]:
+                tags[tag] = str(values[tag][i])
+            elif (i + t) % 2:
+                tags[tag] = "NaN"
+        members.append({"name": name, "addr": f"{ip}:7946", "status": "alive", "tags": tags})
+    return members
+
+
+def _passes(tags, filters):
+    def num(key):
+        try:
+            return float(tags.get(key, "nan"))
+        except ValueError:
+            return float("nan")
+    for key, want in filters.items():
+        if key.startswith("min_"):  # min_cpu ... min_score_per_gpu
+            ok = num(key[len("min_"):]) >= want
+        elif key.startswith("budget_per_"):
+            ok = num("price_per_" + key[len("budget_per_"):]) <= want
+        else:
+            continue
+        if not ok:
+            return False
+    return True
+
+
+class FakeSerf:
+    """
+    ./serf for one query node: `members` lists `lan` (the node's own cluster),
+    `query ch.ask-remote-res` returns the wanted remote members that pass the
+    request's filters, as one cluster head's response. `latency_s` is added to
+    every CH query; `ch_queries` / `ch_seconds` count them.
+    """
+
+    def __init__(self, members, lan, latency_s=0.0):
+        self.by_name = {m["name"]: m for m in members}
+        self.lan = [self.by_name[nm] for nm in lan if nm in self.by_name]
+        self.latency_s = latency_s
+        self.ch_queries = 0
+        self.ch_seconds = 0.0
+
+    def module(self):
+        """A stand-in for the subprocess module as service_discovery_v7 uses it."""
+        return types.SimpleNamespace(run=self.run, CalledProcessError=subprocess.CalledProcessError)
+
+    def run(self, cmd, capture_output=True, text=True, check=False):
+        if cmd[1] == "members":
+            out = json.dumps({"members": self.lan})
+        elif cmd[1] == "query" and cmd[-2] == "ch.ask-remote-res":
+            out = self._ch_answer(json.loads(cmd[-1]))
+        else:
+            return subprocess.CompletedProcess(cmd, 1, "", f"unsupported: {cmd[1:3]}")
+        return subprocess.CompletedProcess(cmd, 0, out, "")
+
+    def _ch_answer(self, payload):
+        t0 = time.perf_counter()
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        nodes = []
+        for nm in payload.get("wanted_names", []):
+            m = self.by_name.get(nm)
+            if m is not None and _passes(m["tags"], payload):
+                nodes.append(dict(m["tags"], name=nm))
+        self.ch_queries += 1
+        self.ch_seconds += time.perf_counter() - t0
+        return json.dumps({"Acks": ["fake-ch"], "Responses": {"fake-ch": json.dumps({"nodes": nodes})}})
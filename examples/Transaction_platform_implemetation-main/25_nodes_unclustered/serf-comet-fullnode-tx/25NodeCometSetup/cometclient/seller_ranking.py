@@ -0,0 +1,85 @@
+import numpy as np
+
+RESOURCE_FIELDS = ("cpu", "ram", "storage", "gpu")
+PRICE_FIELDS = ("price_per_cpu", "price_per_ram", "price_per_storage", "price_per_gpu")
+SCORE_FIELDS = ("score_per_cpu", "score_per_ram", "score_per_storage", "score_per_gpu")
+NUMERIC_FIELDS = RESOURCE_FIELDS + PRICE_FIELDS + SCORE_FIELDS
+
+
+def _num(v):
+    try:
+        return float(v) if v is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class CandidateTable:
+    """
+    Hilbert results held as column arrays: one float64 array per numeric field
+    (missing/invalid values are NaN) plus parallel name/ip arrays.
+    """
+
+    def __init__(self, results):
+        rows = [r for r in results or [] if isinstance(r, dict) and r.get("name")]
+        self.rows = rows
+        self.names = np.array([str(r["name"]) for r in rows], dtype=object)
+        self.ips = np.array([r.get("ip") for r in rows], dtype=object)
+        self.columns = {f: np.fromiter((_num(r.get(f)) for r in rows), dtype=np.float64, count=len(rows))
+                        for f in NUMERIC_FIELDS}
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def objective(table, weights):
+    """
+    Weighted cost per candidate (lower is better): price fields add w * price,
+    score fields subtract w * score. Candidates with NaN in any weighted field get +inf.
+    """
+    cost = np.zeros(len(table), dtype=np.float64)
+    for field, w in weights.items():
+        if not w:
+            continue
+        col = table.columns[field]
+        cost += (-w if field in SCORE_FIELDS else w) * col
+    return np.where(np.isnan(cost), np.inf, cost)
+
+
+def feasible(table, constraints):
+    """
+    Hard constraints as a boolean mask. Keys: min_<resource> (cpu/ram/storage/gpu),
+    max_price_per_<resource> and min_score_per_<resource>; values <= 0 are ignored.
+    NaN never satisfies a constraint.
+    """
+    mask = np.ones(len(table), dtype=bool)
+    for key, bound in constraints.items():
+        if bound is None or bound <= 0:
+            continue
+        if key.startswith("max_"):
+            mask &= table.columns[key[4:]] <= bound
+        elif key.startswith("min_"):
+            mask &= table.columns[key[4:]] >= bound
+        else:
+            raise ValueError(f"Unknown ranking constraint: {key}")
+    return mask
+
+
+def top_k(table, weights, constraints=None, k=1):
+    """
+    Indices of the k best feasible candidates, best first.
+    Uses a partial selection (argpartition) and only sorts the k winners;
+    ties keep the original result order.
+    """
+    cost = objective(table, weights)
+    if constraints:
+        cost[~feasible(table, constraints)] = np.inf
+    valid = np.flatnonzero(np.isfinite(cost))
+    if valid.size == 0 or k <= 0:
+        return valid[:0]
+    if valid.size > k:
+        part = np.argpartition(cost[valid], k - 1)[:k]
+        # argpartition is not stable: pull in every candidate tied with the k-th cost
+        kth = cost[valid[part]].max()
+        valid = valid[cost[valid] <= kth]
+    order = np.lexsort((valid, cost[valid]))
+    return valid[order][:k]
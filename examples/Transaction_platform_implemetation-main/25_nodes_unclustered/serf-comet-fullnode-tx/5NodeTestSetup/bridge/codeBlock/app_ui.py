@@ -10,6 +10,7 @@ import hashlib
 from datetime import datetime, timezone
 from cometbft_client import MempoolClient
 from serf_client import serf_monitor_thread, app_metrics
+from serving import serve
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -30,8 +31,8 @@ r = redis.Redis(host='localhost', port=6379, decode_responses=True)
 stream_key = "transEventStream"
 
 
-@app.before_request
-def before_request_hook():
+def start_serf_monitor():
+    """Starts the Serf monitor once per process, before the server takes requests."""
     global serf_monitor_thread_started
     with serf_monitor_thread_lock:
         if not serf_monitor_thread_started:
@@ -389,4 +390,5 @@ def index():
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # One process only: the Serf monitor keeps its metrics in memory and must handle every event once
+    serve(app, '0.0.0.0', 5000, workers=1, on_worker_start=start_serf_monitor)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of service_discovery_v7.py on synthetic geometry
+(synthetic_geometry.py), no lab needed. Per size it reports latency and
+tracemalloc memory (peak while running / still held afterwards) of each phase:
+
+    geometry     json.loads of the /cluster-status body
+    index        spatial index build (--index-backend / --hilbert-curves)
+    rtt index    extract_rtts + RttIndex build
+    members      ./serf members -> LAN member table (FakeSerf, --lan-size nodes of the query's cluster)
+    run_once     one discovery per query node; Phase A/B and CH queries through FakeSerf
+
+and for run_once the mean CH queries per run and the share of time spent in the
+fake cluster head. Memory is measured in a second pass, since tracing slows the
+timed one.
+
+    python3 bench_discovery.py --n 1000 10000 100000 --queries 20 --nan-rate 0.02
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import time
+import tracemalloc
+
+import service_discovery_v7 as sd
+from synthetic_geometry import FakeSerf, synthetic_members, synthetic_nodes
+
+
+def measure(fn, traced):
+    """(result, seconds, peak MB, held MB); memory only when traced."""
+    if traced:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = fn()
+    secs = time.perf_counter() - t0
+    peak = held = float("nan")
+    if traced:
+        held, peak = (v / 2 ** 20 for v in tracemalloc.get_traced_memory())
+        tracemalloc.stop()
+    return out, secs, peak, held
+
+
+def run_phases(n, args, traced):
+    nodes = synthetic_nodes(n, rtt_neighbors=args.rtt_neighbors)
+    body = json.dumps(nodes)
+    names = [nd["name"] for nd in nodes]
+    members = synthetic_members(names, nan_rate=args.nan_rate)
+    queries = random.Random(1).sample(nodes, min(args.queries, n))
+    run_args = sd.build_arg_parser().parse_args(
+        ["--geom-url", "synthetic", "--rtt-threshold-ms", str(args.rtt_threshold_ms),
+         "--index-backend", args.index_backend, "--hilbert-curves", str(args.hilbert_curves),
+         "--min-cpu", str(args.min_cpu), "--limit", "10"])
+
+    rows = {}
+    geometry, *rows["geometry"] = measure(lambda: json.loads(body), traced)
+    H, *rows["index"] = measure(lambda: sd.make_spatial_index(geometry, args.index_backend, args.hilbert_curves),
+                                traced)
+    rtt_index, *rows["rtt index"] = measure(lambda: sd.make_rtt_index(sd.extract_rtts(geometry), None), traced)
+
+    def lan_of(q):
+        peers = [nd["name"] for nd in nodes if nd["cluster"] == q["cluster"] and nd is not q]
+        return [q["name"]] + peers[:args.lan_size - 1]
+
+    serfs = [FakeSerf(members, lan_of(q), latency_s=args.ch_latency_ms / 1000) for q in queries]
+    sd.subprocess = serfs[0].module()
+    lan_df, *rows["members"] = measure(lambda: sd.get_lan_members(run_args.rpc_addr), traced)
+
+    def discover_all():
+        for q, serf in zip(queries, serfs):
+            sd.subprocess = serf.module()
+            sd.run_once(q["name"], run_args, H, rtt_index, lan_df=sd.get_lan_members(run_args.rpc_addr))
+
+    _, secs, peak, held = measure(discover_all, traced)
+    rows["run_once"] = [secs / len(queries), peak, held]
+    ch = (sum(s.ch_queries for s in serfs) / len(queries), sum(s.ch_seconds for s in serfs) / secs)
+    return rows, ch
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--queries", type=int, default=20, help="run_once calls per size (different query nodes)")
+    ap.add_argument("--rtt-neighbors", type=int, default=16, help="rtts entries per node")
+    ap.add_argument("--nan-rate", type=float, default=0.02, help="share of member tag values that are NaN/missing")
+    ap.add_argument("--lan-size", type=int, default=50, help="LAN members per query node (rest are remote, via CH)")
+    ap.add_argument("--rtt-threshold-ms", type=float, default=12)
+    ap.add_argument("--min-cpu", type=int, default=16, help="filter run_once uses (higher = more widening)")
+    ap.add_argument("--ch-latency-ms", type=float, default=0.0, help="added to every fake CH query")
+    ap.add_argument("--index-backend", choices=sorted(sd.INDEX_BACKENDS), default="hilbert")
+    ap.add_argument("--hilbert-curves", type=int, default=1)
+    args = ap.parse_args()
+
+    print(f"{'n':>7} {'phase':>10} {'ms':>10} {'peak MB':>8} {'held MB':>8}")
+    for n in args.n:
+        timed, ch = run_phases(n, args, traced=False)
+        traced, _ = run_phases(n, args, traced=True)
+        for phase, (secs, _, _) in timed.items():
+            _, peak, held = traced[phase]
+            print(f"{n:>7} {phase:>10} {secs * 1e3:>10.1f} {peak:>8.1f} {held:>8.1f}")
+        print(f"{n:>7} {'':>10} run_once: {ch[0]:.1f} CH queries/run, {ch[1]:.0%} of its time in the fake CH")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Widening steps with 1..N Hilbert curves (--hilbert-curves) on the recorded
+162-node topology.
+
+The geometry is rebuilt from the lab files: links from 162nodes_ovs.yml, netem
+delays from latency_list.txt (links without a delay count as 0 ms), serf-to-serf
+RTT = 2 x shortest path, embedded into 8-dim Vivaldi-like coordinates with
+classical MDS. Each trial marks a random `--pass-rate` share of the nodes as
+passing the resource filters and walks run_once's Phase B schedule
+(pct_start * span * 2**step) from every serf node until a window holds one.
+Reported per curve count:
+    avg steps    mean Phase B step of the first hit (+1 = CH queries paid)
+    no hit       share of queries that exhaust max_steps
+    stretch      RTT to the best node in that window / RTT to the nearest passing node
+    window       mean names per window (CH query size)
+
+    python3 bench_hilbert_curves.py --curves 1 2 3 4 --trials 20
+"""
+import argparse
+import os
+import random
+import re
+from collections import defaultdict
+
+import numpy as np
+
+from service_discovery_v7 import make_spatial_index
+
+TOPOLOGY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "..", "..", "..", "..", "162_nodes_unclustered", "162-Node-Topology")
+LAB_PREFIX = "clab-nebula-"
+
+
+def load_rtts(topology_dir):
+    """(serf names, RTT ms matrix) from the lab's link list and netem delays."""
+    delay = {}
+    with open(os.path.join(topology_dir, "latency_list.txt")) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3:
+                a, b = (p.split(":")[0].replace(LAB_PREFIX, "") for p in parts[:2])
+                delay[frozenset((a, b))] = float(parts[2])
+    links = defaultdict(dict)
+    with open(os.path.join(topology_dir, "162nodes_ovs.yml")) as f:
+        for a, b in re.findall(r'endpoints:\s*\["([^:"]+):[^"]*",\s*"([^:"]+):[^"]*"\]', f.read()):
+            links[a][b] = links[b][a] = delay.get(frozenset((a, b)), 0.0)
+
+    nodes = sorted(links)
+    at = {n: i for i, n in enumerate(nodes)}
+    dist = np.full((len(nodes), len(nodes)), np.inf)
+    np.fill_diagonal(dist, 0.0)
+    for a, nbrs in links.items():
+        for b, d in nbrs.items():
+            dist[at[a], at[b]] = d
+    for k in range(len(nodes)):  # Floyd-Warshall
+        np.minimum(dist, dist[:, k:k + 1] + dist[k:k + 1, :], out=dist)
+    serf = [n for n in nodes if n.startswith("serf")]
+    pick = [at[n] for n in serf]
+    return [LAB_PREFIX + n for n in serf], 2 * dist[np.ix_(pick, pick)]
+
+
+def mds_nodes(names, rtt_ms, dims=8):
+    """Classical MDS of the RTT matrix (seconds) into geometry nodes."""
+    d2 = (rtt_ms / 1000.0) ** 2
+    j = np.eye(len(names)) - 1.0 / len(names)
+    vals, vecs = np.linalg.eigh(-0.5 * j @ d2 @ j)
+    top = np.argsort(vals)[::-1][:dims]
+    coords = vecs[:, top] * np.sqrt(np.maximum(vals[top], 0.0))
+    return [{"name": nm, "coordinate": {"Vec": coords[i].tolist(), "Height": 0.0}} for i, nm in enumerate(names)]
+
+
+def walk(index, query, passing, pct_start, max_steps):
+    """(step of the first window holding a passing node or None, its passing names, its size)."""
+    span = max(1, index.h_max - index.h_min)
+    delta0 = max(1, int(pct_start * span))
+    window = []
+    for step in range(max_steps + 1):
+        window = index.names_in_raw_window(query, delta0 * 2 ** step)
+        hits = [n for n in window if n in passing]
+        if hits:
+            return step, hits, len(window)
+    return None, [], len(window)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--topology-dir", default=TOPOLOGY_DIR)
+    ap.add_argument("--curves", type=int, nargs="+", default=[1, 2, 3, 4])
+    ap.add_argument("--trials", type=int, default=20, help="random passing sets per curve count")
+    ap.add_argument("--pass-rate", type=float, default=0.05)
+    ap.add_argument("--pct-start", type=float, default=0.02)
+    ap.add_argument("--max-steps", type=int, default=6)
+    args = ap.parse_args()
+
+    names, rtt = load_rtts(args.topology_dir)
+    nodes = mds_nodes(names, rtt)
+    at = {n: i for i, n in enumerate(names)}
+    print(f"{len(names)} serf nodes, RTT {rtt[rtt > 0].min():.2f}-{rtt.max():.2f} ms")
+    print(f"{'curves':>6} {'avg steps':>10} {'no hit':>7} {'stretch':>8} {'window':>7}")
+    for curves in args.curves:
+        index = make_spatial_index(nodes, "hilbert", curves)
+        steps, misses, stretch, sizes = [], 0, [], []
+        for trial in range(args.trials):
+            rnd = random.Random(trial)
+            passing = set(rnd.sample(names, max(1, int(args.pass_rate * len(names)))))
+            for q in names:
+                step, hits, size = walk(index, q, passing - {q}, args.pct_start, args.max_steps)
+                sizes.append(size)
+                if step is None:
+                    misses += 1
+                    continue
+                steps.append(step)
+                best = min(rtt[at[q], at[n]] for n in hits)
+                nearest = min(rtt[at[q], at[n]] for n in passing - {q})
+                stretch.append(best / nearest if nearest > 0 else 1.0)
+        total = args.trials * len(names)
+        print(f"{curves:>6} {np.mean(steps):>10.2f} {misses / total:>7.1%} {np.mean(stretch):>8.2f} "
+              f"{np.mean(sizes):>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
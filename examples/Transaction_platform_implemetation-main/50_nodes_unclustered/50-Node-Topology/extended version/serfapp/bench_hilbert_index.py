@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark for HilbertIndex: key encoding (vectorized hilbert_distances vs the
+per-node HilbertCurve.distance_from_point loop) and window queries (sorted-array
+binary search vs the previous DataFrame mask, float cast + boolean mask per
+query) over the widening schedule run_once uses (pct_start * span * 2**step,
+step 0..max_steps).
+
+    python3 bench_hilbert_index.py --n 10000 100000 --queries 50
+"""
+import argparse
+import random
+import time
+
+import pandas as pd
+from hilbertcurve.hilbertcurve import HilbertCurve
+
+from service_discovery_v7 import HilbertIndex, NET_P_BITS, hilbert_distances
+from synthetic_geometry import synthetic_nodes
+
+
+class LegacyWindow:
+    """The previous names_in_raw_window: float cast + boolean mask over the DataFrame."""
+
+    def __init__(self, names, h_raw):
+        self.df = (pd.DataFrame({"name": names, "h_raw": h_raw})
+                     .sort_values("h_raw", kind="mergesort")
+                     .reset_index(drop=True))
+        self.idx = {nm: i for i, nm in self.df["name"].items()}
+
+    def names_in_raw_window(self, query, delta_raw):
+        if query not in self.idx:
+            return []
+        qh = float(int(self.df.at[self.idx[query], "h_raw"]))
+        d = max(0.0, float(delta_raw))
+        lo, hi = qh - d, qh + d
+        mask = (self.df["h_raw"].astype(float) >= lo) & (self.df["h_raw"].astype(float) <= hi)
+        out = self.df.loc[mask, "name"].tolist()
+        return [n for n in out if n != query and "-wan" not in n.lower()]
+
+
+def legacy_encode(norm, p_bits):
+    """The previous per-node encoding loop."""
+    curve = HilbertCurve(p=p_bits, n=norm.shape[1])
+    return [int(curve.distance_from_point(norm[i].tolist())) for i in range(len(norm))]
+
+
+def widening_queries(index, queries, pct_start, max_steps):
+    span = max(1, index.h_max - index.h_min)
+    delta0 = max(1, int(pct_start * span))
+    return [(q, delta0 * 2 ** step) for q in queries for step in range(max_steps + 1)]
+
+
+def timed(fn, jobs):
+    t0 = time.perf_counter()
+    out = [fn(q, d) for q, d in jobs]
+    return (time.perf_counter() - t0) / len(jobs) * 1e6, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, nargs="+", default=[10000, 100000])
+    ap.add_argument("--queries", type=int, default=50, help="query nodes per size")
+    ap.add_argument("--pct-start", type=float, default=0.02)
+    ap.add_argument("--max-steps", type=int, default=6)
+    args = ap.parse_args()
+
+    print(f"{'n':>7} {'loop enc ms':>11} {'vec enc ms':>10} {'build ms':>9} {'avg window':>10} "
+          f"{'legacy us/q':>12} {'sorted us/q':>12} {'speedup':>8}  same")
+    for n in args.n:
+        nodes = synthetic_nodes(n)
+        t0 = time.perf_counter()
+        index = HilbertIndex(nodes)
+        build_ms = (time.perf_counter() - t0) * 1e3
+        t0 = time.perf_counter()
+        vec_keys = hilbert_distances(index.norm, NET_P_BITS)
+        vec_ms = (time.perf_counter() - t0) * 1e3
+        t0 = time.perf_counter()
+        loop_keys = legacy_encode(index.norm, NET_P_BITS)
+        loop_ms = (time.perf_counter() - t0) * 1e3
+        legacy = LegacyWindow(index.names, index.h_raw)
+
+        queries = random.Random(1).sample(index.names, min(args.queries, n))
+        jobs = widening_queries(index, queries, args.pct_start, args.max_steps)
+        legacy_us, legacy_out = timed(legacy.names_in_raw_window, jobs)
+        sorted_us, sorted_out = timed(index.names_in_raw_window, jobs)
+        window = sum(map(len, sorted_out)) / len(sorted_out)
+        same = legacy_out == sorted_out and loop_keys == vec_keys == index.h_raw
+        print(f"{n:>7} {loop_ms:>11.0f} {vec_ms:>10.1f} {build_ms:>9.0f} {window:>10.0f} {legacy_us:>12.1f} "
+              f"{sorted_us:>12.1f} {legacy_us / sorted_us:>7.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Compares the discovery index backends (--index-backend hilbert | kdtree) on the
+widening schedule run_once uses (pct_start * span * 2**step, step 0..max_steps).
+
+Ground truth is the k nearest nodes by Serf coordinate distance (brute force).
+Per backend:
+    recall@k     share of the true k nearest inside the first window holding >= k names
+    CH queries   windows run_once walks until all k nearest are inside (max_steps + 2 = never),
+                 i.e. the cluster-head queries a query node pays before the best candidates show up
+    us/window    mean window query latency
+The KD backend also reports its exact nearest(name, k) latency.
+
+    python3 bench_spatial_index.py --n 1000 10000 --queries 50 --k 10
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from bench_hilbert_index import widening_queries
+from service_discovery_v7 import INDEX_BACKENDS
+from synthetic_geometry import synthetic_nodes
+
+
+def true_nearest(kd, query, k):
+    """Brute-force k nearest (coordinate distance) of query, skipping -wan names."""
+    i = kd.idx[query]
+    pos = np.arange(len(kd.names))
+    dist = kd.distances(i, pos)
+    keep = ~kd.skip & (pos != i)
+    order = np.lexsort((pos[keep], dist[keep]))
+    return [kd.names[j] for j in pos[keep][order][:k].tolist()]
+
+
+def evaluate(index, queries, truth, k, pct_start, max_steps):
+    jobs = widening_queries(index, queries, pct_start, max_steps)
+    t0 = time.perf_counter()
+    windows = [index.names_in_raw_window(q, d) for q, d in jobs]
+    us = (time.perf_counter() - t0) / len(jobs) * 1e6
+    per_query = max_steps + 1
+    recall, ch_queries = [], []
+    for qi, q in enumerate(queries):
+        want = set(truth[q])
+        steps = windows[qi * per_query:(qi + 1) * per_query]
+        first = next((w for w in steps if len(w) >= k), steps[-1])
+        recall.append(len(want & set(first)) / len(want))
+        ch_queries.append(next((s + 1 for s, w in enumerate(steps) if want <= set(w)), max_steps + 2))
+    return float(np.mean(recall)), float(np.mean(ch_queries)), us
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--queries", type=int, default=50, help="query nodes per size")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--pct-start", type=float, default=0.02)
+    ap.add_argument("--max-steps", type=int, default=6)
+    args = ap.parse_args()
+
+    print(f"{'n':>7} {'backend':>8} {'build ms':>9} {'recall@k':>9} {'CH queries':>11} "
+          f"{'us/window':>10} {'knn us':>8}")
+    for n in args.n:
+        nodes = synthetic_nodes(n, heights=True)
+        built = {}
+        for name, backend in sorted(INDEX_BACKENDS.items()):
+            t0 = time.perf_counter()
+            built[name] = backend(nodes)
+            built[name + " ms"] = (time.perf_counter() - t0) * 1e3
+        kd = built["kdtree"]
+        queries = random.Random(1).sample(kd.names, min(args.queries, n))
+        truth = {q: true_nearest(kd, q, args.k) for q in queries}
+
+        t0 = time.perf_counter()
+        exact = all(kd.nearest(q, args.k) == truth[q] for q in queries)
+        knn_us = (time.perf_counter() - t0) / len(queries) * 1e6
+        for name in sorted(INDEX_BACKENDS):
+            recall, ch_queries, us = evaluate(built[name], queries, truth, args.k, args.pct_start, args.max_steps)
+            knn = f"{knn_us:>8.0f}" if name == "kdtree" else f"{'-':>8}"
+            print(f"{n:>7} {name:>8} {built[name + ' ms']:>9.0f} {recall:>9.3f} {ch_queries:>11.2f} "
+                  f"{us:>10.1f} {knn}")
+        if not exact:
+            print(f"{n:>7} kdtree nearest() disagrees with brute force")
+
+
+if __name__ == "__main__":
+    main()
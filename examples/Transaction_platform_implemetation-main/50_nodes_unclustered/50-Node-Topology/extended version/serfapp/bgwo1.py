@@ -6,11 +6,14 @@ import json
 import random
 import inspect
 import requests
+import multiprocessing
+from multiprocessing import shared_memory
 #-----------------------------------------------------------------------------------------------------------------   
 global num_features
 global point
 global node_IP_addresses
 global rtts_matrix
+global rtt_array
 
 #----------------------- Global variable ---------------------------
 max_iter = 10
@@ -19,6 +22,8 @@ num_agents=30
 point = []
 node_IP_addresses=[]
 node_name=[]
+rtts_matrix={}
+rtt_array=np.zeros((0, 0))
 
 #-------------------------------------------------------------------------------------------------------   
 def extract_number(x):
@@ -62,6 +67,7 @@ def Read_node_data_from_anjem_file():
     global node_name
     global num_features
     global rtts_matrix
+    global rtt_array
 
     # Read Anjem file here
     try:
@@ -94,6 +100,7 @@ def Read_node_data_from_anjem_file():
         for source, destinations in rtts_matrix.items():
             for dest, rtt in destinations.items():
                 rtts_matrix[source][dest]=rtt
+        rtt_array = build_rtt_array(node_name, rtts_matrix)
 
 
         point= list(map(list, zip(*position)))
@@ -116,6 +123,30 @@ def Read_node_data_from_anjem_file():
     except json.JSONDecodeError:
         print("Error: Failed to decode JSON. Make sure the file contains valid JSON.")
     
+#-------------------------------------------------------------------------------------------------------   
+# Dense RTT matrix: rtt_array[i][j] = rtts_matrix[node_name[i]][node_name[j]] (inf when not measured)
+def build_rtt_array(names, rtts):
+    index = {name: i for i, name in enumerate(names)}
+    arr = np.full((len(names), len(names)), np.inf)
+    for i, name in enumerate(names):
+        for dest, rtt in (rtts.get(name) or {}).items():
+            j = index.get(dest)
+            if j is not None:
+                try:
+                    arr[i, j] = float(rtt)
+                except (TypeError, ValueError):
+                    pass
+    return arr
+
+# rtt_array with every link a node may not use (>= threshold, or the 10000 "none" value) set to inf
+_usable = {"source": None, "threshold": None, "array": None}
+
+def usable_rtts(latency_threshold):
+    if _usable["source"] is not rtt_array or _usable["threshold"] != latency_threshold:
+        ok = (rtt_array < latency_threshold) & (rtt_array < 10000)
+        _usable.update(source=rtt_array, threshold=latency_threshold, array=np.where(ok, rtt_array, np.inf))
+    return _usable["array"]
+
 #-------------------------------------------------------------------------------------------------------   
 # Sigmoid function for binary update
 def sigmoid(x):
@@ -124,101 +155,10 @@ def sigmoid(x):
 # ===================================================================================
 
 def fitness_function(solution, latency_threshold):
-
-    try: 
-        dist=[] 
-        for i in range(num_features):
-            dist.append(10000)
-  
-        ch=[]
-        for i in range(num_features):
-            ch.append(-1)
-    
-        ave=0.0
-        count_all=0
-
-        #=================================================
-        #  Finding the nearest CH to each node        
-        for i in range(len(solution)):
-            min1=100000
-            if solution[i]==0:
-                min_node=10000
-                min_dist=10000
-
-                for j in range(len(solution)):
-                    if solution[j]==1:
-                        a=node_name[i]
-                        b=node_name[j]
-                        y=rtts_matrix[a][b]
-                        if y< latency_threshold  and y<min_dist:
-                            min_node=j
-                            min_dist=y
-                            #print("=== ", node_name[i],"==>",node_name[min_node],"=", y )      
-                            
-                ch[i]=min_node
-                dist[i]=min_dist
-        #print(solution)
-        N= len(solution)
-        
-        for i in range(N):
-            if solution[i]==1:
-                count = ch.count(i)
-                #print(count)
-                if count==0:
-                   mind=10000
-                   mini=10000
-                   for j in range(N):
-                       if i!=j and solution[j]==1:
-                           a=node_name[i]
-                           b=node_name[j]
-                           y=rtts_matrix[a][b]
-                           if y< latency_threshold  and y<mind:
-                               mini=j
-                               mind=y
-                   if mind!=10000:         
-                       ch[i]=mini
-                       solution[i]=0
-                       dist[i]=mind
-
-        #x= input("aaaaa")                        
-                    
-                #    print("---- ", node_name[i],"==>",node_name[ch[i]],"=", dist[i] )
-               # else:
-               #     print("#### ", node_name[i],"==>",ch[i],"=", dist[i] )
-                
-                            
-
-   #     print(dist)
-   #     print(ch)
-   #     print(node_name)
-   #     print()
-   #     for i in range(len(solution)):
-   #          if solution[i]==0:
-   #              if ch[i]==10000:
-   #                  print(node_name[i],"==> No CH")                        
-   #              else:    
-   #                  print(node_name[i],"==>",node_name[ch[i]],"=", dist[i] )      
-            
-    #    x=input()
-        # compute intracluster distance                    
-        s2=0
-        c1=0
-        for i in range(len(solution)):
-            if ch[i]!=-1:
-                s2=s2+dist[i]
-                c1=c1+1          
-        if c1!=0:           
-            ave=s2/c1
-
-        # Find number of alone node with no CH       
-        counter=0
-        for i in range(len(solution)):
-            if solution [i]==0 and ch[i]==-1:
-                counter=counter+1
-
-        fit=(sum(solution)/len(solution)) +(counter/len(solution))+(ave/latency_threshold)
-
-        return fit,ch,dist
+    try:
+        fit, ch, dist = fitness_arrays(solution, latency_threshold)
+        ch_list, dist_list = rtt_lists(ch, dist)
+        return fit, ch_list, dist_list
 
     except Exception as e:
         print("")
@@ -226,11 +166,179 @@ def fitness_function(solution, latency_threshold):
         #line_number = inspect.currentframe().f_lineno        
        # print(f"❌ Error in Function ({current_function}) in line:{line_number}, >>>>>  Error message: {e}")
 
+# Same result as the original per-pair loops, on the dense rtt_array:
+# each non-CH node joins its nearest CH (first one on ties) below the threshold,
+# then a CH nobody joined merges into its nearest CH, in index order.
+# The merge updates `solution` in place, as before.
+def fitness_arrays(solution, latency_threshold):
+    N = len(solution)
+    sol = np.asarray(solution)
+    usable = usable_rtts(latency_threshold)
+
+    ch = np.full(N, -1, dtype=np.int64)
+    dist = np.full(N, 10000.0)
+
+    #=================================================
+    #  Finding the nearest CH to each node (masked argmin per row)
+    heads = np.flatnonzero(sol == 1)
+    others = np.flatnonzero(sol == 0)
+    if len(others):
+        ch[others] = 10000
+        if len(heads):
+            sub = usable[np.ix_(others, heads)]
+            k = sub.argmin(axis=1)
+            best = sub[np.arange(len(others)), k]
+            found = np.isfinite(best)
+            ch[others[found]] = heads[k[found]]
+            dist[others[found]] = best[found]
+
+    # CHs without members join their nearest CH instead
+    count = np.bincount(ch[(ch >= 0) & (ch < N)], minlength=N)
+    is_head = sol == 1
+    for i in heads.tolist():
+        if count[i] == 0:
+            row = np.where(is_head, usable[i], np.inf)
+            row[i] = np.inf
+            j = int(row.argmin())
+            if np.isfinite(row[j]):
+                ch[i] = j
+                count[j] += 1
+                is_head[i] = False
+                solution[i] = 0
+                dist[i] = row[j]
+
+    # compute intracluster distance (cumsum adds in index order, like the old loop)
+    has_ch = ch != -1
+    c1 = int(has_ch.sum())
+    ave = np.cumsum(dist[has_ch])[-1] / c1 if c1 else 0.0
+
+    # Find number of alone node with no CH
+    counter = int(((np.asarray(solution) == 0) & ~has_ch).sum())
+
+    fit=(sum(solution)/len(solution)) +(counter/len(solution))+(ave/latency_threshold)
+    return fit, ch, dist
+
+# ch as a list, distances as the rtts_matrix values themselves (10000 where there is none)
+def rtt_lists(ch, dist):
+    ch_list = ch.tolist()
+    dist_list = [10000] * len(ch_list)
+    for i in np.flatnonzero(dist != 10000).tolist():
+        dist_list[i] = rtts_matrix[node_name[i]][node_name[ch_list[i]]]
+    return ch_list, dist_list
+
+
 
+#=================================================================================
+# Position update of all wolves at once: the same per-element rule as
+# X1..X3 / sigmoid / threshold, with rows of A and C drawn as arrays.
+# The random draws and intermediates go into buffers kept per population shape.
+_update_buffers = {}
+
+def update_wolves(wolves, alpha_pos, beta_pos, delta_pos, a, rng):
+    buf = _update_buffers.get(wolves.shape)
+    if buf is None:
+        buf = _update_buffers[wolves.shape] = {
+            "r": np.empty((7,) + wolves.shape), "leaders": np.empty((3, 1, wolves.shape[1])),
+            "X": np.empty(wolves.shape), "ones": np.empty(wolves.shape, dtype=bool)}
+    r, leaders, X = buf["r"], buf["leaders"], buf["X"]
+    leaders[:, 0] = alpha_pos, beta_pos, delta_pos
+    rng.random(out=r)
+    A, C = r[0:3], r[3:6]
+    A *= 2 * a
+    A -= a
+
+    # A * |C * leader - wolf| for the three leaders, in the C rows
+    C *= 2
+    C *= leaders
+    C -= wolves
+    np.abs(C, out=C)
+    C *= A
+    np.add(C[0], C[1], out=X)
+    X += C[2]
+    np.subtract(leaders.sum(axis=0), X, out=X)
+    X /= 3
+
+    # Binary position update with sigmoid and probability threshold
+    np.negative(X, out=X)
+    np.exp(X, out=X)
+    X += 1
+    np.reciprocal(X, out=X)
+    np.greater(X, r[6], out=buf["ones"])
+    wolves[...] = buf["ones"]
+    return wolves
+
+#=================================================================================
+# Parallel fitness evaluation (fitness_workers in clustering_setup.txt, 0 or 1 = sequential).
+# The usable RTT matrix, a copy of the wolves and the per-wolf results (fit, ch,
+# dist) live in shared memory. Each generation the wolves matrix is copied in and
+# every worker gets only the (start, stop) rows it evaluates; it writes the results
+# and its CH merges back in place. binary_gwo scans the results in agent order, so
+# alpha/beta/delta are the same for any number of workers.
+# Workers are forked: member.py starts its UDP server at import, which a spawned
+# worker would run again.
+PARALLEL_MIN_FEATURES = 100   # below this many nodes (or 2 wolves per worker) the pool costs more than it saves
+_worker = {}
+
+def _init_fitness_worker(specs, latency_threshold):
+    _worker["segments"] = []
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _worker["segments"].append(shm)
+        _worker[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker["usable"].flags.writeable = False
+    _usable.update(source=rtt_array, threshold=latency_threshold, array=_worker["usable"])
+    _worker["latency_threshold"] = latency_threshold
+
+def _evaluate_block(block):
+    wolves, threshold = _worker["wolves"], _worker["latency_threshold"]
+    for i in range(*block):
+        _worker["fit"][i], _worker["ch"][i], _worker["dist"][i] = fitness_arrays(wolves[i], threshold)
+    return block
+
+class FitnessPool:
+    def __init__(self, workers, num_agents, num_features, latency_threshold):
+        self.segments = []
+        self.arrays = {
+            "usable": self._shared((num_features, num_features), np.float64),
+            "wolves": self._shared((num_agents, num_features), np.int64),
+            "fit": self._shared((num_agents,), np.float64),
+            "ch": self._shared((num_agents, num_features), np.int64),
+            "dist": self._shared((num_agents, num_features), np.float64)}
+        self.arrays["usable"][...] = usable_rtts(latency_threshold)
+        specs = {key: (shm.name, arr.shape, arr.dtype.str)
+                 for (key, arr), shm in zip(self.arrays.items(), self.segments)}
+        step = -(-num_agents // workers)
+        self.blocks = [(lo, min(lo + step, num_agents)) for lo in range(0, num_agents, step)]
+        self.pool = multiprocessing.get_context("fork").Pool(
+            workers, initializer=_init_fitness_worker, initargs=(specs, latency_threshold))
+
+    def _shared(self, shape, dtype):
+        shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+        self.segments.append(shm)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    # (fitness, ch list, dist list) per wolf, as fitness_function returns them;
+    # CH merges are applied to `wolves` in place
+    def evaluate(self, wolves):
+        a = self.arrays
+        a["wolves"][...] = wolves
+        self.pool.map(_evaluate_block, self.blocks)
+        wolves[...] = a["wolves"]
+        return [(a["fit"][i], *rtt_lists(a["ch"][i], a["dist"][i])) for i in range(len(wolves))]
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.arrays = None
+        for shm in self.segments:
+            shm.close()
+            shm.unlink()
 
 #=================================================================================
 # Binary Grey Wolf Optimizer
-def binary_gwo(num_agents, num_features, max_iter, latency_threshold):
+# seed: int for a reproducible run (same wolves, same result), None for a random one
+# workers: processes for the fitness evaluation (0 or 1 = in this process)
+def binary_gwo(num_agents, num_features, max_iter, latency_threshold, seed=None, workers=0):
     # Initialize the positions of wolves (binary vectors)
 
     ch1=[]
@@ -244,7 +352,8 @@ def binary_gwo(num_agents, num_features, max_iter, latency_threshold):
         dist2.append(0)
 
 
-    wolves = np.random.randint(2, size=(num_agents, num_features))
+    rng = np.random.default_rng(seed)
+    wolves = rng.integers(2, size=(num_agents, num_features))
     
     # Initialize alpha, beta, delta wolves (best solutions)
     alpha_pos = np.zeros(num_features)
@@ -256,61 +365,45 @@ def binary_gwo(num_agents, num_features, max_iter, latency_threshold):
     delta_pos = np.zeros(num_features)
     delta_score = float("inf")
 
+    pool = None
+    if workers > 1 and num_features >= PARALLEL_MIN_FEATURES and num_agents >= 2 * workers:
+        pool = FitnessPool(workers, num_agents, num_features, latency_threshold)
+
     # Main optimization loop
-    for t in range(max_iter):
-        # Evaluate fitness of each wolf
+    try:
+        for t in range(max_iter):
+            # Evaluate fitness of each wolf
  
-        #aa=round(max_iter/100)
-        #if i mod aa==0:
-        print("#",end='', flush=True)
-        for i in range(num_agents):
-            fitness,ch1,dist1 = fitness_function(wolves[i],latency_threshold)
-
-            # Update alpha, beta, delta
-            if fitness < alpha_score:
-                delta_score, delta_pos = beta_score, beta_pos.copy()
-                beta_score, beta_pos = alpha_score, alpha_pos.copy()
-                alpha_score, alpha_pos = fitness, wolves[i].copy()
-                ch2=ch1
-                dist2=dist1
-
-            elif fitness < beta_score:
-                delta_score, delta_pos = beta_score, beta_pos.copy()
-                beta_score, beta_pos = fitness, wolves[i].copy()
-            elif fitness < delta_score:
-                delta_score, delta_pos = fitness, wolves[i].copy()
-
-        # Coefficients
-        a = 2 - 2 * t / max_iter  # linearly decreases from 2 to 0
-
-        for i in range(num_agents):
-            for j in range(num_features):
-                r1, r2 = random.random(), random.random()
-                A1 = 2 * a * r1 - a
-                C1 = 2 * r2
-
-                D_alpha = abs(C1 * alpha_pos[j] - wolves[i][j])
-                X1 = alpha_pos[j] - A1 * D_alpha
-
-                r1, r2 = random.random(), random.random()
-                A2 = 2 * a * r1 - a
-                C2 = 2 * r2
-
-                D_beta = abs(C2 * beta_pos[j] - wolves[i][j])
-                X2 = beta_pos[j] - A2 * D_beta
-
-                r1, r2 = random.random(), random.random()
-                A3 = 2 * a * r1 - a
-                C3 = 2 * r2
-
-                D_delta = abs(C3 * delta_pos[j] - wolves[i][j])
-                X3 = delta_pos[j] - A3 * D_delta
-
-                # Aggregated position update
-                X = (X1 + X2 + X3) / 3
-
-                # Binary position update with sigmoid and probability threshold
-                wolves[i][j] = 1 if sigmoid(X) > random.random() else 0
+            #aa=round(max_iter/100)
+            #if i mod aa==0:
+            print("#",end='', flush=True)
+            if pool is None:
+                results = (fitness_function(wolves[i], latency_threshold) for i in range(num_agents))
+            else:
+                results = pool.evaluate(wolves)
+            for i, (fitness, ch1, dist1) in enumerate(results):
+
+                # Update alpha, beta, delta
+                if fitness < alpha_score:
+                    delta_score, delta_pos = beta_score, beta_pos.copy()
+                    beta_score, beta_pos = alpha_score, alpha_pos.copy()
+                    alpha_score, alpha_pos = fitness, wolves[i].copy()
+                    ch2=ch1
+                    dist2=dist1
+
+                elif fitness < beta_score:
+                    delta_score, delta_pos = beta_score, beta_pos.copy()
+                    beta_score, beta_pos = fitness, wolves[i].copy()
+                elif fitness < delta_score:
+                    delta_score, delta_pos = fitness, wolves[i].copy()
+
+            # Coefficients
+            a = 2 - 2 * t / max_iter  # linearly decreases from 2 to 0
+
+            update_wolves(wolves, alpha_pos, beta_pos, delta_pos, a, rng)
+    finally:
+        if pool is not None:
+            pool.close()
 
     #print(alpha_pos, alpha_score,ch2)
     return alpha_pos, alpha_score,ch2, dist2
@@ -324,14 +417,18 @@ def clustering_BGWO(latency_threshold):
     global max_iter
 
     #===================   Loading Global variables
-    setup_file_lines=2
+    setup_file_lines=4
     x=load_setup_data(setup_file_lines)
     max_iter=int(x[0]) 
     num_agents=int(x[1])  # seconds
+    seed=int(x[2]) if x[2] else None  # empty: a different random run every time
+    workers=int(x[3]) if x[3] else 0  # missing line: sequential
     
     print("Loading data from clustering_setp.txt ...")
     print(f"max_iter = {max_iter}")
-    print(f"num_agents = {num_agents}\n")
+    print(f"num_agents = {num_agents}")
+    print(f"random_seed = {seed}")
+    print(f"fitness_workers = {workers}\n")
 
     #----------------------------------
     N_node=Read_node_data_from_anjem_file()   #  <<<<<======= hello
@@ -342,7 +439,7 @@ def clustering_BGWO(latency_threshold):
         members.append(0)
 
     print("Running clustering...",flush=True)
-    best_solution, best_fitness,ch,dist = binary_gwo(num_agents, num_features, max_iter,latency_threshold)
+    best_solution, best_fitness,ch,dist = binary_gwo(num_agents, num_features, max_iter,latency_threshold,seed,workers)
 
 
 
@@ -0,0 +1,6 @@
+#!/bin/bash
+
+python3 members_cache.py \
+        --rpc-addr 127.0.0.1:7373 \
+        --http-host 127.0.0.1 --http-port 4043 --http-path /members \
+        --resync-secs 30 --debounce-ms 200
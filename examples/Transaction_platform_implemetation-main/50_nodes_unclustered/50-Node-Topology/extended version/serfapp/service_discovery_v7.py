@@ -4,17 +4,38 @@ multi_stage_hilbert_router_rtt_then_hilbert_http_loop.py
 
 Changes:
 - Excludes any candidates that contain NaN in the output fields.
-- Loads geometry from --geom-url exactly once at startup (reused each loop).
+- Loads geometry from --geom-url once at startup (reused each loop); --geom-refresh-secs re-reads it
+  and HilbertIndex.update re-keys only the nodes that moved.
 - get_lan_members(): auto-retries ./serf members with exponential backoff.
 - If locals unavailable after retries, the cycle is skipped (no CH queries).
+- --members-url reads LAN members from the local members_cache.py service instead.
+- The HTTP endpoint versions each changed result; ?since=<version>&wait=<s> long-polls for the next one.
+- --buyer-url is fetched with If-None-Match and only re-applied when the document changed; --buyer-push
+  takes POST /buyer instead. A cycle with unchanged filters, members and geometry reuses the last result.
+- Each result is serialized once at publish (bytes + gzip + strong ETag); GETs honour If-None-Match (304).
+- HilbertIndex keeps sorted key/name arrays; widening windows are binary searches (bench_hilbert_index.py).
+- Hilbert keys for all nodes are encoded in one vectorized numpy pass (hilbert_distances).
+- --ch-cache-ttl-s reuses CH answers per node/filter set; only uncached names are asked. Tags that changed in a LAN
+  table or a CH answer invalidate; the TTL then follows each node's observed tag-update interval.
+- Candidates are filtered and sorted on a columnar MemberTable (index arrays) instead of per-step DataFrame copies.
+- Phase A neighbors come from RttIndex (per-node RTT-sorted CSR arrays, optionally memory-mapped
+  and shared via --rtt-index-path) instead of a scan of the node's rtts dict.
+- --index-backend kdtree swaps the Hilbert windows for exact radius searches over coordinate.Vec
+  (Serf distance incl. height/adjustment); bench_spatial_index.py compares the two.
+- bench_discovery.py drives run_once at 1k-100k nodes on synthetic_geometry.py data (fake ./serf, CH).
+- --hilbert-curves N unions the windows of N Hilbert curves (N-1 over rotated coordinates), so
+  neighbours split by one curve's quadrant boundary still land in an early window (bench_hilbert_curves.py).
+- --serve answers GET /discover?node=...&<filters> per request on a warm index; identical
+  concurrent queries are coalesced and --max-ch-queries caps CH queries in flight.
+- --speculative N sends the CH queries of the widening windows concurrently; the smallest passing window still wins.
 """
 
-import argparse, json, math, socket, subprocess, threading, time
+import argparse, bisect, copy, gzip, hashlib, json, math, os, shutil, socket, subprocess, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
 
 import numpy as np
 import pandas as pd
-from hilbertcurve.hilbertcurve import HilbertCurve
 
 DEFAULT_SERF_RPC = "127.0.0.1:7373"
 DEFAULT_TIMEOUT_S = 8
@@ -27,6 +48,18 @@ def load_geometry(url: str, timeout: int = 5) -> List[Dict[str, Any]]:
     with urllib.request.urlopen(url, timeout=timeout) as resp:
         return json.load(resp)
 
+def fetch_geometry(url: str, etag: str = "", timeout: int = 5):
+    """(nodes, etag); nodes is None when the server answers 304 to If-None-Match."""
+    import urllib.error, urllib.request
+    req = urllib.request.Request(url, headers={"If-None-Match": etag} if etag else {})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.load(resp), resp.headers.get("ETag", "")
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, etag
+        raise
+
 def extract_rtts(nodes: List[dict]) -> Dict[str, Dict[str, float]]:
     out: Dict[str, Dict[str, float]] = {}
     for n in nodes:
@@ -44,6 +77,111 @@ def extract_rtts(nodes: List[dict]) -> Dict[str, Dict[str, float]]:
             out[nm] = clean
     return out
 
+def update_rtts(rtts: Dict[str, Dict[str, float]], nodes: List[dict]) -> int:
+    """Replaces changed per-node RTT maps in `rtts` in place; returns how many changed."""
+    fresh = extract_rtts(nodes)
+    changed = 0
+    for nm in [nm for nm in rtts if nm not in fresh]:
+        del rtts[nm]
+        changed += 1
+    for nm, clean in fresh.items():
+        if rtts.get(nm) != clean:
+            rtts[nm] = clean
+            changed += 1
+    return changed
+
+# ------------------------------- RTT index -------------------------------
+class RttIndex:
+    """
+    RTTs from the geometry in CSR form: row i (node names[i]) owns entries
+    offsets[i]:offsets[i+1] of `nbr` (neighbor ids), `rtt` (float64, ascending)
+    and `rank` (position in the node's original rtts map). A threshold query is
+    one searchsorted plus a slice, returned in the original map order.
+    """
+    FILES = ("offsets", "nbr", "rtt", "rank")
+
+    def __init__(self, names: List[str], offsets: np.ndarray, nbr: np.ndarray, rtt: np.ndarray, rank: np.ndarray):
+        self.names = names
+        self.ids = {nm: i for i, nm in enumerate(names)}
+        self.offsets, self.nbr, self.rtt, self.rank = offsets, nbr, rtt, rank
+
+    @classmethod
+    def build(cls, rtts: Dict[str, Dict[str, float]]) -> "RttIndex":
+        ids: Dict[str, int] = {nm: i for i, nm in enumerate(rtts)}
+        rows, nbr, val, rank = [], [], [], []
+        counts = np.zeros(len(ids), dtype=np.int64)
+        for i, row in enumerate(rtts.values()):
+            counts[i] = len(row)
+            rows.extend([i] * len(row))
+            nbr.extend(ids.setdefault(nm, len(ids)) for nm in row)
+            val.extend(row.values())
+            rank.extend(range(len(row)))
+        rows, val, rank = np.array(rows, dtype=np.int64), np.array(val, dtype=np.float64), np.array(rank, dtype=np.int32)
+        order = np.lexsort((rank, val, rows))
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        offsets[1:len(counts) + 1] = np.cumsum(counts)
+        offsets[len(counts) + 1:] = offsets[len(counts)]
+        return cls(list(ids), offsets, np.array(nbr, dtype=np.int32)[order], val[order], rank[order])
+
+    def within(self, node: str, threshold: float):
+        """(names, rtts) of `node`'s neighbors with rtt <= threshold, in the original map order."""
+        i = self.ids.get(node)
+        if i is None:
+            return [], []
+        lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+        k = int(np.searchsorted(self.rtt[lo:hi], threshold, side="right"))
+        order = np.argsort(self.rank[lo:lo + k], kind="stable")
+        return [self.names[j] for j in self.nbr[lo:lo + k][order].tolist()], self.rtt[lo:lo + k][order].tolist()
+
+    def digest(self) -> str:
+        h = hashlib.sha1(json.dumps(self.names, separators=(",", ":")).encode("utf-8"))
+        for f in self.FILES:
+            h.update(np.ascontiguousarray(getattr(self, f)).tobytes())
+        return h.hexdigest()[:20]
+
+    def shared(self, path: str, keep: int = 3) -> "RttIndex":
+        """
+        The same index backed by read-only memory maps under `path`/<digest>/,
+        written once per distinct RTT set so every discovery process on the host
+        maps the same pages (point --rtt-index-path at tmpfs, e.g. /dev/shm).
+        """
+        digest = self.digest()
+        target = os.path.join(path, digest)
+        if not os.path.isdir(target):
+            os.makedirs(path, exist_ok=True)
+            tmp = f"{target}.tmp-{os.getpid()}"
+            os.makedirs(tmp, exist_ok=True)
+            for f in self.FILES:
+                np.save(os.path.join(tmp, f + ".npy"), getattr(self, f))
+            with open(os.path.join(tmp, "names.json"), "w") as fh:
+                json.dump(self.names, fh, separators=(",", ":"))
+            try:
+                os.rename(tmp, target)
+            except OSError:
+                shutil.rmtree(tmp, ignore_errors=True)  # another process published it first
+            old = sorted((e for e in os.scandir(path) if e.is_dir() and e.name != digest and ".tmp-" not in e.name),
+                         key=lambda e: e.stat().st_mtime)
+            for e in old[:max(0, len(old) - keep + 1)]:
+                shutil.rmtree(e.path, ignore_errors=True)  # processes mapping it keep their pages
+        return RttIndex.load(target)
+
+    @classmethod
+    def load(cls, target: str) -> "RttIndex":
+        with open(os.path.join(target, "names.json")) as fh:
+            names = json.load(fh)
+        # plain ndarray views of the maps: slicing an np.memmap is several times slower
+        arrays = [np.load(os.path.join(target, f + ".npy"), mmap_mode="r").view(np.ndarray) for f in cls.FILES]
+        return cls(names, *arrays)
+
+def make_rtt_index(rtts: Dict[str, Dict[str, float]], path: str = "") -> RttIndex:
+    index = RttIndex.build(rtts)
+    if path:
+        try:
+            return index.shared(path)
+        except OSError as e:
+            print(f"[rtt] cannot share the RTT index under {path} ({e}); keeping it in memory")
+    return index
+
 def _to_int(v) -> int:
     try:
         if v is None:
@@ -86,16 +224,81 @@ def _node_name_from_nodejson_or_hostname() -> str:
     raise SystemExit(f"Cannot determine node name: {NODE_JSON_PATH} missing 'node_name' and hostname lookup failed.")
 
 # ------------------- Local resources from Serf (LAN) ---------------------
-def get_lan_members(rpc_addr: str) -> pd.DataFrame:
+LAN_COLS = [
+    "name","ip","cpu","ram","storage","gpu",
+    "price_per_cpu","price_per_ram","price_per_storage","price_per_gpu",
+    "score_per_cpu","score_per_ram","score_per_storage","score_per_gpu"
+]
+
+def _members_to_df(data: dict) -> pd.DataFrame:
+    """`serf members -format=json` document -> LAN member table (no -wan)."""
+    members = data.get("members") or data.get("Members") or []
+    rows = []
+    for m in members:
+        if not isinstance(m, dict):
+            continue
+        name = m.get("name") or m.get("Name")
+        if not name or "-wan" in str(name).lower():
+            continue
+        tags = m.get("tags") or m.get("Tags") or {}
+        if not isinstance(tags, dict):
+            tags = {}
+
+        ip = tags.get("ip") or m.get("addr") or m.get("Addr") or ""
+        if isinstance(ip, str) and ":" in ip:
+            ip = ip.split(":", 1)[0]
+
+        rows.append({
+            "name": str(name),
+            "ip": ip,
+            "cpu": _to_int(tags.get("cpu")),
+            "ram": _to_float(tags.get("ram")),
+            "storage": _to_int(tags.get("storage")),
+            "gpu": _to_int(tags.get("gpu")),
+            "price_per_cpu": _to_float(tags.get("price_per_cpu")),
+            "price_per_ram": _to_float(tags.get("price_per_ram")),
+            "price_per_storage": _to_float(tags.get("price_per_storage")),
+            "price_per_gpu": _to_float(tags.get("price_per_gpu")),
+            "score_per_cpu": _to_float(tags.get("score_per_cpu")),
+            "score_per_ram": _to_float(tags.get("score_per_ram")),
+            "score_per_storage": _to_float(tags.get("score_per_storage")),
+            "score_per_gpu": _to_float(tags.get("score_per_gpu")),
+        })
+    return pd.DataFrame(rows, columns=LAN_COLS)
+
+# members_cache.py client + the table decoded from its last version
+_members_cache = {"client": None, "version": None, "df": None}
+
+def get_lan_members_cached(members_url: str) -> Optional[pd.DataFrame]:
+    """
+    Reads LAN members from the local members_cache.py service.
+    The decoded table is reused while the cache version is unchanged.
+    Returns None if the cache is unreachable (caller falls back to ./serf members).
+    """
+    from members_cache import MembersCacheClient
+    mc = _members_cache
+    if mc["client"] is None or mc["client"].url != members_url:
+        mc.update(client=MembersCacheClient(members_url), version=None, df=None)
+    try:
+        version, data = mc["client"].get()
+    except Exception as e:
+        print(f"[members-cache] {members_url} unavailable ({e}); falling back to ./serf members")
+        return None
+    if version != mc["version"] or mc["df"] is None:
+        mc["df"] = _members_to_df(data or {})
+        mc["version"] = version
+    return mc["df"]
+
+def get_lan_members(rpc_addr: str, members_url: str = "") -> pd.DataFrame:
     """
     Returns local members (no -wan) with ip + resource tags.
-    Auto-retries `./serf members` with exponential backoff.
+    Uses the members cache at `members_url` when given, else
+    auto-retries `./serf members` with exponential backoff.
     """
-    cols = [
-        "name","ip","cpu","ram","storage","gpu",
-        "price_per_cpu","price_per_ram","price_per_storage","price_per_gpu",
-        "score_per_cpu","score_per_ram","score_per_storage","score_per_gpu"
-    ]
+    if members_url:
+        df = get_lan_members_cached(members_url)
+        if df is not None and not df.empty:
+            return df
 
     max_attempts = 6          # total tries
     base_ms = 200             # initial backoff in ms
@@ -114,40 +317,7 @@ def get_lan_members(rpc_addr: str) -> pd.DataFrame:
                 except Exception as je:
                     last_err = f"json decode error: {je}"
                     raise
-
-                members = data.get("members") or data.get("Members") or []
-                rows = []
-                for m in members:
-                    if not isinstance(m, dict):
-                        continue
-                    name = m.get("name") or m.get("Name")
-                    if not name or "-wan" in str(name).lower():
-                        continue
-                    tags = m.get("tags") or m.get("Tags") or {}
-                    if not isinstance(tags, dict):
-                        tags = {}
-
-                    ip = tags.get("ip") or m.get("addr") or m.get("Addr") or ""
-                    if isinstance(ip, str) and ":" in ip:
-                        ip = ip.split(":", 1)[0]
-
-                    rows.append({
-                        "name": str(name),
-                        "ip": ip,
-                        "cpu": _to_int(tags.get("cpu")),
-                        "ram": _to_float(tags.get("ram")),
-                        "storage": _to_int(tags.get("storage")),
-                        "gpu": _to_int(tags.get("gpu")),
-                        "price_per_cpu": _to_float(tags.get("price_per_cpu")),
-                        "price_per_ram": _to_float(tags.get("price_per_ram")),
-                        "price_per_storage": _to_float(tags.get("price_per_storage")),
-                        "price_per_gpu": _to_float(tags.get("price_per_gpu")),
-                        "score_per_cpu": _to_float(tags.get("score_per_cpu")),
-                        "score_per_ram": _to_float(tags.get("score_per_ram")),
-                        "score_per_storage": _to_float(tags.get("score_per_storage")),
-                        "score_per_gpu": _to_float(tags.get("score_per_gpu")),
-                    })
-                return pd.DataFrame(rows, columns=cols)
+                return _members_to_df(data)
 
             last_err = (res.stderr or "").strip() or f"exit={res.returncode}"
             print(f"[serf members] attempt {attempt+1}/{max_attempts} failed: {last_err}")
@@ -162,7 +332,7 @@ def get_lan_members(rpc_addr: str) -> pd.DataFrame:
         time.sleep(sleep_s)
 
     print(f"[serf members] giving up after {max_attempts} attempts: {last_err}")
-    return pd.DataFrame(columns=cols)
+    return pd.DataFrame(columns=LAN_COLS)
 
 # --------------------- CH request (wanted_names) -------------------------
 def _print_names(title: str, names: List[str]):
@@ -171,11 +341,139 @@ def _print_names(title: str, names: List[str]):
     else:
         print(f"{title} ({len(names)}): " + ", ".join(names))
 
+def _tag_values(row) -> tuple:
+    """A member's resource/price/score tags as a comparable tuple (NaN as None)."""
+    return tuple(None if isinstance(v, float) and math.isnan(v) else v for v in (row[c] for c in LAN_COLS[2:]))
+
+class ChAnswerCache:
+    """
+    Per-node CH answers keyed by the query filters (everything in the payload but
+    the names). A node the CH returned keeps its row; a node it was asked about
+    but did not return is kept as a miss. Later queries with the same filters only
+    ask the CH for names not cached.
+
+    Invalidation: every fresh CH answer and LAN member table is compared with the
+    last tags seen per name, and a name whose tags changed is dropped under every
+    filter set (a cached miss may pass now). LAN members that joined or left are
+    dropped too.
+    TTL per name: `ttl_s` until the name has changed tags twice, then half its
+    observed tag-update interval (moving average of the time between two of its
+    changes), so an entry outlives a re-published offer by about half a period.
+    An answer built from several names lives as long as the shortest of them.
+    """
+    INTERVAL_WEIGHT = 0.2
+
+    def __init__(self, ttl_s: float):
+        self.ttl_s = ttl_s
+        self.entries: Dict[tuple, Dict[str, tuple]] = {}  # filters -> name -> (row | None, stored_at)
+        self.tags: Dict[str, tuple] = {}          # name -> last seen tag values (LAN table or CH answer)
+        self.changed_at: Dict[str, float] = {}    # name -> when its tags last changed
+        self.interval_s: Dict[str, float] = {}    # name -> observed tag-update interval
+        self.looked_up: Dict[str, float] = {}     # name -> when a query last needed it
+        self.lan_names: Optional[set] = None
+        self.members_df = None
+        self.lock = threading.Lock()
+
+    def ttl(self, names=()) -> float:
+        """TTL of an answer that depends on `names` (`ttl_s` if none)."""
+        with self.lock:
+            return min((self._ttl(nm) for nm in names), default=self.ttl_s)
+
+    def depends_on(self, since: float) -> List[str]:
+        """Names looked up since the monotonic time `since`."""
+        with self.lock:
+            return [nm for nm, at in self.looked_up.items() if at >= since]
+
+    def _ttl(self, name: str) -> float:
+        interval = self.interval_s.get(name)
+        return self.ttl_s if interval is None else interval / 2
+
+    def lookup(self, filters: tuple, names: List[str]):
+        """(cached rows, names the CH still has to be asked about)."""
+        now = time.monotonic()
+        rows, missing = [], []
+        with self.lock:
+            known = self.entries.get(filters, {})
+            for nm in names:
+                self.looked_up[nm] = now
+                entry = known.get(nm)
+                if entry is None or now - entry[1] >= self._ttl(nm):
+                    missing.append(nm)
+                elif entry[0] is not None:
+                    rows.append(entry[0])
+        return rows, missing
+
+    def store(self, filters: tuple, asked: List[str], df: pd.DataFrame, misses: bool):
+        """Caches the rows in `df`; with `misses`, the asked names it lacks are cached as misses."""
+        now = time.monotonic()
+        got = {row["name"]: row for row in df.to_dict(orient="records")}
+        with self.lock:
+            changed = self._observe_tags({nm: _tag_values(row) for nm, row in got.items()}, now)
+            self._drop(changed)
+            known = self.entries.setdefault(filters, {})
+            for nm in [nm for nm, e in known.items() if now - e[1] >= self._ttl(nm)]:
+                del known[nm]
+            for nm in asked:
+                if nm in got or misses:
+                    known[nm] = (got.get(nm), now)
+        if changed:
+            print(f"[CH] cache: tags changed for {len(changed)} remote names; dropped under every filter set")
+
+    def invalidate(self, names=None):
+        """Drops the given names (all when None) under every filter set."""
+        with self.lock:
+            if names is None:
+                self.entries.clear()
+                return
+            self._drop(names)
+
+    def _drop(self, names):
+        for known in self.entries.values():
+            for nm in names:
+                known.pop(nm, None)
+
+    def _observe_tags(self, tags: Dict[str, tuple], now: float) -> List[str]:
+        """Records the tags seen per name (lock held); returns the names whose tags changed."""
+        changed = [nm for nm, t in tags.items() if nm in self.tags and self.tags[nm] != t]
+        for nm in changed:
+            prev = self.changed_at.get(nm)
+            if prev is not None:
+                gap = now - prev
+                w = self.INTERVAL_WEIGHT
+                interval = self.interval_s.get(nm)
+                self.interval_s[nm] = gap if interval is None else (1 - w) * interval + w * gap
+            self.changed_at[nm] = now
+        self.tags.update(tags)
+        return changed
+
+    def observe_members(self, df: pd.DataFrame):
+        """Invalidation hook for the LAN table: members whose tags changed, joined or left are dropped."""
+        with self.lock:
+            if df is self.members_df:
+                return
+            self.members_df = df
+            tags = {row["name"]: _tag_values(row) for row in df[LAN_COLS].to_dict(orient="records")}
+            changed = self._observe_tags(tags, time.monotonic())
+            if self.lan_names is not None:
+                changed += list(self.lan_names ^ tags.keys())
+            self.lan_names = set(tags)
+            self._drop(changed)
+
+# Server mode caps concurrent `serf query ch.ask-remote-res` calls (None = no cap)
+_ch_slots = {"sem": None}
+
+def _ch_responded(text: str) -> bool:
+    try:
+        return bool(json.loads(text).get("Responses"))
+    except Exception:
+        return False
+
 def ask_cluster_head_for_remote(
     min_cpu:int, min_ram:int, min_storage:int, min_gpu:int,
     wanted_names: List[str], rpc_addr:str, timeout_s:int,
     budget_cpu:float, budget_ram:float, budget_storage:float, budget_gpu:float,
-    min_sc_cpu:float, min_sc_ram:float, min_sc_storage:float, min_sc_gpu:float
+    min_sc_cpu:float, min_sc_ram:float, min_sc_storage:float, min_sc_gpu:float,
+    cache: Optional[ChAnswerCache] = None
 ) -> pd.DataFrame:
     cols = [
         "name","ip","cpu","ram","storage","gpu",
@@ -198,18 +496,34 @@ def ask_cluster_head_for_remote(
         **({"min_score_per_ram":min_sc_ram} if min_sc_ram>0 else {}),
         **({"min_score_per_storage":min_sc_storage} if min_sc_storage>0 else {}),
         **({"min_score_per_gpu":min_sc_gpu} if min_sc_gpu>0 else {}),
-        "request_id": "TRACE-HILBERT",
-        "wanted_names": wanted_names,
     }
+    filters = tuple(sorted(payload.items()))
+    cached = []
+    if cache is not None:
+        cached, wanted_names = cache.lookup(filters, wanted_names)
+        print(f"[CH] cache: {len(cached)} rows reused, {len(wanted_names)} names to ask")
+        if not wanted_names:
+            return pd.DataFrame(cached, columns=cols)
+    payload.update({"request_id": "TRACE-HILBERT", "wanted_names": wanted_names})
     _print_names("→ CH wanted_names", wanted_names)
     cmd = ["./serf","query", f"-rpc-addr={rpc_addr}", f"-timeout={timeout_s}s",
            "-format=json", "ch.ask-remote-res", json.dumps(payload, separators=(",",":"))]
+    sem = _ch_slots["sem"]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return parse_ch_answer(res.stdout, set(wanted_names))
+        if sem is not None:
+            with sem:
+                res = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        else:
+            res = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        answer = parse_ch_answer(res.stdout, set(wanted_names))
     except subprocess.CalledProcessError as e:
         print(f"[CH] serf query failed: {e}")
-        return pd.DataFrame(columns=cols)
+        return pd.DataFrame(cached, columns=cols)
+    if cache is None:
+        return answer
+    # Misses are only cached when some CH actually answered (not on a timeout)
+    cache.store(filters, wanted_names, answer, misses=_ch_responded(res.stdout))
+    return pd.concat([pd.DataFrame(cached, columns=cols), answer], ignore_index=True) if cached else answer
 
 def parse_ch_answer(text: str, allow: set) -> pd.DataFrame:
     cols = [
@@ -280,44 +594,442 @@ def minmax_norm_to_bits(values: np.ndarray, p_bits: int):
         values = values.reshape(1, -1)
     lo = values.min(axis=0)
     hi = values.max(axis=0)
+    return quantize_to_bits(values, lo, hi, p_bits), lo, hi
+
+def quantize_to_bits(values: np.ndarray, lo: np.ndarray, hi: np.ndarray, p_bits: int) -> np.ndarray:
     span = np.where(hi > lo, hi - lo, 1.0)
     scaled = (values - lo) / span
-    return np.round(scaled * ((2 ** p_bits) - 1)).astype(int), lo, hi
+    return np.round(scaled * ((2 ** p_bits) - 1)).astype(int)
+
+def hilbert_distances(points: np.ndarray, p_bits: int) -> List[int]:
+    """
+    Hilbert distance of every row of `points` (ints in [0, 2**p_bits)) in one
+    vectorized pass: Skilling's transpose algorithm as in
+    HilbertCurve.distance_from_point, then bit interleaving. Keys can exceed
+    64 bits (n_dims * p_bits), so they are returned as Python ints.
+    """
+    # One contiguous row per dimension; int32 halves the memory traffic when it fits
+    dtype = np.int32 if p_bits < 31 else np.int64
+    X = np.array(points, dtype=dtype, ndmin=2).T.copy()
+    n, n_pts = X.shape
+    m = 1 << (p_bits - 1)
+
+    # Inverse undo excess work; the per-point branch is folded into bit masks:
+    # hit = -bit is all ones where bit q of X[i] is set, zero elsewhere.
+    q, b = m, p_bits - 1
+    while q > 1:
+        mask = q - 1
+        for i in range(n):
+            hit = -((X[i] >> b) & 1)
+            t = (X[0] ^ X[i]) & mask & ~hit
+            X[0] ^= t | (mask & hit)
+            X[i] ^= t
+        q, b = q >> 1, b - 1
+    # Gray encode
+    for i in range(1, n):
+        X[i] ^= X[i - 1]
+    t = np.zeros(n_pts, dtype=np.int64)
+    q, b = m, p_bits - 1
+    while q > 1:
+        t ^= (q - 1) & -((X[n - 1] >> b) & 1)
+        q, b = q >> 1, b - 1
+    X ^= t
+
+    # Interleave: bit level j (MSB first) contributes one n-bit digit per point.
+    # Digits are packed into 63-bit words, and the words into Python ints.
+    X = X.astype(np.int64, copy=False)
+    levels_per_word = max(1, 63 // n)
+    words = []
+    for start in range(0, p_bits, levels_per_word):
+        levels = range(start, min(p_bits, start + levels_per_word))
+        w = np.zeros(n_pts, dtype=np.int64)
+        for j in levels:
+            w <<= n
+            for i in range(n):
+                w |= ((X[i] >> (p_bits - 1 - j)) & 1) << (n - 1 - i)
+        words.append((w, n * len(levels)))
+    if len(words) == 1:
+        return words[0][0].tolist()
+    h = words[0][0].astype(object)
+    for w, bits in words[1:]:
+        h = (h << bits) | w.astype(object)
+    return h.tolist()
+
+def usable_geometry_nodes(nodes: List[dict]) -> List[dict]:
+    return [n for n in nodes
+            if isinstance(n.get("coordinate"), dict)
+            and isinstance(n["coordinate"].get("Vec"), list)
+            and isinstance(n.get("name"), str)]
 
 class HilbertIndex:
-    def __init__(self, nodes: List[dict], p_bits: int = NET_P_BITS):
-        self.nodes = [n for n in nodes
-                      if isinstance(n.get("coordinate"), dict)
-                      and isinstance(n["coordinate"].get("Vec"), list)
-                      and isinstance(n.get("name"), str)]
+    """
+    Nodes ordered by Hilbert key. `keys` is the sorted float64 key array (the
+    precision the window comparison always used) with `sorted_names` /
+    `sorted_h` (exact ints) parallel to it, so a window is two binary searches
+    and a slice view. Ties keep geometry order (`sorted_pos`, index into `names`).
+    An orthogonal `rotation` (MultiCurveHilbertIndex) rotates Vec before encoding.
+    """
+    def __init__(self, nodes: List[dict], p_bits: int = NET_P_BITS, rotation: Optional[np.ndarray] = None):
+        self.p_bits = p_bits
+        self.rotation = rotation
+        self._build(usable_geometry_nodes(nodes))
+
+    def _vecs(self, nodes: List[dict]) -> np.ndarray:
+        geom = np.array([n["coordinate"]["Vec"] for n in nodes], dtype=float)
+        return geom if self.rotation is None else geom @ self.rotation
+
+    def _build(self, nodes: List[dict]):
+        self.nodes = nodes
         self.names = [n["name"] for n in self.nodes]
         if not self.names:
             raise SystemExit("no nodes with coordinate.Vec found in geometry")
 
-        geom = np.vstack([np.array(n["coordinate"]["Vec"], dtype=float) for n in self.nodes])
-        self.norm, _, _ = minmax_norm_to_bits(geom, p_bits)
-        self.H = HilbertCurve(p=p_bits, n=self.norm.shape[1])
-        self.h_raw = [int(self.H.distance_from_point(self.norm[i].tolist()))
-                      for i in range(len(self.names))]
-        self.df = (pd.DataFrame({"name": self.names, "h_raw": self.h_raw})
-                     .sort_values("h_raw", kind="mergesort")
-                     .reset_index(drop=True))
-        self.idx = {nm: i for i, nm in self.df["name"].items()}
+        self.geom = self._vecs(self.nodes)
+        self.norm, self.lo, self.hi = minmax_norm_to_bits(self.geom, self.p_bits)
+        self.h_raw = hilbert_distances(self.norm, self.p_bits)
+        self._build_sorted()
+
+    def _build_sorted(self):
+        order = sorted(range(len(self.names)), key=self.h_raw.__getitem__)  # stable, like mergesort
+        names = [self.names[i] for i in order]
+        self.sorted_pos = np.array(order, dtype=np.int64)
+        self.sorted_names = np.array(names, dtype=object)
+        self.sorted_h = [self.h_raw[i] for i in order]
+        self.keys = np.array([float(h) for h in self.sorted_h], dtype=np.float64)
+        self.skip = np.array(["-wan" in nm.lower() for nm in names], dtype=bool)
+        self.idx = {nm: i for i, nm in enumerate(names)}
+        self._df = None
+
+    def update(self, nodes: List[dict]) -> dict:
+        """
+        Applies a refreshed geometry. Only nodes whose coordinates moved are
+        re-encoded and moved within the sorted arrays; a changed node list or
+        changed min/max bounds (which rescale every key) falls back to a full build.
+        The result is the same index a fresh HilbertIndex(nodes) would give.
+        """
+        nodes = usable_geometry_nodes(nodes)
+        names = [n["name"] for n in nodes]
+        if not names:
+            return {"rebuilt": False, "moved": 0, "rekeyed": 0}
+        try:
+            geom = self._vecs(nodes)
+        except ValueError:
+            geom = None
+        if (names != self.names or geom is None or geom.shape != self.geom.shape
+                or not np.array_equal(geom.min(axis=0), self.lo)
+                or not np.array_equal(geom.max(axis=0), self.hi)):
+            self._build(nodes)
+            return {"rebuilt": True, "moved": len(names), "rekeyed": len(names)}
+
+        moved = np.flatnonzero((geom != self.geom).any(axis=1))
+        self.nodes, self.geom = nodes, geom
+        if not len(moved):
+            return {"rebuilt": False, "moved": 0, "rekeyed": 0}
+        norm = quantize_to_bits(geom[moved], self.lo, self.hi, self.p_bits)
+        self.norm[moved] = norm
+        fresh = hilbert_distances(norm, self.p_bits)
+        rekeyed = [(h, int(j)) for h, j in zip(fresh, moved) if h != self.h_raw[j]]
+        for h, j in rekeyed:
+            self.h_raw[j] = h
+        if rekeyed:
+            self._move_sorted(rekeyed)
+        return {"rebuilt": False, "moved": len(moved), "rekeyed": len(rekeyed)}
+
+    def clone(self) -> "HilbertIndex":
+        """Copy that update() can change while readers keep using this one."""
+        other = copy.copy(self)
+        other.norm = self.norm.copy()
+        other.h_raw = list(self.h_raw)
+        other.sorted_h = list(self.sorted_h)
+        other.idx = dict(self.idx)
+        return other
+
+    def _move_sorted(self, rekeyed: List[tuple]):
+        """Takes the re-keyed (new_h, pos) nodes out of the sorted arrays and inserts them at their new keys."""
+        old_at = sorted(self.idx[self.names[j]] for _, j in rekeyed)
+        for i in reversed(old_at):
+            del self.sorted_h[i]
+        keep = np.ones(len(self.sorted_pos), dtype=bool)
+        keep[old_at] = False
+        sorted_pos = self.sorted_pos[keep]
+
+        rekeyed.sort()
+        at = []
+        for h, j in rekeyed:
+            lo = bisect.bisect_left(self.sorted_h, h)
+            hi = bisect.bisect_right(self.sorted_h, h, lo)
+            at.append(lo + int(np.searchsorted(sorted_pos[lo:hi], j)))
+        for k, ((h, _), i) in enumerate(zip(rekeyed, at)):
+            self.sorted_h.insert(i + k, h)
+        pos = [j for _, j in rekeyed]
+        self.sorted_pos = np.insert(sorted_pos, at, pos)
+        self.sorted_names = np.insert(self.sorted_names[keep], at,
+                                      np.array([self.names[j] for j in pos], dtype=object))
+        self.keys = np.insert(self.keys[keep], at, [float(h) for h, _ in rekeyed])
+        self.skip = np.insert(self.skip[keep], at, ["-wan" in self.names[j].lower() for j in pos])
+
+        first = min(old_at[0], at[0])
+        last = max(old_at[-1], at[-1] + len(at) - 1)
+        for i, nm in enumerate(self.sorted_names[first:last + 1].tolist(), start=first):
+            self.idx[nm] = i
+        self._df = None
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """name/h_raw table sorted by h_raw (built on first use, e.g. for --dump-hilbert)."""
+        if self._df is None:
+            self._df = pd.DataFrame({"name": self.sorted_names, "h_raw": pd.Series(self.sorted_h, dtype=object)})
+        return self._df
+
+    @property
+    def h_min(self) -> int:
+        return self.sorted_h[0]
+
+    @property
+    def h_max(self) -> int:
+        return self.sorted_h[-1]
 
     def h(self, name: str) -> Optional[int]:
         if name not in self.idx:
             return None
-        return int(self.df.at[self.idx[name], "h_raw"])
+        return self.sorted_h[self.idx[name]]
+
+    def raw_window(self, query: str, delta_raw: int) -> slice:
+        """Positions in the sorted arrays with |key - key(query)| <= delta_raw (empty if unknown)."""
+        if query not in self.idx:
+            return slice(0, 0)
+        qh = self.keys[self.idx[query]]
+        d = max(0.0, float(delta_raw))
+        lo = int(np.searchsorted(self.keys, qh - d, side="left"))
+        hi = int(np.searchsorted(self.keys, qh + d, side="right"))
+        return slice(lo, hi)
+
+    def names_in_raw_window(self, query: str, delta_raw: int) -> List[str]:
+        w = self.raw_window(query, delta_raw)
+        names = self.sorted_names[w]
+        keep = ~self.skip[w] & (names != query)
+        return names[keep].tolist()
+
+# -------------------------- Multi-curve Hilbert --------------------------
+def curve_rotation(curve: int, dims: int) -> np.ndarray:
+    """Fixed random orthogonal matrix for curve `curve` (same on every host and run)."""
+    q, r = np.linalg.qr(np.random.default_rng(curve).normal(size=(dims, dims)))
+    return q * np.sign(np.diag(r))
+
+class MultiCurveHilbertIndex:
+    """
+    --hilbert-curves N: curve 0 is the plain HilbertIndex, curves 1..N-1 encode
+    randomly rotated coordinates, so nodes split by a quadrant boundary on one
+    curve are usually adjacent on another. A window is the union of every curve's
+    window at the same fraction of its span (curve-0 units in, curve-0 order first).
+    """
+    def __init__(self, nodes: List[dict], curves: int = 2, p_bits: int = NET_P_BITS):
+        nodes = usable_geometry_nodes(nodes)
+        dims = len(nodes[0]["coordinate"]["Vec"]) if nodes else 0
+        self.curves = [HilbertIndex(nodes, p_bits)]
+        self.curves += [HilbertIndex(nodes, p_bits, rotation=curve_rotation(c, dims)) for c in range(1, curves)]
+
+    @property
+    def names(self) -> List[str]:
+        return self.curves[0].names
+
+    @property
+    def idx(self) -> Dict[str, int]:
+        return self.curves[0].idx
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self.curves[0].df
+
+    @property
+    def h_min(self) -> int:
+        return self.curves[0].h_min
+
+    @property
+    def h_max(self) -> int:
+        return self.curves[0].h_max
+
+    def h(self, name: str) -> Optional[int]:
+        return self.curves[0].h(name)
 
     def names_in_raw_window(self, query: str, delta_raw: int) -> List[str]:
+        base = self.curves[0]
+        span = max(1, base.h_max - base.h_min)
+        out = base.names_in_raw_window(query, delta_raw)
+        seen = set(out)
+        for curve in self.curves[1:]:
+            delta = max(0, int(delta_raw)) * max(1, curve.h_max - curve.h_min) // span
+            for nm in curve.names_in_raw_window(query, delta):
+                if nm not in seen:
+                    seen.add(nm)
+                    out.append(nm)
+        return out
+
+    def update(self, nodes: List[dict]) -> dict:
+        stats = [curve.update(nodes) for curve in self.curves]
+        return {"rebuilt": any(st["rebuilt"] for st in stats), "moved": stats[0]["moved"],
+                "rekeyed": sum(st["rekeyed"] for st in stats)}
+
+    def clone(self) -> "MultiCurveHilbertIndex":
+        other = copy.copy(self)
+        other.curves = [curve.clone() for curve in self.curves]
+        return other
+
+# ---------------------------- KD-tree backend -----------------------------
+def _coord_field(coord: dict, key: str) -> float:
+    v = _to_float(coord.get(key, 0.0))
+    return v if math.isfinite(v) else 0.0
+
+class VivaldiKDIndex:
+    """
+    Exact spatial backend (--index-backend kdtree) with the HilbertIndex interface.
+    Distance is Serf's coordinate estimate: |vec_a - vec_b| + both heights, plus
+    both adjustments when that stays positive. Raw units are microseconds of that
+    estimate, so run_once's widening windows (pct_start * span * 2**step) become
+    exact radius searches; nearest(name, k) gives the exact k nearest.
+    The tree splits the widest dimension at the median down to LEAF_SIZE points.
+    """
+    LEAF_SIZE = 32
+
+    def __init__(self, nodes: List[dict], leaf_size: int = LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self._build(usable_geometry_nodes(nodes))
+
+    def _build(self, nodes: List[dict]):
+        self.nodes = nodes
+        self.names = [n["name"] for n in nodes]
+        if not self.names:
+            raise SystemExit("no nodes with coordinate.Vec found in geometry")
+        self.vec = np.array([n["coordinate"]["Vec"] for n in nodes], dtype=float)
+        self.height = np.array([_coord_field(n["coordinate"], "Height") for n in nodes])
+        self.adjust = np.array([_coord_field(n["coordinate"], "Adjustment") for n in nodes])
+        self.idx = {nm: i for i, nm in enumerate(self.names)}
+        self.skip = np.array(["-wan" in nm.lower() for nm in self.names], dtype=bool)
+        # Every distance from node i is at least |dvec| + floor[i]
+        self.floor = self.height + self.height.min() + np.minimum(0.0, self.adjust + self.adjust.min())
+        span_s = (float(np.linalg.norm(self.vec.max(axis=0) - self.vec.min(axis=0)))
+                  + 2 * float(self.height.max()) + max(0.0, 2 * float(self.adjust.max())))
+        self.span_us = max(1, int(span_s * 1e6))
+        self._build_tree()
+        self._df = None
+
+    def _build_tree(self):
+        perm = np.arange(len(self.names))
+        start, end, left, right, lo, hi = [], [], [], [], [], []
+
+        def split(a, b):
+            node = len(start)
+            pts = self.vec[perm[a:b]]
+            start.append(a); end.append(b); left.append(-1); right.append(-1)
+            lo.append(pts.min(axis=0)); hi.append(pts.max(axis=0))
+            width = hi[node] - lo[node]
+            dim = int(np.argmax(width))
+            if b - a > self.leaf_size and width[dim] > 0:
+                mid = (a + b) // 2
+                perm[a:b] = perm[a:b][np.argpartition(pts[:, dim], mid - a)]
+                left[node] = split(a, mid)
+                right[node] = split(mid, b)
+            return node
+
+        split(0, len(perm))
+        self.perm = perm
+        self.node_start, self.node_end = np.array(start), np.array(end)
+        self.node_left, self.node_right = np.array(left), np.array(right)
+        self.node_lo, self.node_hi = np.array(lo), np.array(hi)
+        leaves = np.flatnonzero(self.node_left < 0)
+        self.leaf_of = np.empty(len(perm), dtype=np.int64)  # node -> its leaf
+        for nd in leaves.tolist():
+            self.leaf_of[perm[start[nd]:end[nd]]] = nd
+
+    def distances(self, i: int, pos: np.ndarray) -> np.ndarray:
+        """Coordinate distance (s) from node i to nodes `pos`."""
+        raw = np.linalg.norm(self.vec[pos] - self.vec[i], axis=1) + self.height[i] + self.height[pos]
+        adjusted = raw + self.adjust[i] + self.adjust[pos]
+        return np.where(adjusted > 0, adjusted, raw)
+
+    def within(self, i: int, radius_s: float):
+        """(positions, distances) of all nodes within radius_s of node i, nearest first."""
+        reach = radius_s - self.floor[i]
+        if reach < 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        q = self.vec[i]
+        hits, frontier = [], np.zeros(1, dtype=np.int64)
+        while len(frontier):  # one vectorized step per tree level
+            gap = np.maximum(self.node_lo[frontier] - q, 0.0) + np.maximum(q - self.node_hi[frontier], 0.0)
+            frontier = frontier[np.einsum("ij,ij->i", gap, gap) <= reach * reach]
+            leaf = self.node_left[frontier] < 0
+            hits.append(frontier[leaf])
+            inner = frontier[~leaf]
+            frontier = np.concatenate([self.node_left[inner], self.node_right[inner]])
+        hits = np.concatenate(hits)
+        if not len(hits):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        starts, sizes = self.node_start[hits], self.node_end[hits] - self.node_start[hits]
+        offsets = np.cumsum(sizes) - sizes
+        pos = self.perm[np.repeat(starts - offsets, sizes) + np.arange(int(sizes.sum()))]
+        dist = self.distances(i, pos)
+        keep = dist <= radius_s
+        pos, dist = pos[keep], dist[keep]
+        order = np.lexsort((pos, dist))
+        return pos[order], dist[order]
+
+    def nearest(self, name: str, k: int) -> List[str]:
+        """The k nearest other (non -wan) nodes by coordinate distance, nearest first."""
+        if name not in self.idx or k <= 0:
+            return []
+        i = self.idx[name]
+        # Seed the radius with the k-th distance inside the query's own leaf
+        nd = self.leaf_of[i]
+        pos = self.perm[self.node_start[nd]:self.node_end[nd]]
+        dist = self.distances(i, pos[~self.skip[pos] & (pos != i)])
+        radius = float(np.partition(dist, k - 1)[k - 1]) if len(dist) >= k else self.span_us / 1e6
+        while True:
+            pos, _ = self.within(i, radius)
+            pos = pos[~self.skip[pos] & (pos != i)]
+            if len(pos) >= k or radius > 2 * self.span_us / 1e6 + self.floor[i]:
+                return [self.names[j] for j in pos[:k].tolist()]
+            radius *= 2
+
+    @property
+    def h_min(self) -> int:
+        return 0
+
+    @property
+    def h_max(self) -> int:
+        return self.span_us
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._df is None:
+            self._df = pd.DataFrame({"name": self.names, "height": self.height, "adjustment": self.adjust})
+        return self._df
+
+    def names_in_raw_window(self, query: str, delta_raw: int) -> List[str]:
+        """Nodes within delta_raw microseconds of `query`, nearest first."""
         if query not in self.idx:
             return []
-        qh = float(self.h(query))
-        d = max(0.0, float(delta_raw))
-        lo, hi = qh - d, qh + d
-        mask = (self.df["h_raw"].astype(float) >= lo) & (self.df["h_raw"].astype(float) <= hi)
-        out = self.df.loc[mask, "name"].tolist()
-        return [n for n in out if n != query and "-wan" not in n.lower()]
+        i = self.idx[query]
+        pos, _ = self.within(i, max(0.0, float(delta_raw)) / 1e6)
+        pos = pos[~self.skip[pos] & (pos != i)]
+        return [self.names[j] for j in pos.tolist()]
+
+    def update(self, nodes: List[dict]) -> dict:
+        """Rebuilds from a refreshed geometry (the tree build is vectorized and cheap)."""
+        nodes = usable_geometry_nodes(nodes)
+        if not nodes:
+            return {"rebuilt": False, "moved": 0, "rekeyed": 0}
+        self._build(nodes)
+        return {"rebuilt": True, "moved": len(nodes), "rekeyed": len(nodes)}
+
+    def clone(self) -> "VivaldiKDIndex":
+        return copy.copy(self)  # update() replaces every attribute instead of mutating it
+
+INDEX_BACKENDS = {"hilbert": HilbertIndex, "kdtree": VivaldiKDIndex}
+
+def make_spatial_index(nodes: List[dict], backend: str = "hilbert", curves: int = 1):
+    if backend == "hilbert" and curves > 1:
+        return MultiCurveHilbertIndex(nodes, curves)
+    return INDEX_BACKENDS[backend](nodes)
 
 # --------------------------- Filtering & cleaning -------------------------
 def _nan_to_inf(series: pd.Series) -> pd.Series:
@@ -386,34 +1098,230 @@ def sort_candidates(x: pd.DataFrame, key: str) -> pd.DataFrame:
         ascending = False
     return x.sort_values(by=[key,"name"], ascending=[ascending, True])
 
+# ------------------------- Columnar member table -------------------------
+DESCENDING_SORT_KEYS = {"cpu","ram","storage","gpu","score_per_cpu","score_per_ram","score_per_storage","score_per_gpu"}
+
+class MemberTable:
+    """
+    Struct-of-arrays copy of a member table (a LAN snapshot or one CH answer),
+    built once per snapshot: one NumPy array per column, a validity mask for
+    rows without NaN in REQUIRED_COLS and a name rank for sort ties. Candidates
+    are selected and ordered as index arrays; only the final rows become dicts.
+    The result matches drop_nan_members -> filter_by_resources -> sort_candidates -> head.
+    """
+    def __init__(self, df: pd.DataFrame):
+        n = len(df)
+        self.names = df["name"].to_numpy(dtype=object) if "name" in df.columns else np.empty(0, dtype=object)
+        self.values = {c: df[c].to_numpy() if c in df.columns else np.full(n, np.nan) for c in LAN_COLS[1:]}
+        self.num = {c: self.values[c].astype(float) for c in REQUIRED_COLS[1:]}
+        self.valid = ~pd.isna(self.values["ip"]) if n else np.zeros(0, dtype=bool)
+        for c in REQUIRED_COLS[1:]:
+            self.valid &= ~np.isnan(self.num[c])
+        self.name_rank = np.empty(n, dtype=np.int64)
+        self.name_rank[np.argsort(self.names, kind="stable")] = np.arange(n)
+        self.pos: Dict[str, List[int]] = {}
+        for i, nm in enumerate(self.names.tolist()):
+            self.pos.setdefault(nm, []).append(i)
+
+    def rows(self, names=None) -> np.ndarray:
+        """Valid row positions (table order), optionally restricted to `names`."""
+        if names is None:
+            idx = np.arange(len(self.names))
+        else:
+            idx = np.array(sorted(i for nm in set(names) for i in self.pos.get(nm, ())), dtype=np.int64)
+        return idx[self.valid[idx]]
+
+    def filter(self, idx: np.ndarray, min_cpu, min_ram, min_storage, min_gpu,
+               budget_cpu=0.0, budget_ram=0.0, budget_storage=0.0, budget_gpu=0.0,
+               min_sc_cpu=0.0, min_sc_ram=0.0, min_sc_storage=0.0, min_sc_gpu=0.0) -> np.ndarray:
+        keep = np.ones(len(idx), dtype=bool)
+        for col, floor in (("cpu", min_cpu), ("ram", min_ram), ("storage", min_storage), ("gpu", min_gpu),
+                           ("score_per_cpu", min_sc_cpu), ("score_per_ram", min_sc_ram),
+                           ("score_per_storage", min_sc_storage), ("score_per_gpu", min_sc_gpu)):
+            if floor > 0:
+                keep &= self.num[col][idx] >= floor
+        for col, cap in (("price_per_cpu", budget_cpu), ("price_per_ram", budget_ram),
+                         ("price_per_storage", budget_storage), ("price_per_gpu", budget_gpu)):
+            if cap > 0:
+                keep &= self.num[col][idx] <= cap
+        return idx[keep]
+
+    def sort(self, idx: np.ndarray, key: str) -> np.ndarray:
+        if key == "none" or not len(idx):
+            return idx
+        vals = self.num[key][idx]
+        return idx[np.lexsort((self.name_rank[idx], -vals if key in DESCENDING_SORT_KEYS else vals))]
+
+    def records(self, idx: np.ndarray, **extra) -> List[dict]:
+        """Rows as dicts (name, LAN_COLS, then `extra` columns: a constant or one value per row)."""
+        cols = {"name": self.names[idx].tolist()}
+        cols.update((c, self.values[c][idx].tolist()) for c in LAN_COLS[1:])
+        for c, v in extra.items():
+            cols[c] = v if isinstance(v, list) else [v] * len(idx)
+        return [dict(zip(cols, row)) for row in zip(*cols.values())]
+
+# (frame, MemberTable) of the last LAN snapshot (get_lan_members returns the same frame while unchanged)
+_lan_table = {"entry": (None, None)}
+
+def lan_member_table(df: pd.DataFrame) -> MemberTable:
+    last_df, table = _lan_table["entry"]
+    if last_df is not df:
+        table = MemberTable(df)
+        _lan_table["entry"] = (df, table)
+    return table
+
 # ------------------------------ HTTP server ------------------------------
-def start_live_http_server(state, host: str, port: int, path: str):
-    import http.server, socketserver, json as _json, math as _m
-
-    def clean(obj):
-        if isinstance(obj, dict):
-            return {k: clean(v) for k, v in obj.items()}
-        if isinstance(obj, list):
-            return [clean(v) for v in obj]
-        if isinstance(obj, float):
-            if _m.isnan(obj) or _m.isinf(obj):
-                return None
-        return obj
+MAX_LONG_POLL_S = 60.0
+DISCOVER_PATH = "/discover"
+BUYER_PUSH_PATH = "/buyer"
+MAX_PUSH_BYTES = 1 << 20
+
+GZIP_MIN_BYTES = 512  # smaller bodies are sent as-is
+
+def json_safe(obj):
+    """NaN/inf -> None, recursively (JSON has no such numbers)."""
+    if isinstance(obj, dict):
+        return {k: json_safe(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [json_safe(v) for v in obj]
+    if isinstance(obj, float):
+        if math.isnan(obj) or math.isinf(obj):
+            return None
+    return obj
+
+def encode_result(payload: dict, version: int) -> dict:
+    """
+    The published result as served: JSON bytes (with "version"), a gzip variant
+    and a strong ETag per representation. Built once per publish so a GET only
+    copies bytes.
+    """
+    body = json.dumps(json_safe(dict(payload, version=version)), separators=(",", ":")).encode("utf-8")
+    tag = hashlib.sha256(body).hexdigest()[:20]
+    return {"version": version, "body": body, "etag": f'"{tag}"',
+            "gzip": gzip.compress(body, 6) if len(body) >= GZIP_MIN_BYTES else None,
+            "gzip_etag": f'"{tag}-gz"'}
+
+def new_result_state(payload: Optional[dict] = None) -> dict:
+    state = {"payload": payload or {"scope": "none", "results": []}, "version": 0, "lock": threading.Lock()}
+    state["cond"] = threading.Condition(state["lock"])
+    state["entity"] = encode_result(state["payload"], 0)
+    return state
+
+def publish_payload(state, payload: dict) -> int:
+    """Stores the latest payload; bumps the version (and wakes long-pollers) only on change."""
+    with state["cond"]:
+        if payload != state.get("payload"):
+            state["payload"] = payload
+            state["version"] += 1
+            state["entity"] = encode_result(payload, state["version"])
+            state["cond"].notify_all()
+        return state["version"]
+
+def _etag_matches(header: Optional[str], entity: dict) -> bool:
+    if not header:
+        return False
+    tags = {t.strip() for t in header.split(",")}
+    return "*" in tags or bool(tags & {entity["etag"], entity["gzip_etag"]})
+
+def _accepts_gzip(header: Optional[str]) -> bool:
+    """True if Accept-Encoding allows gzip: an explicit gzip entry decides, else "*"; q=0 forbids."""
+    weights = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in weights:
+            return weights[coding] > 0
+    return False
+
+def start_live_http_server(state, host: str, port: int, path: str, discover=None, on_buyer=None):
+    import http.server, socketserver
+    from urllib.parse import urlsplit, parse_qs
+
+    def _qnum(qs, key, dv):
+        try:
+            return float(qs.get(key, [dv])[0])
+        except (TypeError, ValueError):
+            return dv
 
     class Handler(http.server.BaseHTTPRequestHandler):
         def do_GET(self):
-            if self.path == path:
+            url = urlsplit(self.path)
+            if url.path == path:
+                # ?since=<version>&wait=<s> (or If-None-Match + ?wait=<s>): hold the
+                # request until a newer result is published (a `since` above the current
+                # version predates a restart and is answered at once)
+                qs = parse_qs(url.query)
+                since = int(_qnum(qs, "since", -1))
+                wait = min(max(_qnum(qs, "wait", 0.0), 0.0), MAX_LONG_POLL_S)
+                inm = self.headers.get("If-None-Match")
+                with state["cond"]:
+                    if wait > 0 and since >= 0:
+                        state["cond"].wait_for(lambda: state["version"] != since, timeout=wait)
+                    elif wait > 0 and inm:
+                        state["cond"].wait_for(lambda: not _etag_matches(inm, state["entity"]), timeout=wait)
+                    entity = state["entity"]
+                use_gzip = entity["gzip"] is not None and _accepts_gzip(self.headers.get("Accept-Encoding"))
+                etag = entity["gzip_etag"] if use_gzip else entity["etag"]
+                if _etag_matches(inm, entity):
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("X-Result-Version", str(entity["version"]))
+                    self.end_headers()
+                    return
+                body = entity["gzip"] if use_gzip else entity["body"]
                 self.send_response(200)
                 self.send_header("Content-Type","application/json")
+                self.send_header("Cache-Control","no-cache")
+                self.send_header("ETag", etag)
+                self.send_header("Vary", "Accept-Encoding")
+                if use_gzip:
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("X-Result-Version", str(entity["version"]))
+                self.end_headers()
+                self.wfile.write(body)
+            elif discover is not None and url.path == DISCOVER_PATH:
+                code, payload = discover(parse_qs(url.query))
+                body = json.dumps(json_safe(payload), separators=(",",":")).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type","application/json")
                 self.send_header("Cache-Control","no-store")
                 self.end_headers()
-                with state["lock"]:
-                    payload = state.get("payload", {"scope":"none","results":[]})
-                    self.wfile.write(_json.dumps(clean(payload), separators=(",",":")).encode("utf-8"))
+                self.wfile.write(body)
             elif self.path == "/healthz":
                 self.send_response(200); self.end_headers(); self.wfile.write(b"ok")
             else:
                 self.send_response(404); self.end_headers()
+        def do_POST(self):
+            # POST /buyer (--buyer-push): the buyer sends its document when it changes
+            if on_buyer is None or urlsplit(self.path).path != BUYER_PUSH_PATH:
+                self.send_response(404); self.end_headers()
+                return
+            try:
+                size = int(self.headers.get("Content-Length", "0"))
+                if not 0 < size <= MAX_PUSH_BYTES:
+                    raise ValueError(f"body size {size}")
+                doc = json.loads(self.rfile.read(size))
+                if not isinstance(doc, dict):
+                    raise ValueError("not a JSON object")
+            except ValueError as e:
+                self.send_response(400); self.end_headers(); self.wfile.write(str(e).encode("utf-8"))
+                return
+            on_buyer(doc)
+            self.send_response(204); self.end_headers()
+
         def log_message(self, fmt, *args): return
 
     class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
@@ -423,25 +1331,50 @@ def start_live_http_server(state, host: str, port: int, path: str):
     httpd = ThreadingHTTPServer((host, port), Handler)
     t = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval":0.5}, daemon=True)
     t.start()
-    print(f"[http] live endpoint at http://{host}:{port}{path}")
+    print(f"[http] live endpoint at http://{host}:{port}{path} (long-poll: ?since=<version>&wait=<s>)")
+    if discover is not None:
+        print(f"[http] on-demand discovery at http://{host}:{port}{DISCOVER_PATH}?node=<name>&<filters>")
+    if on_buyer is not None:
+        print(f"[http] buyer pushes accepted at POST http://{host}:{port}{BUYER_PUSH_PATH}")
     return httpd
 
 # ------------------------------ Buyer loader -----------------------------
-def load_buyer(url: str, timeout: int = 5) -> dict:
+# Validators of the last buyer document applied: the server's ETag and our own digest
+_buyer_state = {"etag": "", "digest": None}
+
+def load_buyer(url: str, timeout: int = 5, etag: str = ""):
+    """(doc, etag); doc is None when the buyer answers 304 to If-None-Match, {} on errors."""
     import urllib.request, urllib.error
+    req = urllib.request.Request(url, headers={"If-None-Match": etag} if etag else {})
     try:
-        with urllib.request.urlopen(url, timeout=timeout) as resp:
-            return json.load(resp)
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.load(resp), resp.headers.get("ETag", "")
     except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, etag
         print(f"[buyer] HTTP error {e.code} from {url}")
     except Exception as e:
         print(f"[buyer] fetch error from {url}: {e}")
-    return {}
+    return {}, ""
 
-def apply_buyer_overrides(args, ap):
-    if not args.buyer_url:
-        return
-    buyer = load_buyer(args.buyer_url, timeout=5)
+def apply_buyer_overrides(args, ap, buyer: Optional[dict] = None) -> bool:
+    """
+    Applies a buyer document (pushed, or fetched from --buyer-url with If-None-Match)
+    to the filters. Returns False, leaving args as they are, when the buyer server
+    answered 304 or the document is the one applied last time.
+    """
+    bs = _buyer_state
+    source = f"POST {BUYER_PUSH_PATH}" if buyer is not None else args.buyer_url
+    if buyer is None:
+        if not args.buyer_url:
+            return False
+        buyer, bs["etag"] = load_buyer(args.buyer_url, timeout=5, etag=bs["etag"])
+        if buyer is None:
+            return False
+    digest = hashlib.sha256(json.dumps(buyer, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    if digest == bs["digest"]:
+        return False
+    bs["digest"] = digest
     res = buyer.get("resources") or {}
 
     def _get(field, key, dv=0.0):
@@ -500,16 +1433,23 @@ def apply_buyer_overrides(args, ap):
         args.min_score_per_gpu = sc_gpu
 
     print(
-        f"[buyer] loaded from {args.buyer_url}: "
+        f"[buyer] loaded from {source}: "
         f"min(cpu={args.min_cpu}, ram={args.min_ram}, storage={args.min_storage}, gpu={args.min_gpu}); "
         f"budget(cpu={args.budget_per_cpu}, ram={args.budget_per_ram}, storage={args.budget_per_storage}, gpu={args.budget_per_gpu}); "
         f"score_min(cpu={args.min_score_per_cpu}, ram={args.min_score_per_ram}, storage={args.min_score_per_storage}, gpu={args.min_score_per_gpu})"
     )
+    return True
+
+def members_digest(df: pd.DataFrame) -> str:
+    """Content hash of a LAN member table (row order included)."""
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
 
 # ----------------------------- One discovery run -------------------------
-def run_once(query_node: str, args, H: HilbertIndex, rtts: Dict[str, Dict[str, float]]) -> dict:
-    # LAN members fetched fresh each loop (dynamic tags) with internal retry
-    lan_df = get_lan_members(args.rpc_addr)
+def run_once(query_node: str, args, H: HilbertIndex, rtt_index: RttIndex,
+             ch_cache: Optional[ChAnswerCache] = None, lan_df: Optional[pd.DataFrame] = None) -> dict:
+    # LAN members fetched fresh each loop (dynamic tags) with internal retry; server mode passes its snapshot
+    if lan_df is None:
+        lan_df = get_lan_members(args.rpc_addr, args.members_url)
 
     # If we couldn’t read locals at all, skip this cycle (avoid CH misfire)
     if lan_df.empty:
@@ -517,15 +1457,17 @@ def run_once(query_node: str, args, H: HilbertIndex, rtts: Dict[str, Dict[str, f
         return {"query": query_node, "scope": "none", "results": []}
 
     lan_names = set(lan_df["name"].tolist())
+    if ch_cache is not None:
+        ch_cache.observe_members(lan_df)
 
     if args.dump_hilbert:
         print("\n=== HILBERT TABLE (sorted by h_raw) ===")
         print(H.df.to_string(index=False))
 
     # -------- Phase A: RTT slice (sequential: local -> remote) --------
-    rtt_map = rtts.get(query_node, {})
-    rtt_names = [n for n, r in rtt_map.items()
-                 if r is not None and r <= args.rtt_threshold_ms and n in H.idx and n != query_node]
+    near, near_rtts = rtt_index.within(query_node, args.rtt_threshold_ms)
+    rtt_map = dict(zip(near, near_rtts))
+    rtt_names = [n for n in near if n in H.idx and n != query_node]
 
     local_names = [n for n in rtt_names if n in lan_names]
     remote_names = [n for n in rtt_names if n not in lan_names]
@@ -539,39 +1481,36 @@ def run_once(query_node: str, args, H: HilbertIndex, rtts: Dict[str, Dict[str, f
         args.min_score_per_cpu, args.min_score_per_ram, args.min_score_per_storage, args.min_score_per_gpu
     )
 
-    # A1) Local first
-    if local_names:
-        local_view = lan_df[lan_df["name"].isin(local_names)][[
-            "name","ip","cpu","ram","storage","gpu",
-            "price_per_cpu","price_per_ram","price_per_storage","price_per_gpu",
-            "score_per_cpu","score_per_ram","score_per_storage","score_per_gpu"
-        ]].copy()
-        local_view["origin"] = "local"
-        local_view = drop_nan_members(local_view)  # <-- remove NaN members
-        local_pass = filter_by_resources(
-            local_view, args.min_cpu, args.min_ram, args.min_storage, args.min_gpu,
+    lan_table = lan_member_table(lan_df)
+
+    def pick(table: MemberTable, names=None) -> np.ndarray:
+        """Positions of the passing members of `table`, sorted and limited."""
+        idx = table.filter(
+            table.rows(names), args.min_cpu, args.min_ram, args.min_storage, args.min_gpu,
             b_cpu, b_ram, b_sto, b_gpu, sc_cpu, sc_ram, sc_sto, sc_gpu
         )
-        if not local_pass.empty:
-            out = sort_candidates(local_pass, args.sort) if args.sort != "none" else local_pass
-            if args.limit > 0:
-                out = out.head(args.limit)
-            out["rtt_to_query"] = [rtt_map.get(n, float("nan")) for n in out["name"]]
-            out = drop_nan_members(out)  # ensure no NaN sneaks in
-            if not out.empty:
-                payload = {
-                    "query": query_node,
-                    "scope": "rtt-local",
-                    "rtt_threshold_ms": args.rtt_threshold_ms,
-                    "results": out.to_dict(orient="records")
-                }
-                print("\n=== RESULTS (RTT local) ===")
-                cols = ["ip","origin","cpu","ram","storage","gpu",
-                        "price_per_cpu","price_per_ram","price_per_storage","price_per_gpu",
-                        "score_per_cpu","score_per_ram","score_per_storage","score_per_gpu",
-                        "rtt_to_query"]
-                print(pd.DataFrame(payload["results"]).set_index("name")[cols].to_string())
-                return payload
+        idx = table.sort(idx, args.sort)
+        return idx[:args.limit] if args.limit > 0 else idx
+
+    rtt_cols = ["ip","origin","cpu","ram","storage","gpu",
+                "price_per_cpu","price_per_ram","price_per_storage","price_per_gpu",
+                "score_per_cpu","score_per_ram","score_per_storage","score_per_gpu",
+                "rtt_to_query"]
+
+    # A1) Local first
+    if local_names:
+        idx = pick(lan_table, local_names)
+        if len(idx):
+            payload = {
+                "query": query_node,
+                "scope": "rtt-local",
+                "rtt_threshold_ms": args.rtt_threshold_ms,
+                "results": lan_table.records(idx, origin="local", rtt_to_query=[
+                    rtt_map.get(n, float("nan")) for n in lan_table.names[idx]])
+            }
+            print("\n=== RESULTS (RTT local) ===")
+            print(pd.DataFrame(payload["results"]).set_index("name")[rtt_cols].to_string())
+            return payload
 
     # A2) Remote via CH (only if locals failed the filters)
     if remote_names:
@@ -579,150 +1518,227 @@ def run_once(query_node: str, args, H: HilbertIndex, rtts: Dict[str, Dict[str, f
             args.min_cpu, args.min_ram, args.min_storage, args.min_gpu,
             wanted_names=remote_names, rpc_addr=args.rpc_addr, timeout_s=args.timeout_s,
             budget_cpu=b_cpu, budget_ram=b_ram, budget_storage=b_sto, budget_gpu=b_gpu,
-            min_sc_cpu=sc_cpu, min_sc_ram=sc_ram, min_sc_storage=sc_sto, min_sc_gpu=sc_gpu
+            min_sc_cpu=sc_cpu, min_sc_ram=sc_ram, min_sc_storage=sc_sto, min_sc_gpu=sc_gpu,
+            cache=ch_cache
         )
-        if not remote_view.empty:
-            remote_view["origin"] = "wan"
-            remote_view = drop_nan_members(remote_view)  # <-- remove NaN members
-            remote_pass = filter_by_resources(
-                remote_view, args.min_cpu, args.min_ram, args.min_storage, args.min_gpu,
-                b_cpu, b_ram, b_sto, b_gpu, sc_cpu, sc_ram, sc_sto, sc_gpu
-            )
-            if not remote_pass.empty:
-                out = sort_candidates(remote_pass, args.sort) if args.sort != "none" else remote_pass
-                if args.limit > 0:
-                    out = out.head(args.limit)
-                out["rtt_to_query"] = [rtt_map.get(n, float("nan")) for n in out["name"]]
-                out = drop_nan_members(out)
-                if not out.empty:
-                    payload = {
-                        "query": query_node,
-                        "scope": "rtt-remote",
-                        "rtt_threshold_ms": args.rtt_threshold_ms,
-                        "results": out.to_dict(orient="records")
-                    }
-                    print("\n=== RESULTS (RTT remote via CH) ===")
-                    cols = ["ip","origin","cpu","ram","storage","gpu",
-                            "price_per_cpu","price_per_ram","price_per_storage","price_per_gpu",
-                            "score_per_cpu","score_per_ram","score_per_storage","score_per_gpu",
-                            "rtt_to_query"]
-                    print(pd.DataFrame(payload["results"]).set_index("name")[cols].to_string())
-                    return payload
+        remote_table = MemberTable(remote_view)
+        idx = pick(remote_table)
+        if len(idx):
+            payload = {
+                "query": query_node,
+                "scope": "rtt-remote",
+                "rtt_threshold_ms": args.rtt_threshold_ms,
+                "results": remote_table.records(idx, origin="wan", rtt_to_query=[
+                    rtt_map.get(n, float("nan")) for n in remote_table.names[idx]])
+            }
+            print("\n=== RESULTS (RTT remote via CH) ===")
+            print(pd.DataFrame(payload["results"]).set_index("name")[rtt_cols].to_string())
+            return payload
 
     print("\n[RTT] no matches (or none passed resources). Widening by raw Hilbert Δ as % of span…")
 
-    # -------- Phase B: raw-Hilbert widening (sequential per window) --------
-    hmin = int(H.df["h_raw"].min())
-    hmax = int(H.df["h_raw"].max())
+    # -------- Phase B: raw-Hilbert widening (per window, smallest first) --------
+    hmin = H.h_min
+    hmax = H.h_max
     span = max(1, hmax - hmin)
     delta0 = max(1, int(args.pct_start * span))
     q = query_node
+    cols = ["ip","origin","cpu","ram","storage","gpu",
+            "price_per_cpu","price_per_ram","price_per_storage","price_per_gpu",
+            "score_per_cpu","score_per_ram","score_per_storage","score_per_gpu"]
 
-    for step in range(args.max_steps + 1):
-        delta = delta0 * (2 ** step)
-        pct = args.pct_start * (2 ** step)
-        cand = H.names_in_raw_window(q, delta_raw=int(delta))
+    def windows():
+        for step in range(args.max_steps + 1):
+            delta = delta0 * (2 ** step)
+            yield step, int(delta), args.pct_start * (2 ** step), H.names_in_raw_window(q, delta_raw=int(delta))
 
-        print(f"\n[step {step}] Δ_raw={int(delta)} (~{pct*100:.2f}% of span) -> window size={len(cand)}")
-        if not cand:
-            continue
+    def window_payload(table, idx, origin, scope, step, delta, pct):
+        if not len(idx):
+            return None
+        return {
+            "query": q,
+            "scope": scope,
+            "step": step,
+            "delta_raw": delta,
+            "delta_pct_of_span": pct,
+            "results": table.records(idx, origin=origin),
+        }
+
+    def window_local(step, delta, pct, local_names):
+        if not local_names:
+            return None
+        return window_payload(lan_table, pick(lan_table, local_names), "local", "hilbert-local", step, delta, pct)
 
-        local_names = [n for n in cand if n in lan_names]
-        remote_names = [n for n in cand if n not in lan_names]
-        _print_names("• window local names", local_names)
-        _print_names("• window remote names", remote_names)
+    def ask_window(remote_names):
+        return MemberTable(ask_cluster_head_for_remote(
+            args.min_cpu, args.min_ram, args.min_storage, args.min_gpu,
+            wanted_names=remote_names, rpc_addr=args.rpc_addr, timeout_s=args.timeout_s,
+            budget_cpu=b_cpu, budget_ram=b_ram, budget_storage=b_sto, budget_gpu=b_gpu,
+            min_sc_cpu=sc_cpu, min_sc_ram=sc_ram, min_sc_storage=sc_sto, min_sc_gpu=sc_gpu,
+            cache=ch_cache
+        ))
+
+    def window_remote(step, delta, pct, remote_table):
+        return window_payload(remote_table, pick(remote_table), "wan", "hilbert-remote", step, delta, pct)
+
+    def split(cand):
+        return [n for n in cand if n in lan_names], [n for n in cand if n not in lan_names]
+
+    # --speculative: the CH queries of all windows up to the first one a local node
+    # answers go out at once (windows with the same remote names share one query);
+    # they are still consumed in window order, so the smallest passing window wins.
+    steps, local_hits, ch_answers, pool = windows(), {}, {}, None
+    if args.speculative > 0:
+        steps = list(steps)
+        pool = ThreadPoolExecutor(max_workers=args.speculative)
+        for step, delta, pct, cand in steps:
+            local_names, remote_names = split(cand)
+            local_hits[step] = window_local(step, delta, pct, local_names)
+            if local_hits[step] is not None:
+                break
+            if remote_names and tuple(remote_names) not in ch_answers:
+                ch_answers[tuple(remote_names)] = pool.submit(ask_window, remote_names)
+        print(f"[speculative] {len(ch_answers)} CH window queries issued (up to {args.speculative} at once)")
 
-        # B1) LOCAL first for this window
-        if local_names:
-            local_view = lan_df[lan_df["name"].isin(local_names)][[
-                "name","ip","cpu","ram","storage","gpu",
-                "price_per_cpu","price_per_ram","price_per_storage","price_per_gpu",
-                "score_per_cpu","score_per_ram","score_per_storage","score_per_gpu"
-            ]].copy()
-            local_view["origin"] = "local"
-            local_view = drop_nan_members(local_view)
-            local_pass = filter_by_resources(
-                local_view, args.min_cpu, args.min_ram, args.min_storage, args.min_gpu,
-                b_cpu, b_ram, b_sto, b_gpu, sc_cpu, sc_ram, sc_sto, sc_gpu
-            )
-            if not local_pass.empty:
-                out = sort_candidates(local_pass, args.sort) if args.sort != "none" else local_pass
-                if args.limit > 0:
-                    out = out.head(args.limit)
-                out = drop_nan_members(out)
-                if not out.empty:
-                    payload = {
-                        "query": q,
-                        "scope": "hilbert-local",
-                        "step": step,
-                        "delta_raw": int(delta),
-                        "delta_pct_of_span": pct,
-                        "results": out.to_dict(orient="records"),
-                    }
-                    print("\n=== RESULTS (Hilbert window LOCAL) ===")
-                    cols = ["ip","origin","cpu","ram","storage","gpu",
-                            "price_per_cpu","price_per_ram","price_per_storage","price_per_gpu",
-                            "score_per_cpu","score_per_ram","score_per_storage","score_per_gpu"]
+    try:
+        for step, delta, pct, cand in steps:
+            print(f"\n[step {step}] Δ_raw={delta} (~{pct*100:.2f}% of span) -> window size={len(cand)}")
+            if not cand:
+                continue
+
+            local_names, remote_names = split(cand)
+            _print_names("• window local names", local_names)
+            _print_names("• window remote names", remote_names)
+
+            # B1) LOCAL first for this window
+            payload = local_hits[step] if step in local_hits else window_local(step, delta, pct, local_names)
+            if payload:
+                print("\n=== RESULTS (Hilbert window LOCAL) ===")
+                print(pd.DataFrame(payload["results"]).set_index("name")[cols].to_string())
+                return payload
+
+            # B2) REMOTE via CH for this window
+            if remote_names:
+                answer = ch_answers.get(tuple(remote_names))
+                remote_table = answer.result() if answer else ask_window(remote_names)
+                payload = window_remote(step, delta, pct, remote_table)
+                if payload:
+                    print("\n=== RESULTS (Hilbert window REMOTE via CH) ===")
                     print(pd.DataFrame(payload["results"]).set_index("name")[cols].to_string())
                     return payload
 
-        # B2) REMOTE via CH for this window
-        if remote_names:
-            remote_view = ask_cluster_head_for_remote(
-                args.min_cpu, args.min_ram, args.min_storage, args.min_gpu,
-                wanted_names=remote_names, rpc_addr=args.rpc_addr, timeout_s=args.timeout_s,
-                budget_cpu=b_cpu, budget_ram=b_ram, budget_storage=b_sto, budget_gpu=b_gpu,
-                min_sc_cpu=sc_cpu, min_sc_ram=sc_ram, min_sc_storage=sc_sto, min_sc_gpu=sc_gpu
-            )
-            if not remote_view.empty:
-                remote_view["origin"] = "wan"
-                remote_view = drop_nan_members(remote_view)
-                remote_pass = filter_by_resources(
-                    remote_view, args.min_cpu, args.min_ram, args.min_storage, args.min_gpu,
-                    b_cpu, b_ram, b_sto, b_gpu, sc_cpu, sc_ram, sc_sto, sc_gpu
-                )
-                if not remote_pass.empty:
-                    out = sort_candidates(remote_pass, args.sort) if args.sort != "none" else remote_pass
-                    if args.limit > 0:
-                        out = out.head(args.limit)
-                    out = drop_nan_members(out)
-                    if not out.empty:
-                        payload = {
-                            "query": q,
-                            "scope": "hilbert-remote",
-                            "step": step,
-                            "delta_raw": int(delta),
-                            "delta_pct_of_span": pct,
-                            "results": out.to_dict(orient="records"),
-                        }
-                        print("\n=== RESULTS (Hilbert window REMOTE via CH) ===")
-                        cols = ["ip","origin","cpu","ram","storage","gpu",
-                                "price_per_cpu","price_per_ram","price_per_storage","price_per_gpu",
-                                "score_per_cpu","score_per_ram","score_per_storage","score_per_gpu"]
-                        print(pd.DataFrame(payload["results"]).set_index("name")[cols].to_string())
-                        return payload
-
-        print("• no passing nodes in this window; widening…")
+            print("• no passing nodes in this window; widening…")
+    finally:
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
 
     payload = {"query": q, "scope": "none", "results": []}
     print("\n=== RESULTS ===\n(no matches after all steps)")
     return payload
 
+# --------------------------- Server mode (--serve) ------------------------
+class DiscoveryService:
+    """
+    Answers run_once for any node and filter overrides per request, on the
+    geometry and LAN member snapshot the main thread keeps current. Identical
+    queries that arrive while one is running share its result.
+    """
+    INT_PARAMS = ("min_cpu", "min_storage", "min_gpu", "limit", "max_steps")
+    FLOAT_PARAMS = ("min_ram", "budget_per_cpu", "budget_per_ram", "budget_per_storage", "budget_per_gpu",
+                    "min_score_per_cpu", "min_score_per_ram", "min_score_per_storage", "min_score_per_gpu",
+                    "rtt_threshold_ms", "pct_start")
+    SORT_KEYS = ("none", "cpu", "ram", "storage", "gpu",
+                 "price_per_cpu", "price_per_ram", "price_per_storage", "price_per_gpu",
+                 "score_per_cpu", "score_per_ram", "score_per_storage", "score_per_gpu")
+
+    def __init__(self, args, geom: dict, ch_cache: Optional[ChAnswerCache]):
+        self.args = args
+        self.geom = geom
+        self.ch_cache = ch_cache
+        self.lan_df = pd.DataFrame(columns=LAN_COLS)
+        self.inflight: Dict[tuple, Future] = {}
+        self.lock = threading.Lock()
+
+    def refresh_members(self):
+        df = get_lan_members(self.args.rpc_addr, self.args.members_url)
+        if not df.empty or self.lan_df.empty:
+            self.lan_df = df
+
+    def parse(self, qs: dict):
+        """(node, {arg: value}) from the query string; ValueError on bad input."""
+        node = (qs.get("node") or [""])[0]
+        if not node:
+            raise ValueError("missing ?node=")
+        overrides = {}
+        for key in self.INT_PARAMS + self.FLOAT_PARAMS:
+            if key in qs:
+                value = float(qs[key][0])
+                if not math.isfinite(value):
+                    raise ValueError(f"{key} must be a finite number")
+                overrides[key] = int(value) if key in self.INT_PARAMS else value
+        if "sort" in qs:
+            if qs["sort"][0] not in self.SORT_KEYS:
+                raise ValueError(f"sort must be one of {', '.join(self.SORT_KEYS)}")
+            overrides["sort"] = qs["sort"][0]
+        return node, overrides
+
+    def discover(self, qs: dict):
+        """(http status, body) for one GET /discover request."""
+        try:
+            node, overrides = self.parse(qs)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        H, rtt_index = self.geom["H"], self.geom["rtt_index"]
+        if node not in H.idx:
+            return 404, {"error": f"node {node} not in geometry"}
+
+        key = (node, tuple(sorted(overrides.items())))
+        with self.lock:
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+        if not owner:
+            try:
+                return 200, dict(future.result(), coalesced=True)
+            except Exception as e:
+                return 500, {"error": str(e)}
+        try:
+            args = argparse.Namespace(**dict(vars(self.args), **overrides))
+            payload = run_once(node, args, H, rtt_index, self.ch_cache, lan_df=self.lan_df)
+            future.set_result(payload)
+            return 200, payload
+        except Exception as e:
+            future.set_exception(e)
+            return 500, {"error": str(e)}
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+
 # ---------------------------------- Main ----------------------------------
-def main():
+def build_arg_parser() -> argparse.ArgumentParser:
     ap = argparse.ArgumentParser(
         description="RTT-first, then raw-Hilbert widening. Local checked first, remote via CH only if locals fail. No merging."
     )
     ap.add_argument("--geom-url", required=True, help="HTTP /cluster-status (name, coordinate.Vec, rtts)")
+    ap.add_argument("--geom-refresh-secs", type=float, default=0.0, help="Re-read --geom-url before a cycle once this many seconds passed (0 = load once)")
     ap.add_argument("--rtt-threshold-ms", type=float, required=True, help="RTT cutoff for Phase A")
+    ap.add_argument("--rtt-index-path", default="", help="Directory (e.g. /dev/shm/serf_rtt_index) where the RTT index is memory-mapped and shared by discovery processes on this host")
 
     # Serf / CH
     ap.add_argument("--rpc-addr", default=DEFAULT_SERF_RPC, help="Serf RPC address (for serf members and CH query)")
     ap.add_argument("--timeout-s", type=int, default=DEFAULT_TIMEOUT_S, help="timeout for CH query")
+    ap.add_argument("--ch-cache-ttl-s", type=float, default=0.0, help="Reuse CH answers per node and filter set (0 = ask every time); the starting TTL, later half of each node's observed tag-update interval")
+    ap.add_argument("--members-url", default="", help="Optional: http://127.0.0.1:4043/members (members_cache.py). Falls back to ./serf members if unreachable.")
 
     # Δ widening config (Hilbert Phase)
+    ap.add_argument("--index-backend", choices=sorted(INDEX_BACKENDS), default="hilbert",
+                    help="hilbert: windows on the Hilbert key; kdtree: exact radius windows on coordinate distance (pct of span)")
+    ap.add_argument("--hilbert-curves", type=int, default=1,
+                    help="hilbert backend: union windows over N curves (N-1 randomly rotated) to cut widening steps")
     ap.add_argument("--pct-start", type=float, default=0.02, help="initial Δ as fraction of span (e.g., 0.02 = 2%)")
     ap.add_argument("--max-steps", type=int, default=6, help="number of doublings (pct, 2*pct, ...)")
+    ap.add_argument("--speculative", type=int, default=0, help="CH queries for later windows in flight at once (0 = one window at a time)")
 
     # Resource thresholds
     ap.add_argument("--min-cpu", type=int, default=0)
@@ -757,43 +1773,124 @@ def main():
     ap.add_argument("--http-port", type=int, default=4041)
     ap.add_argument("--http-path", default="/hilbert-output")
     ap.add_argument("--buyer-url", default="", help="Optional: http://HOST:PORT/buyer. If set, overrides min-*, budget-per-*, and min-score-per-* from the latest buyer request.")
+    ap.add_argument("--buyer-push", action="store_true", help=f"Accept buyer documents at POST {BUYER_PUSH_PATH} on the HTTP server; a push starts the next cycle at once")
     ap.add_argument("--loop", action="store_true", help="Re-run discovery forever with a fixed sleep")
+    ap.add_argument("--serve", action="store_true", help=f"Server mode: answer GET {DISCOVER_PATH}?node=...&min_cpu=... per request (no loop)")
+    ap.add_argument("--max-ch-queries", type=int, default=4, help="Server mode: CH queries in flight at once across all requests")
+    ap.add_argument("--members-refresh-s", type=float, default=5.0, help="Server mode: how often the LAN member snapshot is re-read")
     ap.add_argument("--busy-secs", type=float, default=30.0, help="Fixed seconds to keep serving last results before re-running")
+    return ap
 
+def main():
+    ap = build_arg_parser()
     args = ap.parse_args()
 
     query_node = _node_name_from_nodejson_or_hostname()
 
-    # ---------- Load geometry ONCE ----------
+    # ---------- Load geometry (refreshed every --geom-refresh-secs) ----------
     try:
-        nodes = load_geometry(args.geom_url, timeout=8)
+        nodes, geom_etag = fetch_geometry(args.geom_url, timeout=8)
     except Exception as e:
         raise SystemExit(f"[geom] failed to load geometry from {args.geom_url}: {e}")
-    H = HilbertIndex(nodes, p_bits=NET_P_BITS)
-    if query_node not in H.idx:
+    H = make_spatial_index(nodes, args.index_backend, args.hilbert_curves)
+    if query_node not in H.idx and not args.serve:
         raise SystemExit(f"query node {query_node} not found in geometry ({args.geom_url})")
+    # Readers take geom["H"] / geom["rtt_index"] once; server mode swaps in updated copies
     rtts = extract_rtts(nodes)
-    # ----------------------------------------
+    geom = {"H": H, "rtts": rtts, "rtt_index": make_rtt_index(rtts, args.rtt_index_path),
+            "etag": geom_etag, "loaded": time.monotonic(), "version": 0}
+
+    def refresh_geometry():
+        if args.geom_refresh_secs <= 0 or time.monotonic() - geom["loaded"] < args.geom_refresh_secs:
+            return
+        geom["loaded"] = time.monotonic()
+        try:
+            fresh, geom["etag"] = fetch_geometry(args.geom_url, geom["etag"], timeout=8)
+        except Exception as e:
+            print(f"[geom] refresh failed ({e}); keeping the previous geometry")
+            return
+        if fresh is None:
+            print("[geom] unchanged (304)")
+            return
+        H, rtts = (geom["H"].clone(), dict(geom["rtts"])) if args.serve else (geom["H"], geom["rtts"])
+        stats = H.update(fresh)
+        changed_rtts = update_rtts(rtts, fresh)
+        geom.update(H=H, rtts=rtts, version=geom["version"] + 1)
+        if changed_rtts:
+            geom["rtt_index"] = make_rtt_index(rtts, args.rtt_index_path)
+        how = "full rebuild" if stats["rebuilt"] else \
+            f"{stats['moved']} moved, {stats['rekeyed']} re-keyed"
+        print(f"[geom] refreshed: {how}; {changed_rtts} RTT maps changed")
+        if query_node not in H.idx and not args.serve:
+            print(f"[warn] query node {query_node} is no longer in the geometry")
+    # -------------------------------------------------------------------------
+
+    ch_cache = ChAnswerCache(args.ch_cache_ttl_s) if args.ch_cache_ttl_s > 0 else None
 
     # live HTTP server
-    state = {"payload": {"scope": "none", "results": []}, "lock": threading.Lock()}
-    if args.http_serve:
-        start_live_http_server(state, args.http_host, args.http_port, args.http_path)
+    state = new_result_state()
+    service = None
+    if args.serve:
+        _ch_slots["sem"] = threading.BoundedSemaphore(max(1, args.max_ch_queries))
+        service = DiscoveryService(args, geom, ch_cache)
+        service.refresh_members()
+    # --buyer-push: the newest pushed buyer document, applied at the next cycle, which it starts early
+    pushed = {"doc": None, "lock": threading.Lock(), "wake": threading.Event()}
+
+    def on_buyer(doc):
+        with pushed["lock"]:
+            pushed["doc"] = doc
+        pushed["wake"].set()
+
+    if args.http_serve or args.serve:
+        start_live_http_server(state, args.http_host, args.http_port, args.http_path,
+                               discover=service.discover if service else None,
+                               on_buyer=on_buyer if args.buyer_push else None)
+
+    last = {"key": None, "at": 0.0, "payload": None, "ch_names": []}
 
     def do_cycle():
-        if args.buyer_url:
+        refresh_geometry()
+        with pushed["lock"]:
+            doc, pushed["doc"] = pushed["doc"], None
+        if doc is not None:
+            apply_buyer_overrides(args, ap, buyer=doc)
+        elif args.buyer_url:
             apply_buyer_overrides(args, ap)
-        payload = run_once(query_node, args, H, rtts)
-        with state["lock"]:
-            state["payload"] = payload
+        # Skip the run when filters, LAN members and geometry are all as last time;
+        # results that came from a CH are only reused while the CH cache TTL of the
+        # remote names they were built from holds them
+        lan_df = get_lan_members(args.rpc_addr, args.members_url)
+        filters = tuple(getattr(args, f) for f in DiscoveryService.INT_PARAMS + DiscoveryService.FLOAT_PARAMS)
+        key = (filters, args.sort, geom["version"], members_digest(lan_df))
+        prev = last["payload"]
+        if prev is not None and key == last["key"] and not lan_df.empty and (
+                prev.get("scope") in ("rtt-local", "hilbert-local")
+                or (ch_cache is not None and time.monotonic() - last["at"] < ch_cache.ttl(last["ch_names"]))):
+            print("[cycle] buyer constraints, members and geometry unchanged; keeping the last result")
+            return prev
+        started = time.monotonic()
+        payload = run_once(query_node, args, geom["H"], geom["rtt_index"], ch_cache, lan_df=lan_df)
+        ch_names = ch_cache.depends_on(started) if ch_cache is not None else []
+        last.update(key=key, at=time.monotonic(), payload=payload, ch_names=ch_names)
+        publish_payload(state, payload)
         return payload
 
     try:
-        if args.loop:
+        if args.serve:
+            print(f"[serve] answering {DISCOVER_PATH}?node=... ; members refreshed every {args.members_refresh_s}s, "
+                  f"at most {args.max_ch_queries} CH queries at once")
+            while True:
+                time.sleep(max(0.1, float(args.members_refresh_s)))
+                refresh_geometry()
+                service.refresh_members()
+        elif args.loop:
             print(f"[loop] fixed sleep {args.busy_secs}s; endpoint (if enabled) serves the latest results between cycles.")
             while True:
                 do_cycle()
-                time.sleep(max(0.0, float(args.busy_secs)))
+                if pushed["wake"].wait(max(0.0, float(args.busy_secs))):
+                    print("[loop] buyer push received; running now")
+                pushed["wake"].clear()
         else:
             payload = do_cycle()
             if not args.http_serve:
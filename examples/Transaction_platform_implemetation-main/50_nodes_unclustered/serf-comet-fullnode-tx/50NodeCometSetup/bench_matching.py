@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark for matching_engine.clear: one clearing round of synthetic buyer bids
+against synthetic seller offers, compared with a pure-Python scan of the same
+matching rule and with the previous lookup (doubling chunk scan, no capacity
+index), plus how many buyers would have picked the same seller on their own.
+
+Bid profiles:
+    ram     small CPU/storage demands, price caps on RAM (most bids fit a cheap offer)
+    tight   large CPU, storage and GPU demands that few offers meet at any price
+
+    python3 bench_matching.py --buyers 1000 --offers 10000 --repeat 5 --profiles ram tight
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+import numpy as np
+
+import matching_engine
+
+
+def synthetic_offers(n, seed=7):
+    rnd = random.Random(seed)
+    return [{"name": f"clab-century-serf{i}", "ip": f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+             "cpu": rnd.choice([1, 2, 4, 8, 16]), "ram": rnd.choice([1.0, 2.0, 4.0, 8.0, 16.0]),
+             "storage": rnd.choice([10, 50, 100, 500]), "gpu": rnd.choice([0, 0, 0, 1, 2]),
+             "price_per_ram": round(rnd.uniform(0.5, 5), 2)} for i in range(n)]
+
+
+def synthetic_bids(n, seed=11, profile="ram"):
+    rnd = random.Random(seed)
+    if profile == "tight":
+        return [{"buyer": f"buyer{i}", "cpu": rnd.choice([8, 16]), "ram": rnd.choice([1.0, 2.0]),
+                 "storage": rnd.choice([100, 500]), "gpu": rnd.choice([1, 2]),
+                 "max_price": rnd.choice([0, 3.0, 4.0, 5.0])} for i in range(n)]
+    return [{"buyer": f"buyer{i}", "cpu": rnd.choice([1, 2, 4]), "ram": rnd.choice([1.0, 2.0, 4.0]),
+             "storage": rnd.choice([10, 50]), "gpu": rnd.choice([0, 0, 0, 0, 1]),
+             "max_price": rnd.choice([0, 2.0, 3.0, 4.0])} for i in range(n)]
+
+
+class ChunkScanBook(matching_engine.OrderBook):
+    """The previous lookup: the cheapest 256 offers, then chunks doubling in size, no capacity index."""
+
+    def best_offer(self, demand, max_price):
+        hi = len(self.price) if max_price <= 0 else int(np.searchsorted(self.price, max_price, side="right"))
+        lo, chunk = 0, 256
+        while lo < hi:
+            end = min(hi, lo + chunk)
+            fits = np.flatnonzero((self.capacity[lo:end] >= demand).all(axis=1))
+            if fits.size:
+                return lo + int(fits[0])
+            lo, chunk = end, chunk * 2
+        return -1
+
+    def take(self, i, demand):
+        self.capacity[i] -= demand
+
+
+def clear_with(book_cls, bids, offers):
+    saved, matching_engine.OrderBook = matching_engine.OrderBook, book_cls
+    try:
+        return matching_engine.clear(bids, offers)
+    finally:
+        matching_engine.OrderBook = saved
+
+
+def reference_clear(bids, offers):
+    """Same rule as matching_engine.clear, one dict at a time."""
+    book = sorted((o for o in offers if o.get("name")), key=lambda o: o["price_per_ram"])
+    left = [{r: float(o[r]) for r in matching_engine.RESOURCES} for o in book]
+    order = sorted(range(len(bids)), key=lambda i: (-(bids[i]["max_price"] or float("inf")), i))
+    out = [None] * len(bids)
+    for i in order:
+        bid, match = bids[i], None
+        for j, o in enumerate(book):
+            if bid["max_price"] and o["price_per_ram"] > bid["max_price"]:
+                break
+            if all(left[j][r] >= bid[r] for r in matching_engine.RESOURCES):
+                match = j
+                break
+        if match is not None:
+            for r in matching_engine.RESOURCES:
+                left[match][r] -= bid[r]
+        out[i] = book[match]["name"] if match is not None else None
+    return out
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - t0) / repeat * 1000, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--buyers", type=int, default=1000)
+    ap.add_argument("--offers", type=int, default=10000)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--profiles", nargs="+", choices=["ram", "tight"], default=["ram", "tight"])
+    args = ap.parse_args()
+
+    offers = synthetic_offers(args.offers)
+    for profile in args.profiles:
+        bids = synthetic_bids(args.buyers, profile=profile)
+        clear_ms, results = timed(lambda: matching_engine.clear(bids, offers), args.repeat)
+        scan_ms, scanned = timed(lambda: clear_with(ChunkScanBook, bids, offers), args.repeat)
+        ref_ms, ref = timed(lambda: reference_clear(bids, offers), 1)
+        names = [offer["name"] if offer else None for _, offer, _ in results]
+
+        matched = sum(n is not None for n in names)
+        cheapest = min(offers, key=lambda o: o["price_per_ram"])["name"]
+        busiest = Counter(n for n in names if n).most_common(1)
+        print(f"{args.buyers} bids ({profile}) x {args.offers} offers")
+        print(f"  clear (capacity index) {clear_ms:9.1f} ms   matched {matched}/{len(bids)}")
+        print(f"  clear (chunk scan)     {scan_ms:9.1f} ms   same matches: "
+              f"{[o['name'] if o else None for _, o, _ in scanned] == names}")
+        print(f"  clear (python scan)    {ref_ms:9.1f} ms   same matches: {names == ref}")
+        print(f"  most buyers on one seller: {busiest[0][1] if busiest else 0} "
+              f"(independent choice would send all {len(bids)} to {cheapest})")
+
+
+if __name__ == "__main__":
+    main()
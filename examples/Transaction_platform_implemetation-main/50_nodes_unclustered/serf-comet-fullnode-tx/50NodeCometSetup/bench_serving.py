@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Request-throughput benchmark for the Flask APIs under different servers.
+
+Starts the app once per mode, drives it with client processes for a fixed time
+and reports requests/s and latency percentiles. Modes:
+    flask-debug   the old app.run(debug=True) (reloader off)
+    flask         Flask server, threaded, debug off
+    waitress      serving.serve(...) with one process
+    gunicorn:N    serving.serve(...) with N pre-fork workers (state in Redis)
+
+    python3 bench_serving.py --app tx_api:app --path /tx/unknown --modes flask-debug waitress gunicorn:4
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from multiprocessing import Pool
+
+SERVER_SNIPPETS = {
+    "flask-debug": "import {module} as m; m.{attr}.run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)",
+    "flask": "import serving, {module} as m; serving.serve(m.{attr}, '127.0.0.1', {port}, workers=1, server='flask', "
+             "on_worker_start=getattr(m, 'start_background', None))",
+    "waitress": "import serving, {module} as m; serving.serve(m.{attr}, '127.0.0.1', {port}, workers=1, server='waitress', "
+                "on_worker_start=getattr(m, 'start_background', None))",
+    "gunicorn": "import serving, {module} as m; serving.serve(m.{attr}, '127.0.0.1', {port}, workers={workers}, "
+                "server='gunicorn', on_worker_start=getattr(m, 'start_background', None))",
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app_spec, mode, threads):
+    module, attr = app_spec.split(":")
+    name, _, workers = mode.partition(":")
+    workers = int(workers or 1)
+    port = free_port()
+    code = SERVER_SNIPPETS[name].format(module=module, attr=attr, port=port, workers=workers)
+    env = dict(os.environ, API_WORKERS=str(workers), API_THREADS=str(threads))
+    proc = subprocess.Popen([sys.executable, "-c", code], env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            time.sleep(0.5 if name == "gunicorn" else 0.1)  # let every worker boot
+            return proc, port
+        except OSError:
+            time.sleep(0.1)
+    stop_server(proc)
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def stop_server(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+def client(job):
+    url, seconds = job
+    latencies, errors = [], 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=10) as resp:
+                resp.read()
+        except urllib.error.HTTPError as e:
+            e.read()
+        except OSError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+    return latencies, errors
+
+
+def run_load(url, clients, seconds):
+    with Pool(clients) as pool:
+        results = pool.map(client, [(url, seconds)] * clients)
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    return latencies, errors
+
+
+def pct(values, p):
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000 if values else float("nan")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--app", default="tx_api:app", help="module:attribute of the Flask app")
+    ap.add_argument("--path", default="/tx/unknown", help="GET path to request")
+    ap.add_argument("--modes", nargs="+", default=["flask-debug", "flask", "waitress", "gunicorn:4"])
+    ap.add_argument("--threads", type=int, default=8, help="threads per server process")
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    args = ap.parse_args()
+
+    print(f"{'mode':>12} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode in args.modes:
+        proc, port = start_server(args.app, mode, args.threads)
+        try:
+            latencies, errors = run_load(f"http://127.0.0.1:{port}{args.path}", args.clients, args.seconds)
+        finally:
+            stop_server(proc)
+        print(f"{mode:>12} {len(latencies) / args.seconds:>9.0f} {pct(latencies, 50):>8.2f} "
+              f"{pct(latencies, 99):>8.2f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark for seller_ranking: column load + weighted top-k over synthetic Hilbert results,
+checked against the original per-row "lowest price_per_ram" scan.
+
+    python3 bench_seller_ranking.py --n 1000 5000 20000 --repeat 200
+"""
+import argparse
+import random
+import time
+
+import seller_ranking
+
+
+def synthetic_results(n, seed=7):
+    rnd = random.Random(seed)
+    results = []
+    for i in range(n):
+        results.append({
+            "name": f"clab-century-serf{i}", "ip": f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+            "cpu": rnd.choice([1, 2, 4, 8, 16]), "ram": rnd.choice([1.0, 2.0, 4.0, 8.0, 16.0]),
+            "storage": rnd.choice([10, 50, 100, 500]), "gpu": rnd.choice([0, 0, 0, 1, 2]),
+            "price_per_cpu": round(rnd.uniform(0.5, 5), 2), "price_per_ram": round(rnd.uniform(0.5, 5), 2),
+            "price_per_storage": round(rnd.uniform(0.01, 0.5), 3), "price_per_gpu": round(rnd.uniform(2, 20), 2),
+            "score_per_cpu": round(rnd.uniform(0, 2), 2), "score_per_ram": round(rnd.uniform(0, 2), 2),
+            "score_per_storage": round(rnd.uniform(0, 2), 2), "score_per_gpu": round(rnd.uniform(0, 2), 2),
+        })
+    return results
+
+
+def reference_lowest_price_per_ram(results):
+    best, lowest = None, float("inf")
+    for node in results:
+        price = node.get("price_per_ram")
+        if node.get("name") and price is not None and price < lowest:
+            lowest, best = price, node["name"]
+    return best
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - t0) / repeat * 1e6, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, nargs="+", default=[1000, 5000, 20000])
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    weights = {"price_per_cpu": 1.0, "price_per_ram": 1.0, "price_per_storage": 0.2, "price_per_gpu": 0.1,
+               "score_per_cpu": 0.5, "score_per_ram": 0.5}
+    constraints = {"min_cpu": 2, "min_ram": 2, "max_price_per_ram": 4.0}
+    print(f"{'n':>7} {'load us':>10} {'rank us':>10} {'python scan us':>15}  match")
+    for n in args.n:
+        results = synthetic_results(n)
+        load_us, table = timed(lambda: seller_ranking.CandidateTable(results), max(1, args.repeat // 10))
+        rank_us, _ = timed(lambda: seller_ranking.top_k(table, weights, constraints, k=args.k), args.repeat)
+        scan_us, ref = timed(lambda: reference_lowest_price_per_ram(results), max(1, args.repeat // 10))
+        best = seller_ranking.top_k(table, {"price_per_ram": 1.0}, k=1)
+        print(f"{n:>7} {load_us:>10.1f} {rank_us:>10.1f} {scan_us:>15.1f}  {table.names[best[0]] == ref}")
+
+
+if __name__ == "__main__":
+    main()
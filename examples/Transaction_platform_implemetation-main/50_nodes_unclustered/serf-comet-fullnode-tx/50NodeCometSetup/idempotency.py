@@ -0,0 +1,111 @@
+import hashlib
+import heapq
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# How long a client-supplied key maps to its first result
+KEY_TTL_SECONDS = 600
+# Without a key, identical request bodies are only merged for this long, so a
+# deliberate repeat of the same order later on still goes through
+BODY_TTL_SECONDS = 60
+# How often a worker re-checks a key another worker process is still handling
+REMOTE_POLL_SECONDS = 0.05
+
+
+def request_key(scope, headers, body):
+    """
+    Cache key and TTL for a request: the Idempotency-Key header if present, else
+    the sha256 of the canonical JSON body (sorted keys, no whitespace).
+    """
+    key = headers.get(IDEMPOTENCY_HEADER)
+    if key:
+        return f"{scope}:key:{key}", KEY_TTL_SECONDS
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return f"{scope}:body:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}", BODY_TTL_SECONDS
+
+
+class IdempotencyCache:
+    """
+    Maps idempotency keys to the (body, status_code) result of their first request.
+    The first request for a key runs `fn`; repeats within the TTL, including ones
+    arriving while `fn` is still running, get that same result instead of running it again.
+    Errors and non-2xx results are not kept, so the client can retry them.
+    With a shared `store` (state_store.RedisStore) the same holds across worker processes.
+    """
+
+    def __init__(self, wait_timeout=30.0, store=None):
+        self.wait_timeout = wait_timeout
+        self.store = store
+        self.entries = {}  # key -> (future, expires_at)
+        self.expiry = []  # heap of (expires_at, key)
+        self.lock = threading.Lock()
+
+    def _prune(self, now):
+        while self.expiry and self.expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self.expiry)
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] == expires_at:
+                del self.entries[key]
+
+    def _drop(self, key, future):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is future:
+                del self.entries[key]
+
+    def run(self, key, ttl, fn):
+        """Returns (result, replayed); replayed is True if the result came from an earlier request."""
+        now = time.monotonic()
+        with self.lock:
+            self._prune(now)
+            entry = self.entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = (Future(), now + ttl)
+                self.entries[key] = entry
+                heapq.heappush(self.expiry, (entry[1], key))
+        future = entry[0]
+        if not owner:
+            return future.result(timeout=self.wait_timeout), True
+
+        try:
+            result, replayed = self._run_shared(key, ttl, fn)
+        except BaseException as e:
+            self._drop(key, future)
+            future.set_exception(e)
+            raise
+        if not 200 <= result[1] < 300:
+            self._drop(key, future)
+        future.set_result(result)
+        return result, replayed
+
+    def _run_shared(self, key, ttl, fn):
+        """Runs fn in this process unless another worker already owns the key in the shared store."""
+        if self.store is None:
+            return fn(), False
+        deadline = time.monotonic() + self.wait_timeout
+        while not self.store.claim(key, ttl):
+            exists, value = self.store.get_value(key)
+            if value is not None:
+                return (value[0], value[1]), True
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Request {key} is still being handled by another worker")
+            if exists:
+                time.sleep(REMOTE_POLL_SECONDS)
+        try:
+            result = fn()
+        except BaseException:
+            self.store.release(key)
+            raise
+        if 200 <= result[1] < 300:
+            self.store.set_value(key, list(result), ttl)
+        else:
+            self.store.release(key)
+        return result, False
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
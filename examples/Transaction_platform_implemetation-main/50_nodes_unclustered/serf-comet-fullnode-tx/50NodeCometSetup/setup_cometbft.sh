@@ -70,11 +70,14 @@ setup_multinodes_cometbft() {
     
     # Install Python
     echo "Installing Python..."
-    docker exec "$container" bash -c "DEBIAN_FRONTEND=noninteractive apt update && apt upgrade -y && apt install -y python3 python3-pip && pip3 install --no-cache-dir flask requests redis"
+    docker exec "$container" bash -c "DEBIAN_FRONTEND=noninteractive apt update && apt upgrade -y && apt install -y python3 python3-pip && pip3 install --no-cache-dir flask requests redis numpy waitress gunicorn"
     pVersion=$(docker exec "$container" python3 --version)
     echo "$pVersion installation complete."
     echo "Copying Serf Client and Cometbft client..."
     docker cp "./cometclient/main.py" "$container":/root/ || { echo "Failed to copy main.py file to $container"; exit 1; }
+    docker cp "./cometclient/seller_ranking.py" "$container":/root/ || { echo "Failed to copy seller_ranking.py file to $container"; exit 1; }
+    docker cp "./comet_health.py" "$container":/root/ || { echo "Failed to copy comet_health.py file to $container"; exit 1; }
+    docker cp "./commit_tracker.py" "$container":/root/ || { echo "Failed to copy commit_tracker.py file to $container"; exit 1; }
 
     echo "Cometbft setup in $container is complete."
     
@@ -7,9 +7,19 @@ import datetime
 import urllib.parse
 import redis
 import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from commit_tracker import CommitTracker, is_committed_ok
+from comet_health import CometHealthMonitor, CometNotReadyError
+from matching_engine import BatchAuction, bid_error, bid_from_buyer_request
+from idempotency import IdempotencyCache, request_key
+from state_store import make_store
+from serving import API_WORKERS, serve
 
 COMETBFT_RPC_URL = "http://127.0.0.1:26657"
 SERF_URL = "http://127.0.0.1:5555"
+# Seller offers for the batch auction (same source the buyer client ranks)
+HILBERT_URL = "http://127.0.0.1:4041/hilbert-output"
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -17,11 +27,19 @@ rd = redis.Redis(host='localhost', port=6379, decode_responses=True)
 channel = "liqo:initiate"
 BUYER_NODE_JSON = "/opt/serfapp/node.json"
 buyer_ip = None
+TX_SUBMIT_WORKERS = 4
+TX_RECORD_TTL_SECONDS = 600
+TX_MAX_WAIT_SECONDS = 30
+# Bids received within one interval are matched together against the order book
+AUCTION_CLEARING_SECONDS = 2.0
 app = Flask(__name__)
 
-
-class CometNotReadyError(Exception):
-    pass
+# tx/bid status records and idempotency keys; in Redis when several worker processes serve the API
+store = make_store(API_WORKERS)
+submit_pool = ThreadPoolExecutor(max_workers=TX_SUBMIT_WORKERS, thread_name_prefix="tx-submit")
+tracker = CommitTracker(COMETBFT_RPC_URL)
+health = CometHealthMonitor(COMETBFT_RPC_URL)
+idempotency = IdempotencyCache(store=store if API_WORKERS > 1 else None)
 
 
 def create_transaction(buyer, seller_name, amount):
@@ -76,41 +94,8 @@ def publish_redis(buyer, b_ip, seller, seller_ip, cpu, ram, storage, gpu, amount
 
 
 def check_comet_status():
-    logger.info(f"Checking Cometbft Health {COMETBFT_RPC_URL}/health.....")
-    try:
-        response = requests.get(f"{COMETBFT_RPC_URL}/health", timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        if "result" in data and isinstance(data["result"], dict) and not data["result"]:
-            logger.info("CometBFT node is healthy")
-        elif "error" in data:
-            logger.error(f"CometBFT error: {data['error']}")
-        else:
-            logger.error(f"Unexpected response format: {data}")
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request failed: {e}")
-
-    logger.info(f"Checking Cometbft current status {COMETBFT_RPC_URL}/status....")
-    try:
-        response = requests.get(f"{COMETBFT_RPC_URL}/status", timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        sync_info = data.get("result", {}).get("sync_info", {})
-        catching_up = sync_info.get("catching_up")
-
-        if catching_up is True:
-            logger.error("⚠️  CometBFT node is still syncing blocks. Try after sometime....")
-            raise CometNotReadyError("CometBFT node is still syncing blocks. Try after sometime")
-        elif catching_up is False:
-            logger.info("✅  CometBFT node is fully synchronized and ready for transactions.")
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌  Request failed: {e}")
-        raise CometNotReadyError("Request failed")
-    return None
+    """Answers from the in-memory health snapshot; raises CometNotReadyError if not ready."""
+    health.require_ready()
 
 
 def dial_peers(peers: list[str], persistent: bool = False):
@@ -158,6 +143,7 @@ def get_nodeip_and_bftaddr(buyer: str):
 def broadcast_transaction(tx_json):
     """
     Encodes and broadcasts the transaction to the CometBFT node via JSON-RPC.
+    Returns (tx_hash, None) once CheckTx accepted it, else (None, reason).
     """
     try:
         # Step 1: Convert the JSON transaction to bytes, then Base64 encode it
@@ -175,30 +161,28 @@ def broadcast_transaction(tx_json):
         response.raise_for_status()  # Raise an exception for bad HTTP status (4xx or 5xx)
 
         response_json = response.json()
-        broadcast_tx_hash = response_json.get("result", {}).get("hash")
 
         if "result" in response_json:
             result = response_json["result"]
             if result.get("code") == 0:
                 logger.info("\nTransaction broadcast successful!")
                 logger.info(f"CometBFT Response: {result}")
-            else:
-                logger.info("\nTransaction was REJECTED by CheckTx.")
-                logger.info(f"CometBFT Response: {result}")
-        else:
-            logger.info(f"\nTransaction broadcast FAILED. Unexpected response:")
-            logger.info(response_json)
-
-        return broadcast_tx_hash
+                return result.get("hash"), None
+            logger.info("\nTransaction was REJECTED by CheckTx.")
+            logger.info(f"CometBFT Response: {result}")
+            return None, f"Rejected by CheckTx (code {result.get('code')}): {result.get('log') or 'no log'}"
+        logger.info(f"\nTransaction broadcast FAILED. Unexpected response:")
+        logger.info(response_json)
+        return None, f"Unexpected broadcast response: {response_json.get('error') or response_json}"
 
     except requests.exceptions.ConnectionError as e:
         logger.error(f"\nTransaction broadcast FAILED. Could not connect to CometBFT RPC.")
         logger.error(f"Error: {e}")
-        return None
+        return None, f"Error occurred during transaction broadcast: {e}"
     except Exception as e:
         logger.error(f"\nTransaction broadcast FAILED. An error occurred:")
         logger.error(f"Error: {e}")
-        return None
+        return None, f"Error occurred during transaction broadcast: {e}"
 
 
 def validate_transaction(tx_hash: str):
@@ -230,38 +214,126 @@ def validate_transaction(tx_hash: str):
         return None
 
 
+def update_tx_record(tx_id, **fields):
+    store.update("tx", tx_id, TX_RECORD_TTL_SECONDS, **fields)
+
+
+def on_commit(tx_id, order, future):
+    try:
+        tx_result = future.result()
+    except Exception as e:
+        logger.error(f"Transaction {tx_id} was not committed: {e}")
+        update_tx_record(tx_id, status="failed", message=str(e))
+        return
+    if is_committed_ok(tx_result):
+        publish_redis(order["buyer"], buyer_ip, order["seller"], order["seller_ip"],
+                      order["cpu"], order["ram"], order["storage"], order["gpu"], order["amount"])
+        update_tx_record(tx_id, status="committed", height=tx_result.get("height"), message=tx_result)
+    else:
+        update_tx_record(tx_id, status="failed", height=tx_result.get("height"), message=tx_result)
+
+
+def submit_transaction(tx_id, order):
+    try:
+        logger.info(f"Preparing payload for transaction..")
+        tx_payload = create_transaction(order["buyer"], order["seller"], order["amount"])
+        tx_hash, error = broadcast_transaction(tx_payload)
+        logger.info(f"Broadcast Hash received from cometbft: {tx_hash}")
+        if not tx_hash:
+            # CheckTx rejections fail here, with CometBFT's log, instead of timing out in the tracker
+            update_tx_record(tx_id, status="failed", message=error or "Error occurred during transaction broadcast")
+            return
+        update_tx_record(tx_id, status="broadcast", tx_hash=tx_hash)
+        # Resolve on the pool so a slow Redis publish never stalls the tracker thread
+        tracker.track(tx_hash).add_done_callback(lambda f: submit_pool.submit(on_commit, tx_id, order, f))
+    except Exception as ex:
+        logger.error(f"Unexpected error while submitting {tx_id}: {ex}")
+        update_tx_record(tx_id, status="failed", message="Internal server error")
+
+
+def enqueue_transaction(order):
+    tx_id = uuid.uuid4().hex
+    now = time.time()
+    store.put("tx", tx_id, {"tx_id": tx_id, "status": "pending", "tx_hash": None, "height": None,
+                            "message": None, "buyer": order["buyer"], "seller": order["seller"],
+                            "created": now, "updated": now}, TX_RECORD_TTL_SECONDS)
+    submit_pool.submit(submit_transaction, tx_id, order)
+    return tx_id
+
+
+def load_offers():
+    response = requests.get(HILBERT_URL, timeout=5)
+    response.raise_for_status()
+    return response.json().get("results", [])
+
+
+def on_auction_match(bid_id, bid, offer, amount):
+    order = {"buyer": bid["buyer"], "seller": offer["name"], "seller_ip": offer.get("ip"),
+             "cpu": bid.get("cpu"), "ram": bid.get("ram"), "storage": bid.get("storage"),
+             "gpu": bid.get("gpu"), "amount": amount}
+    logger.info(f"[Auction] bid {bid_id}: BUYER {order['buyer']} matched with SELLER {order['seller']} for {amount} tokens")
+    return enqueue_transaction(order)
+
+
+auction = BatchAuction(load_offers, on_auction_match, interval=AUCTION_CLEARING_SECONDS, store=store)
+
+
+def submit_bid(data):
+    """Queues a bid for the next clearing round; accepts flat fields or a buyer-agent /buyer document."""
+    if data.get("resources"):
+        bid = bid_from_buyer_request(data["buyer"], data)
+    else:
+        bid = {k: data.get(k) for k in ("buyer", "cpu", "ram", "storage", "gpu", "max_price")}
+    error = bid_error(bid)
+    if error:
+        logger.info(f"Invalid bid received: {error}")
+        return {"error": error}, 400
+    check_comet_status()
+    bid_id = auction.submit(bid)
+    return {"status": "accepted", "bid_id": bid_id, "status_url": f"/auction/bid/{bid_id}"}, 202
+
+
+def submit_order(data):
+    order = {k: data.get(k) for k in ("buyer", "seller", "seller_ip", "cpu", "ram", "storage", "gpu", "amount")}
+    logger.info(f"Received transaction request between BUYER: {order['buyer']} and SELLER: {order['seller']}")
+    check_comet_status()
+    tx_id = enqueue_transaction(order)
+    return {"status": "accepted", "tx_id": tx_id, "status_url": f"/tx/{tx_id}"}, 202
+
+
+def run_idempotent(scope, data, submit):
+    """
+    Runs submit(data) once per Idempotency-Key header (or identical body) and answers
+    repeats with the original ids plus the current record instead of submitting again.
+    """
+    key, ttl = request_key(scope, request.headers, data)
+    (body, code), replayed = idempotency.run(key, ttl, lambda: submit(data))
+    if not replayed:
+        return jsonify(body), code
+    if "tx_id" in body:
+        record = store.get("tx", body["tx_id"])
+    else:
+        record = auction.get(body["bid_id"])
+    logger.info(f"Repeated {scope} request answered from the idempotency cache: {body}")
+    response = jsonify(dict(body, record=record))
+    response.headers["Idempotent-Replayed"] = "true"
+    return response, code
+
+
 @app.route('/initiateTx', methods=['POST'])
 def get_transaction():
     try:
         data = request.get_json(silent=True)
-        if not data or not data.get("buyer") or not data.get("seller") or not data.get("seller_ip"):
+        if not data or not data.get("buyer"):
             logger.info(f"Invalid request received: {data}")
             return jsonify({"error": "Invalid request received"}), 400
-        buyer = data.get("buyer")
-        seller = data.get("seller")
-        seller_ip = data.get("seller_ip")
-        cpu = data.get("cpu")
-        ram = data.get("ram")
-        storage = data.get("storage")
-        gpu = data.get("gpu")
-        amount = data.get("amount")
-        logger.info(f"Received transaction request between BUYER: {buyer} and SELLER: {seller}")
-        check_comet_status()
-        logger.info(f"Preparing payload for transaction..")
-        tx_payload = create_transaction(buyer, seller, amount)
-        tx_hash = broadcast_transaction(tx_payload)
-        logger.info(f"Broadcast Hash received from cometbft: {tx_hash}")
-        if tx_hash:
-            logger.info("Validating broadcast status from cometbft in 2 sec...")
-            time.sleep(2)
-            tx_result = validate_transaction(tx_hash)
-            if tx_result and tx_result.get("result"):
-                publish_redis(buyer, buyer_ip, seller, seller_ip, cpu, ram, storage, gpu, amount)
-                return jsonify({"status": "success", "message": tx_result}), 200
-            else:
-                return jsonify({"status": "error", "message": tx_result}), 400
-        else:
-            return jsonify({"status": "error", "message": "Error occurred during transaction broadcast"}), 400
+        if not data.get("seller"):
+            # No seller chosen: let the batch auction pick one
+            return run_idempotent("bid", data, submit_bid)
+        if not data.get("seller_ip"):
+            logger.info(f"Invalid request received: {data}")
+            return jsonify({"error": "Invalid request received"}), 400
+        return run_idempotent("tx", data, submit_order)
     except CometNotReadyError as e:
         logger.error(str(e))
         return jsonify({"status": "error", "message": str(e)}), 503
@@ -270,13 +342,58 @@ def get_transaction():
         return jsonify({"status": "error", "message": "Internal server error"}), 500
 
 
+@app.route('/auction/bid', methods=['POST'])
+def post_bid():
+    try:
+        data = request.get_json(silent=True)
+        if not data or not data.get("buyer"):
+            logger.info(f"Invalid bid received: {data}")
+            return jsonify({"error": "Invalid request received"}), 400
+        return run_idempotent("bid", data, submit_bid)
+    except CometNotReadyError as e:
+        logger.error(str(e))
+        return jsonify({"status": "error", "message": str(e)}), 503
+    except Exception as ex:
+        logger.error(f"Unexpected error: {ex}")
+        return jsonify({"status": "error", "message": "Internal server error"}), 500
+
+
+@app.route('/auction/bid/<bid_id>', methods=['GET'])
+def get_bid_status(bid_id):
+    """Bid status: queued, matched (with tx_id, see /tx/<tx_id>), unmatched or failed."""
+    record = auction.get(bid_id)
+    if record is None:
+        return jsonify({"status": "error", "message": f"Unknown bid {bid_id}"}), 404
+    return jsonify(record), 200
+
+
+@app.route('/tx/<tx_id>', methods=['GET'])
+def get_transaction_status(tx_id):
+    """Transaction status; `?wait=N` long-polls up to N seconds for a final outcome."""
+    try:
+        wait = min(max(float(request.args.get("wait", 0)), 0.0), TX_MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    record = store.wait("tx", tx_id, lambda r: r["status"] in ("committed", "failed"), wait)
+    if record is None:
+        return jsonify({"status": "error", "message": f"Unknown transaction {tx_id}"}), 404
+    return jsonify(record), 200
+
+
+def start_background():
+    """Background threads of one serving process; never started from a request hook."""
+    tracker.start()
+    health.start()
+    auction.start()
+
+
 if __name__ == '__main__':
     try:
         node = get_node_name(BUYER_NODE_JSON)
-        # Important: Dial Peers to connect Peers
+        # Important: Dial Peers to connect Peers (once per host, before worker processes are forked)
         bftaddr, bip = get_nodeip_and_bftaddr(node)
         buyer_ip = bip
         dial_peers(peers=bftaddr, persistent=True)
-        app.run(debug=True, host='0.0.0.0', port=5005)
+        serve(app, '0.0.0.0', 5005, on_worker_start=start_background)
     except Exception as ex:
         logger.error(f"Unexpected error: {ex}")
\ No newline at end of file
@@ -4,55 +4,45 @@ import requests
 import time
 import base64
 import json
+import os
+import threading
+import uuid
+from comet_health import CometHealthMonitor, CometNotReadyError
+from commit_tracker import CommitTracker, is_committed_ok
+from idempotency import IdempotencyCache, request_key
+from state_store import MemoryStore, make_store
+from serving import API_WORKERS, serve
 
 COMETBFT_RPC_URL = "http://127.0.0.1:26657"
+VALIDATOR_TYPES = ("addval", "updval", "remval")
+# Requests received within one window are coalesced into one tx per type
+VALIDATOR_BATCH_WINDOW_SECONDS = 1.0
+# 3f+1 with f >= 1: the set must never shrink below this
+MIN_VALIDATORS = 4
+# Voting power changed by one batch must stay below this share of the current total
+MAX_POWER_CHANGE_FRACTION = 1 / 3
+VALIDATOR_RECORD_TTL_SECONDS = 600
+VALIDATOR_MAX_WAIT_SECONDS = 30
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 app = Flask(__name__)
-
-
-class CometNotReadyError(Exception):
-    pass
+health = CometHealthMonitor(COMETBFT_RPC_URL)
+tracker = CommitTracker(COMETBFT_RPC_URL)
+# Validator records, the batch queue and idempotency keys; in Redis when several worker processes serve the API
+store = make_store(API_WORKERS, prefix="validator_tx")
+idempotency = IdempotencyCache(store=store if API_WORKERS > 1 else None)
 
 def check_comet_status():
-    logger.info(f"Checking Cometbft Health {COMETBFT_RPC_URL}/health.....")
-    try:
-        response = requests.get(f"{COMETBFT_RPC_URL}/health", timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        if "result" in data and isinstance(data["result"], dict) and not data["result"]:
-            logger.info("CometBFT node is healthy")
-        elif "error" in data:
-            logger.error(f"CometBFT error: {data['error']}")
-        else:
-            logger.error(f"Unexpected response format: {data}")
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request failed: {e}")
-
-    logger.info(f"Checking Cometbft current status {COMETBFT_RPC_URL}/status....")
-    try:
-        response = requests.get(f"{COMETBFT_RPC_URL}/status", timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        sync_info = data.get("result", {}).get("sync_info", {})
-        catching_up = sync_info.get("catching_up")
-
-        if catching_up is True:
-            logger.error("⚠️  CometBFT node is still syncing blocks. Try after sometime....")
-            raise CometNotReadyError("CometBFT node is still syncing blocks. Try after sometime")
-        elif catching_up is False:
-            logger.info("✅  CometBFT node is fully synchronized and ready for transactions.")
+    """Answers from the in-memory health snapshot; raises CometNotReadyError if not ready."""
+    health.require_ready()
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌  Request failed: {e}")
-        raise CometNotReadyError("Request failed")
-    return None
 
 def broadcast_transaction(tx_json):
+    """
+    Encodes and broadcasts the transaction to the CometBFT node via JSON-RPC.
+    Returns (tx_hash, None) once CheckTx accepted it, else (None, reason).
+    """
     try:
         # Step 1: Convert the JSON transaction to bytes, then Base64 encode it
         tx_bytes = json.dumps(tx_json).encode('utf-8')
@@ -69,30 +59,28 @@ def broadcast_transaction(tx_json):
         response.raise_for_status()  # Raise an exception for bad HTTP status (4xx or 5xx)
 
         response_json = response.json()
-        broadcast_tx_hash = response_json.get("result", {}).get("hash")
 
         if "result" in response_json:
             result = response_json["result"]
             if result.get("code") == 0:
                 logger.info("\nTransaction broadcast successful!")
                 logger.info(f"CometBFT Response: {result}")
-            else:
-                logger.info("\nTransaction was REJECTED by CheckTx.")
-                logger.info(f"CometBFT Response: {result}")
-        else:
-            logger.info(f"\nTransaction broadcast FAILED. Unexpected response:")
-            logger.info(response_json)
-
-        return broadcast_tx_hash
+                return result.get("hash"), None
+            logger.info("\nTransaction was REJECTED by CheckTx.")
+            logger.info(f"CometBFT Response: {result}")
+            return None, f"Rejected by CheckTx (code {result.get('code')}): {result.get('log') or 'no log'}"
+        logger.info(f"\nTransaction broadcast FAILED. Unexpected response:")
+        logger.info(response_json)
+        return None, f"Unexpected broadcast response: {response_json.get('error') or response_json}"
 
     except requests.exceptions.ConnectionError as e:
         logger.error(f"\nTransaction broadcast FAILED. Could not connect to CometBFT RPC.")
         logger.error(f"Error: {e}")
-        return None
+        return None, f"Error occurred during transaction broadcast: {e}"
     except Exception as e:
         logger.error(f"\nTransaction broadcast FAILED. An error occurred:")
         logger.error(f"Error: {e}")
-        return None
+        return None, f"Error occurred during transaction broadcast: {e}"
 
 
 def validate_transaction(tx_hash: str):
@@ -124,6 +112,183 @@ def validate_transaction(tx_hash: str):
         return None
 
 
+def get_validator_set():
+    """Current validator set as {base64 pub key: voting power}, following /validators pagination."""
+    validators, page = {}, 1
+    while True:
+        response = requests.get(f"{COMETBFT_RPC_URL}/validators", params={"page": page, "per_page": 100}, timeout=5)
+        response.raise_for_status()
+        result = response.json().get("result") or {}
+        for v in result.get("validators") or []:
+            validators[v["pub_key"]["value"]] = int(v["voting_power"])
+        if not result.get("validators") or len(validators) >= int(result.get("total") or 0):
+            return validators
+        page += 1
+
+
+class ValidatorBatcher:
+    """
+    Coalesces validator updates over `window` seconds into one addval/updval/remval tx per type.
+
+    Each validator entry gets its own record (queued, broadcast, committed, failed or rejected).
+    Before broadcasting, entries are applied in arrival order to the current /validators set.
+    A removal (or power 0) that would leave fewer than MIN_VALIDATORS validators is rejected;
+    additions are never blocked. An entry that would take the window's voting power change to
+    MAX_POWER_CHANGE_FRACTION of the total waits for the next window; an entry bigger than that
+    budget on its own is sent alone, first in its window, with a warning. A pub key already
+    touched in a window waits for the next one, since ABCI applies only one update per validator
+    per block.
+    Queue and records live in `store` (state_store); with a shared store, only the worker
+    holding the "validators" lease flushes a window.
+    """
+
+    def __init__(self, window=VALIDATOR_BATCH_WINDOW_SECONDS, store=None):
+        self.window = window
+        self.store = store if store is not None else MemoryStore()
+        self.holder = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="ValidatorBatcher", daemon=True)
+                self.thread.start()
+        return self
+
+    def submit(self, vtype, entries):
+        now = time.time()
+        items = []
+        for entry in entries:
+            record_id = uuid.uuid4().hex
+            self.store.put("validator", record_id,
+                           {"id": record_id, "type": vtype, "pub_key_bytes": entry["pub_key_bytes"],
+                            "power": entry.get("power", 0), "status": "queued", "tx_hash": None,
+                            "height": None, "message": None, "created": now, "updated": now},
+                           VALIDATOR_RECORD_TTL_SECONDS)
+            items.append({"id": record_id, "type": vtype, "entry": entry})
+        self.store.push("validators", items)
+        self.start()
+        return [item["id"] for item in items]
+
+    def update(self, record_ids, **fields):
+        for record_id in record_ids:
+            self.store.update("validator", record_id, VALIDATOR_RECORD_TTL_SECONDS, **fields)
+
+    def wait(self, record_id, timeout):
+        """Record for `record_id`, waiting up to `timeout` seconds for a final status; None if unknown."""
+        return self.store.wait("validator", record_id,
+                               lambda r: r["status"] in ("committed", "failed", "rejected"), timeout)
+
+    def plan(self, batch, validators):
+        """Splits a window into ({type: [(record_id, entry)]}, deferred items, {record_id: rejection reason})."""
+        current = dict(validators)
+        total = sum(validators.values())
+        budget = total * MAX_POWER_CHANGE_FRACTION
+        changed = 0
+        groups, deferred, rejected, touched = {}, [], {}, set()
+        for item in batch:
+            record_id, vtype, entry = item["id"], item["type"], item["entry"]
+            key = entry["pub_key_bytes"]
+            if key in touched:
+                deferred.append(item)
+                continue
+            old = current.get(key, 0)
+            new = 0 if vtype == "remval" else int(entry.get("power", 0))
+            if vtype == "remval" and key not in current:
+                rejected[record_id] = "Not a current validator"
+                continue
+            if old and not new and len(current) - 1 < MIN_VALIDATORS:
+                rejected[record_id] = (f"Would leave {len(current) - 1} validators, "
+                                       f"at least {MIN_VALIDATORS} (3f+1) are required")
+                continue
+            delta = abs(new - old)
+            if total and changed + delta >= budget:
+                if changed:
+                    # Later updates of the same key must not overtake this one
+                    touched.add(key)
+                    deferred.append(item)
+                    continue
+                logger.warning(f"[Validators] update {record_id} alone changes {delta} of the total power {total}, "
+                               f"not below 1/3; sending it without other changes in this window")
+            changed += delta
+            if new:
+                current[key] = new
+            else:
+                current.pop(key, None)
+            touched.add(key)
+            groups.setdefault(vtype, []).append((record_id, entry))
+        return groups, deferred, rejected
+
+    def run_window(self):
+        batch = self.store.drain("validators")
+        if not batch:
+            return
+        try:
+            check_comet_status()
+            validators = get_validator_set()
+        except Exception as e:
+            logger.error(f"[Validators] cannot check the validator set, retrying {len(batch)} updates: {e}")
+            self.store.push("validators", batch, front=True)
+            return
+
+        groups, deferred, rejected = self.plan(batch, validators)
+        for record_id, reason in rejected.items():
+            logger.error(f"[Validators] rejected update {record_id}: {reason}")
+            self.update([record_id], status="rejected", message=reason)
+        if deferred:
+            self.store.push("validators", deferred, front=True)
+        for vtype, items in groups.items():
+            record_ids = [record_id for record_id, _ in items]
+            tx_payload = {"type": vtype, "validator": [entry for _, entry in items]}
+            logger.info(f"[Validators] broadcasting {vtype} for {len(items)} validators")
+            tx_hash, error = broadcast_transaction(tx_payload)
+            if not tx_hash:
+                self.update(record_ids, status="failed", message=error or "Error occurred during transaction broadcast")
+                continue
+            self.update(record_ids, status="broadcast", tx_hash=tx_hash)
+            tracker.track(tx_hash).add_done_callback(lambda f, ids=record_ids: self.on_commit(ids, f))
+
+    def on_commit(self, record_ids, future):
+        try:
+            tx_result = future.result()
+        except Exception as e:
+            self.update(record_ids, status="failed", message=str(e))
+            return
+        status = "committed" if is_committed_ok(tx_result) else "failed"
+        self.update(record_ids, status=status, height=tx_result.get("height"), message=tx_result)
+
+    def _run(self):
+        while True:
+            time.sleep(self.window)
+            try:
+                if self.store.lease("validators", self.holder, 3 * self.window):
+                    self.run_window()
+            except Exception as e:
+                logger.error(f"[Validators] batch window failed: {e}")
+
+
+batcher = ValidatorBatcher(store=store)
+
+
+def parse_validator_entries(tx_payload):
+    """Validated copies of the request's validator entries; raises ValueError on bad input."""
+    entries = tx_payload.get("validator")
+    if isinstance(entries, dict):
+        entries = [entries]
+    if tx_payload.get("type") not in VALIDATOR_TYPES or not isinstance(entries, list) or not entries:
+        raise ValueError(f"type must be one of {', '.join(VALIDATOR_TYPES)} with a non-empty validator list")
+    parsed = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get("pub_key_bytes") or not entry.get("pub_key_type"):
+            raise ValueError("Each validator needs pub_key_bytes and pub_key_type")
+        power = int(entry.get("power", 0))
+        if power < 0:
+            raise ValueError("Validator power cannot be negative")
+        parsed.append({"power": power, "pub_key_bytes": entry["pub_key_bytes"], "pub_key_type": entry["pub_key_type"]})
+    return parsed
+
+
 @app.route('/validatorTx', methods=['POST'])
 def update_validator():
     try:
@@ -131,21 +296,31 @@ def update_validator():
         if not tx_payload or not tx_payload.get("type") or not tx_payload.get("validator"):
             logger.info(f"Invalid request received: {tx_payload}")
             return jsonify({"error": "Invalid request received"}), 400
+        try:
+            entries = parse_validator_entries(tx_payload)
+        except (TypeError, ValueError) as e:
+            logger.info(f"Invalid request received: {tx_payload}: {e}")
+            return jsonify({"error": f"Invalid request received: {e}"}), 400
         logger.info(f"Received transaction request to update CometBFT validators: {tx_payload}")
-        check_comet_status()
-        logger.info(f"Preparing payload for transaction..")
-        tx_hash = broadcast_transaction(tx_payload)
-        logger.info(f"Broadcast Hash received from cometbft: {tx_hash}")
-        if tx_hash:
-            logger.info("Validating broadcast status from cometbft in 2 sec...")
-            time.sleep(2)
-            tx_result = validate_transaction(tx_hash)
-            if tx_result and tx_result.get("result"):
-                return jsonify({"status": "success", "message": tx_result}), 200
-            else:
-                return jsonify({"status": "error", "message": tx_result}), 400
-        else:
-            return jsonify({"status": "error", "message": "Error occurred during transaction broadcast"}), 400
+
+        def submit():
+            check_comet_status()
+            record_ids = batcher.submit(tx_payload["type"], entries)
+            return {"status": "accepted",
+                    "updates": [{"id": record_id, "pub_key_bytes": entry["pub_key_bytes"],
+                                 "status_url": f"/validatorTx/{record_id}"}
+                                for record_id, entry in zip(record_ids, entries)]}, 202
+
+        # Retries with the same Idempotency-Key (or identical body) get the original ids back
+        key, ttl = request_key("validatorTx", request.headers, tx_payload)
+        (body, code), replayed = idempotency.run(key, ttl, submit)
+        if not replayed:
+            return jsonify(body), code
+        logger.info(f"Repeated validator request answered from the idempotency cache: {body}")
+        records = [batcher.wait(update["id"], 0) for update in body["updates"]]
+        response = jsonify(dict(body, records=records))
+        response.headers["Idempotent-Replayed"] = "true"
+        return response, code
     except CometNotReadyError as e:
         logger.error(str(e))
         return jsonify({"status": "error", "message": str(e)}), 503
@@ -154,8 +329,28 @@ def update_validator():
         return jsonify({"status": "error", "message": "Internal server error"}), 500
 
 
+@app.route('/validatorTx/<record_id>', methods=['GET'])
+def get_validator_update(record_id):
+    """Per-validator outcome; `?wait=N` long-polls up to N seconds for committed/failed/rejected."""
+    try:
+        wait = min(max(float(request.args.get("wait", 0)), 0.0), VALIDATOR_MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    record = batcher.wait(record_id, wait)
+    if record is None:
+        return jsonify({"status": "error", "message": f"Unknown validator update {record_id}"}), 404
+    return jsonify(record), 200
+
+
+def start_background():
+    """Background threads of one serving process; never started from a request hook."""
+    health.start()
+    tracker.start()
+    batcher.start()
+
+
 if __name__ == '__main__':
     try:
-        app.run(debug=True, host='0.0.0.0', port=5010)
+        serve(app, '0.0.0.0', 5010, on_worker_start=start_background)
     except Exception as ex:
         logger.error(f"Unexpected error: {ex}")
\ No newline at end of file
@@ -179,6 +179,37 @@ def process_serf_user_event(event_name: str, payload_b64: str, mempool_client):
         logger.error(f"Error processing serf user event '{event_name}': {e}")
 
 
+# Optional members_cache.py endpoint of the serf node (e.g. http://172.20.20.7:4043/members,
+# started with --http-host 0.0.0.0); unset = `serf members` subprocess on every poll
+MEMBERS_URL = os.environ.get("MEMBERS_URL")
+_members_cache = {"etag": None, "data": None}
+
+
+def fetch_serf_members(serf_exec_path: str, rpc_addr: str):
+    """
+    `serf members -format=json` as (data, None), or (None, error) when serf fails.
+    With MEMBERS_URL the table comes from members_cache.py with If-None-Match, so an
+    unchanged table is a 304 and no serf process; the subprocess is the fallback
+    while the cache is unreachable.
+    """
+    if MEMBERS_URL:
+        headers = {"If-None-Match": _members_cache["etag"]} if _members_cache["data"] is not None else {}
+        try:
+            resp = requests.get(MEMBERS_URL, headers=headers, timeout=2)
+            if resp.status_code == 304:
+                return _members_cache["data"], None
+            resp.raise_for_status()
+            _members_cache.update(etag=resp.headers.get("ETag"), data=resp.json())
+            return _members_cache["data"], None
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"Members cache {MEMBERS_URL} unavailable, using serf members: {e}")
+    members_cmd = [serf_exec_path, "members", "-format=json", f"-rpc-addr={rpc_addr}"]
+    members_process = subprocess.run(members_cmd, capture_output=True, text=True, timeout=5)
+    if members_process.returncode != 0:
+        return None, members_process.stderr.strip()
+    return json.loads(members_process.stdout), None
+
+
 def serf_monitor_thread(serf_exec_path: str, rpc_addr: str, mempool_client):
     logger.info(f"Starting Serf monitor thread. Connecting to RPC {rpc_addr}")
 
@@ -193,21 +224,19 @@ def serf_monitor_thread(serf_exec_path: str, rpc_addr: str, mempool_client):
         # Periodically update Serf members with enriched tags
         if current_time - last_members_check_time > MEMBER_CHECK_INTERVAL:
             try:
-                members_cmd = [serf_exec_path, "members", "-format=json", f"-rpc-addr={rpc_addr}"]
-                members_process = subprocess.run(members_cmd, capture_output=True, text=True, timeout=5)
-                if members_process.returncode == 0:
-                    members_data = json.loads(members_process.stdout)
+                members_data, members_error = fetch_serf_members(serf_exec_path, rpc_addr)
+                if members_error is None:
                     enriched_members = []
                     for member in members_data.get("members", []):
                         name = member.get("name")
                         raw_addr = member.get("addr", "")  # Example: "10.0.1.11:7946"
                         ip = raw_addr.split(":")[0]
                         node_id = f"{name}@{ip}:{default_p2p_port}"
-                        tags = member.get("tags", {})
+                        # copies: with MEMBERS_URL the decoded table is reused across polls
+                        tags = dict(member.get("tags", {}))
                         tags["cometbft_node_id"] = node_id
                         tags["p2p_port"] = default_p2p_port
-                        member["tags"] = tags
-                        enriched_members.append(member)
+                        enriched_members.append(dict(member, tags=tags))
                     with metrics_lock:
                         app_metrics["serf_members"] = enriched_members
                         app_metrics["serf_rpc_status"] = "Connected"
@@ -215,11 +244,11 @@ def serf_monitor_thread(serf_exec_path: str, rpc_addr: str, mempool_client):
                         app_metrics["serf_monitor_last_error"] = None
                     logger.debug(f"Updated Serf members: {len(enriched_members)} found")
                 else:
-                    logger.error(f"Failed to get Serf members: {members_process.stderr.strip()}")
+                    logger.error(f"Failed to get Serf members: {members_error}")
                     with metrics_lock:
                         app_metrics["serf_rpc_status"] = "Disconnected"
                         app_metrics["serf_monitor_status"] = "Failed to get members"
-                        app_metrics["serf_monitor_last_error"] = members_process.stderr.strip() or "Unknown error"
+                        app_metrics["serf_monitor_last_error"] = members_error or "Unknown error"
                 last_members_check_time = current_time
             except Exception as e:
                 logger.error(f"Error fetching Serf members: {e}")